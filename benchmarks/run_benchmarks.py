@@ -0,0 +1,285 @@
+import os
+import sys
+import json
+import time
+import glob
+import shutil
+import argparse
+import resource
+import statistics
+import subprocess
+import tempfile
+import threading
+import http.server
+import multiprocessing
+from datetime import datetime
+from synthetic_data import write_synthetic_csv
+
+# Pipeline benchmark suite: every (stage, size) runs in a fresh process on synthetic Telco data,
+# and wall time, peak RSS and rows/s are appended to history.json and compared with baseline.json
+#
+#   python run_benchmarks.py --sizes 10k,100k --stages ingestion,validation
+#   python run_benchmarks.py --update-baseline
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, "..", "src")
+HISTORY_FILE = os.path.join(BENCH_DIR, "history.json")
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+STAGES = ["ingestion", "ingestion_http", "validation", "eda", "prepare", "prepare_partitioned", "store"]
+DEFAULT_SIZES = "10k,100k,1M,10M"
+TIMESTAMP = "bench"
+# ingestion_http: remote sources served by the local stand-in, each request delayed like a network call
+HTTP_SOURCES = 10
+HTTP_LATENCY_S = 0.2
+
+def parse_size(text):
+    text = text.strip().lower()
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(text[-1], 1)
+    return int(float(text.rstrip("km")) * multiplier)
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# Function to create the data/ and src/ layout the pipeline expects, with both synthetic sources
+# The Kaggle stand-in overlaps half of the local customers, like the real sources do
+def prepare_workdir(workdir, size):
+    os.makedirs(os.path.join(workdir, "src"), exist_ok=True)
+    data_dir = os.path.join(workdir, "data")
+    local_rows = size // 2
+    write_synthetic_csv(os.path.join(data_dir, "Telco-customer-churn.csv"), local_rows, seed=1)
+    write_synthetic_csv(os.path.join(data_dir, "kaggle.csv"), size - local_rows, seed=2, id_offset=local_rows // 2)
+
+def raw_dataset():
+    return glob.glob(os.path.join(".././data/raw", f"customer_churn_{TIMESTAMP}.*"))[0]
+
+# Stage runners: setup work happens before the clock starts, each returns a callable to time
+def setup_ingestion():
+    shutil.rmtree(".././data/raw", ignore_errors=True)
+    from data_ingestion import run_data_ingestion
+    return lambda: run_data_ingestion(TIMESTAMP)
+
+# Local HTTP stand-in for remote sources: /<source>/<file> serves data/<file> after HTTP_LATENCY_S
+def serve_data(data_dir):
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=data_dir, **kwargs)
+
+        def translate_path(self, path):
+            return super().translate_path("/" + path.lstrip("/").split("/", 1)[-1])
+
+        def send_head(self):
+            time.sleep(HTTP_LATENCY_S)
+            return super().send_head()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# HTTP_SOURCES remote copies of the Kaggle stand-in, ingested concurrently
+def setup_ingestion_http():
+    shutil.rmtree(".././data/raw", ignore_errors=True)
+    server = serve_data(os.path.abspath(".././data"))
+    sources = [{"name": f"remote{i}", "type": "http", "url": f"http://127.0.0.1:{server.server_port}/remote{i}/kaggle.csv"}
+               for i in range(HTTP_SOURCES)]
+    from data_ingestion import run_data_ingestion
+    return lambda: run_data_ingestion(TIMESTAMP, sources=sources)
+
+def setup_validation():
+    from data_validation import validate_dataset
+    report_folder = ".././data/validation_reports"
+    os.makedirs(report_folder, exist_ok=True)
+    path = raw_dataset()
+    return lambda: validate_dataset(path, report_folder, f"customer_churn_{TIMESTAMP}")
+
+def setup_eda(stats_only=False):
+    import eda
+    from preprocessor import clean_data
+    from storage import read_dataset
+    eda_folder = os.path.join(eda.EDA_ROOT, f"EDA_{TIMESTAMP}")
+    os.makedirs(eda_folder, exist_ok=True)
+    # Without the cache and the running aggregates the stage does the full work every time
+    for state_file in (eda.EDA_CACHE_FILE, eda.EDA_AGGREGATES_FILE, eda.EDA_ROWS_DB):
+        if os.path.exists(state_file):
+            os.remove(state_file)
+    df = clean_data(read_dataset(raw_dataset()))
+    return lambda: eda.perform_eda(df, eda_folder, TIMESTAMP, stats_only=stats_only)
+
+def setup_prepare():
+    from data_transformation_FE import prepare_data
+    clean_folder = ".././data/transformed"
+    os.makedirs(clean_folder, exist_ok=True)
+    path = raw_dataset()
+    # refit: every repeat fits the preprocessor, instead of reusing the one saved by the first
+    return lambda: prepare_data(path, clean_folder, TIMESTAMP, refit=True)
+
+# Same stage over customerID hash partitions, one process per core
+def setup_prepare_partitioned():
+    from data_transformation_FE import prepare_data
+    clean_folder = ".././data/transformed"
+    os.makedirs(clean_folder, exist_ok=True)
+    path = raw_dataset()
+    return lambda: prepare_data(path, clean_folder, TIMESTAMP, partitions=max(os.cpu_count() or 1, 2),
+                                refit=True)
+
+def setup_store():
+    from data_transformation_FE import store_transformed_data
+    from preprocessor import clean_data, fit_preprocessor, transform
+    from storage import read_dataset
+    db_folder = ".././data/database"
+    os.makedirs(db_folder, exist_ok=True)
+    db_path = os.path.join(db_folder, "customer_churn.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    df = clean_data(read_dataset(raw_dataset()))
+    df = transform(df, fit_preprocessor(df))
+    return lambda: store_transformed_data(df, db_path, "transformed_data", TIMESTAMP)
+
+SETUP = {
+    "ingestion": setup_ingestion,
+    "ingestion_http": setup_ingestion_http,
+    "validation": setup_validation,
+    "eda": setup_eda,
+    "prepare": setup_prepare,
+    "prepare_partitioned": setup_prepare_partitioned,
+    "store": setup_store,
+}
+
+# Child process entry point: run one stage once in the work directory and report its measurements
+def run_stage(stage, workdir, size, eda_stats_only, results):
+    try:
+        os.chdir(os.path.join(workdir, "src"))
+        sys.path.insert(0, SRC_DIR)
+        os.environ["KAGGLE_LOCAL_PATH"] = os.path.abspath(os.path.join(workdir, "data", "kaggle.csv"))
+        setup = SETUP[stage]
+        stage_fn = setup(eda_stats_only) if stage == "eda" else setup()
+        setup_rss = peak_rss_mb()
+        start = time.perf_counter()
+        stage_fn()
+        wall = time.perf_counter() - start
+        results.put({"wall_s": wall, "peak_rss_mb": peak_rss_mb(), "setup_peak_rss_mb": setup_rss,
+                     "rows": size, "rows_per_s": size / max(wall, 1e-9)})
+    except Exception as e:
+        results.put({"error": repr(e)})
+
+def measure(stage, workdir, size, repeat, eda_stats_only):
+    context = multiprocessing.get_context("spawn")
+    runs = []
+    for _ in range(repeat):
+        results = context.Queue()
+        process = context.Process(target=run_stage, args=(stage, workdir, size, eda_stats_only, results))
+        process.start()
+        outcome = results.get()
+        process.join()
+        if "error" in outcome:
+            return outcome
+        runs.append(outcome)
+    # Median wall time over the repeats, worst peak memory
+    wall = statistics.median(run["wall_s"] for run in runs)
+    return {"wall_s": round(wall, 4),
+            "peak_rss_mb": round(max(run["peak_rss_mb"] for run in runs), 1),
+            "setup_peak_rss_mb": round(max(run["setup_peak_rss_mb"] for run in runs), 1),
+            "rows": size,
+            "rows_per_s": round(size / max(wall, 1e-9), 1),
+            "repeats": [round(run["wall_s"], 4) for run in runs]}
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path) as f:
+        return json.load(f)
+
+def save_json(path, payload):
+    with open(path + ".tmp", "w") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+# Function to flag stages that got slower (or bigger) than the baseline by more than the tolerance
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for stage, sizes in results.items():
+        for size, result in sizes.items():
+            reference = baseline.get(stage, {}).get(size)
+            if not reference or "error" in result or "error" in reference:
+                continue
+            for metric in ("wall_s", "peak_rss_mb"):
+                ratio = result[metric] / max(reference[metric], 1e-9)
+                if ratio > 1 + tolerance:
+                    regressions.append({"stage": stage, "size": size, "metric": metric,
+                                        "baseline": reference[metric], "current": result[metric], "ratio": round(ratio, 3)})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Customer churn pipeline benchmarks")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma separated row counts (10k, 1M, ...)")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma separated stages out of {STAGES}")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per stage and size (the median is kept)")
+    parser.add_argument("--eda-stats-only", action="store_true", help="Benchmark EDA without rendering plots")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on regressions")
+    parser.add_argument("--workdir", default=None, help="Keep the generated data in this folder")
+    args = parser.parse_args()
+
+    stages = [stage.strip() for stage in args.stages.split(",")]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages {sorted(unknown)}")
+    # Stages consume the raw dataset written by ingestion
+    if "ingestion" not in stages:
+        stages = ["ingestion"] + stages
+    stages = [stage for stage in STAGES if stage in stages]
+
+    results = {stage: {} for stage in stages}
+    root = args.workdir or tempfile.mkdtemp(prefix="churn_bench_")
+    try:
+        for size_text in args.sizes.split(","):
+            size = parse_size(size_text)
+            workdir = os.path.join(root, str(size))
+            print(f"Generating {size} synthetic customers ...")
+            prepare_workdir(workdir, size)
+            for stage in stages:
+                result = measure(stage, workdir, size, args.repeat, args.eda_stats_only)
+                results[stage][str(size)] = result
+                if "error" in result:
+                    print(f"{stage:>10} {size:>10} rows  FAILED: {result['error']}")
+                else:
+                    print(f"{stage:>10} {size:>10} rows  {result['wall_s']:9.3f}s  "
+                          f"{result['peak_rss_mb']:8.1f} MB  {result['rows_per_s']:12.0f} rows/s")
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+    baseline = load_json(BASELINE_FILE, {}).get("results", {})
+    regressions = find_regressions(results, baseline, args.tolerance)
+    run = {"run_at": datetime.now().isoformat(timespec="seconds"), "commit": git_commit(),
+           "cpu_count": os.cpu_count(), "eda_stats_only": args.eda_stats_only,
+           "results": results, "regressions": regressions}
+    history = load_json(HISTORY_FILE, [])
+    history.append(run)
+    save_json(HISTORY_FILE, history)
+    if args.update_baseline:
+        save_json(BASELINE_FILE, run)
+        print(f"Baseline updated: {BASELINE_FILE}")
+
+    for regression in regressions:
+        print(f"REGRESSION {regression['stage']} at {regression['size']} rows: {regression['metric']} "
+              f"{regression['baseline']} -> {regression['current']} (x{regression['ratio']})")
+    if not regressions and baseline:
+        print(f"No regressions against the baseline (tolerance {args.tolerance:.0%})")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import os
+import numpy as np
+import pandas as pd
+
+SEED_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "Telco-customer-churn.csv")
+ID_COL = "customerID"
+LETTERS = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+
+# Synthetic customers with the Telco schema: whole records are bootstrapped from the seed CSV,
+# so category frequencies and the dependencies between columns (no internet -> "No internet
+# service" add-ons, tenure vs contract) are kept; ids are new and the numbers are jittered
+def generate_customers(n_rows, seed=0, seed_csv=SEED_CSV, id_offset=0):
+    rng = np.random.default_rng(seed)
+    source = pd.read_csv(seed_csv)
+    source["TotalCharges"] = pd.to_numeric(source["TotalCharges"], errors="coerce")
+    df = source.iloc[rng.integers(len(source), size=n_rows)].reset_index(drop=True)
+
+    # Ids in the Telco format (dddd-XXXXX); the letters encode the row number in base 26,
+    # so ids are unique up to 26**5 (about 11.8M) rows
+    numbers = np.arange(id_offset, id_offset + n_rows)
+    letters = np.ascontiguousarray(LETTERS[(numbers[:, None] // 26 ** np.arange(4, -1, -1)) % 26]).view("<U5").ravel()
+    prefix = np.char.zfill(rng.integers(10000, size=n_rows).astype(str), 4)
+    df[ID_COL] = np.char.add(np.char.add(prefix, "-"), letters)
+
+    # New customers (tenure 0) stay new, everyone else moves by up to two months
+    tenure = df["tenure"].to_numpy()
+    tenure = np.where(tenure == 0, 0, np.clip(tenure + rng.integers(-2, 3, size=n_rows), 1, 72))
+    monthly = np.round(np.clip(df["MonthlyCharges"].to_numpy() * rng.normal(1, 0.03, size=n_rows), 18.25, 118.75), 2)
+    total = np.round(tenure * monthly * rng.normal(1, 0.02, size=n_rows), 2)
+    df["tenure"] = tenure
+    df["MonthlyCharges"] = monthly
+    # New customers have a blank TotalCharges, as in the real export
+    df["TotalCharges"] = np.where(tenure == 0, " ", total.astype(str))
+    return df
+
+# Function to write a synthetic CSV chunk by chunk so large sizes never sit in memory at once
+def write_synthetic_csv(path, n_rows, seed=0, chunk_size=1_000_000, seed_csv=SEED_CSV, id_offset=0):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    for i, start in enumerate(range(0, n_rows, chunk_size)):
+        rows = min(chunk_size, n_rows - start)
+        chunk = generate_customers(rows, seed + i, seed_csv, id_offset + start)
+        chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+    return path
@@ -0,0 +1,264 @@
+import os
+import re
+import sys
+import glob
+import json
+import time
+import shutil
+import hashlib
+import subprocess
+from datetime import datetime
+import yaml
+from logger import logging
+from exception import CustomException
+from fingerprint import file_fingerprint, file_sha256
+
+# Content-addressed artifact cache
+#   objects/<sha256[:2]>/<sha256>   every cached file once, whatever run or stage produced it
+#   stages/<stage>/<key>.json       outputs of one stage run, keyed by a hash of its inputs,
+#                                   its code and its param.yaml sections
+# Outputs are hard links into the object store, so identical artifacts share storage
+CACHE_ROOT = ".././data/cache"
+OBJECTS_FOLDER = os.path.join(CACHE_ROOT, "objects")
+STAGES_FOLDER = os.path.join(CACHE_ROOT, "stages")
+FINGERPRINTS_FILE = os.path.join(CACHE_ROOT, "fingerprints.json")
+PARAMS_FILE = "../param.yaml"
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Code files and param.yaml sections the output of each cached stage depends on
+# Only training is cached here: ingestion (source fingerprints and row index), EDA (its fingerprint
+# cache) and the transformation (saved preprocessor, delta rows only) skip unchanged work themselves
+STAGES = {
+    "train": {"code": ["model_training.py", "sqlite_writer.py", "schema.py"], "params": ["base", "train"]},
+}
+
+# Timestamped snapshots (folder, name pattern, evictable); names are <prefix>_<timestamp>[.ext]
+# Snapshots are written once, so the kept ones are deduplicated into the object store. The
+# customer_churn_<timestamp> deltas are the ingestion history and are never evicted.
+# Every ingestion source has its own "<name> dataset" folder under data/raw
+TIMESTAMP = r"(?P<ts>\d{4}(_\d{2}){5})"
+RAW_DATA_FOLDER = ".././data/raw"
+SOURCE_SNAPSHOT = r"\w+_(dataset|csv)_" + TIMESTAMP
+SNAPSHOTS = [
+    (".././data/transformed", r"clean_dataset_" + TIMESTAMP, True),
+    (".././data/EDA_results", r"EDA_" + TIMESTAMP, True),
+    (".././data/raw", r"customer_churn_" + TIMESTAMP, False),
+]
+DEFAULT_POLICY = {"max_size_mb": 1024, "max_age_days": 30, "keep_snapshots": 5, "prune_after_run": False}
+
+def load_policy(params_file=PARAMS_FILE):
+    policy = dict(DEFAULT_POLICY)
+    if os.path.exists(params_file):
+        with open(params_file) as f:
+            policy.update((yaml.safe_load(f) or {}).get("cache") or {})
+    return policy
+
+def object_path(digest):
+    return os.path.join(OBJECTS_FOLDER, digest[:2], digest)
+
+def _link(source, target):
+    if os.path.exists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+# Function to move a file into the object store; the file becomes a hard link to its object
+def store_object(path):
+    digest = file_sha256(path)
+    target = object_path(digest)
+    if os.path.exists(target):
+        if not os.path.samefile(path, target):
+            _link(target, path)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        _link(path, target)
+    return digest
+
+# Function to hash files, reusing the stored hash while their size and mtime are unchanged
+def _input_hashes(paths):
+    fingerprints = {}
+    if os.path.exists(FINGERPRINTS_FILE):
+        with open(FINGERPRINTS_FILE) as f:
+            fingerprints = json.load(f)
+    hashes = []
+    for path in paths:
+        key = os.path.abspath(path)
+        fingerprints[key] = file_fingerprint(path, fingerprints.get(key))
+        hashes.append(fingerprints[key]["sha256"])
+    os.makedirs(CACHE_ROOT, exist_ok=True)
+    with open(FINGERPRINTS_FILE + ".tmp", "w") as f:
+        json.dump(fingerprints, f)
+    os.replace(FINGERPRINTS_FILE + ".tmp", FINGERPRINTS_FILE)
+    return hashes
+
+# Function to compute the cache key of a stage run from its input files, code and parameters
+# digests: hashes of inputs that are not whole files (e.g. the content of one table of a database)
+def stage_key(stage, inputs, params=None, digests=()):
+    spec = STAGES[stage]
+    if params is None:
+        params = load_params_sections(spec["params"])
+    digest = hashlib.sha256(stage.encode())
+    for input_hash in _input_hashes(inputs) + list(digests):
+        digest.update(input_hash.encode())
+    for code_file in spec["code"]:
+        digest.update(file_sha256(os.path.join(SRC_DIR, code_file)).encode())
+    digest.update(json.dumps({section: params.get(section) for section in spec["params"]},
+                             sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+def load_params_sections(sections, params_file=PARAMS_FILE):
+    with open(params_file) as f:
+        params = yaml.safe_load(f) or {}
+    return {section: params.get(section) for section in sections}
+
+def _manifest_path(stage, key):
+    return os.path.join(STAGES_FOLDER, stage, f"{key}.json")
+
+def _write_manifest(path, manifest):
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+# Function to restore the outputs of an earlier run with the same key ({name: path} of this run)
+# Returns the stored manifest, or None on a miss
+def restore_outputs(stage, key, outputs):
+    manifest_file = _manifest_path(stage, key)
+    if not os.path.exists(manifest_file):
+        return None
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    if set(manifest["outputs"]) != set(outputs) or not all(
+            os.path.exists(object_path(output["digest"])) for output in manifest["outputs"].values()):
+        return None
+    for name, path in outputs.items():
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        _link(object_path(manifest["outputs"][name]["digest"]), path)
+    manifest["last_used"] = time.time()
+    _write_manifest(manifest_file, manifest)
+    logging.info(f"Stage {stage} restored from cache (key {key[:12]}, run {manifest['timestamp']})")
+    return manifest
+
+# Function to store the outputs of a stage run under its key
+def save_outputs(stage, key, outputs, timestamp, result=None):
+    try:
+        manifest = {
+            "stage": stage,
+            "key": key,
+            "timestamp": timestamp,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "last_used": time.time(),
+            "outputs": {name: {"path": path, "digest": store_object(path), "size": os.path.getsize(path)}
+                        for name, path in outputs.items()},
+            "result": result,
+        }
+        os.makedirs(os.path.join(STAGES_FOLDER, stage), exist_ok=True)
+        _write_manifest(_manifest_path(stage, key), manifest)
+        return manifest
+    except Exception as e:
+        logging.error(f"Failed to cache the outputs of stage {stage}: {e}")
+        raise CustomException(e, sys)
+
+def _manifests():
+    manifests = []
+    for root, _, files in os.walk(STAGES_FOLDER):
+        for name in files:
+            if name.endswith(".json"):
+                path = os.path.join(root, name)
+                with open(path) as f:
+                    manifests.append((path, json.load(f)))
+    return manifests
+
+def _objects():
+    for root, _, files in os.walk(OBJECTS_FOLDER):
+        for name in files:
+            yield name, os.path.join(root, name)
+
+# Function to list the files git tracks under a folder, and the folders holding them
+# Empty when git is not installed or the folder is not in a checkout
+def _tracked_paths(folder):
+    try:
+        listing = subprocess.run(["git", "ls-files", "-z"], cwd=folder, capture_output=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return set()
+    tracked = set()
+    for name in listing.decode().split("\0"):
+        path = os.path.abspath(os.path.join(folder, name)) if name else None
+        while path and path not in tracked and path != os.path.abspath(folder):
+            tracked.add(path)
+            path = os.path.dirname(path)
+    return tracked
+
+# Function to keep the newest keep_snapshots runs of every evictable snapshot folder and
+# deduplicate the snapshot files that are kept
+# Snapshots committed to git are left alone: never counted, removed or relinked
+def prune_snapshots(keep_snapshots, dry_run=False):
+    removed = []
+    sources = sorted(glob.glob(os.path.join(RAW_DATA_FOLDER, "* dataset")))
+    for folder, pattern, evictable in [(folder, SOURCE_SNAPSHOT, True) for folder in sources] + SNAPSHOTS:
+        if not os.path.isdir(folder):
+            continue
+        tracked = _tracked_paths(folder)
+        by_run = {}
+        for name in os.listdir(folder):
+            match = re.fullmatch(pattern + r"(\..+)?", name)
+            if match and os.path.abspath(os.path.join(folder, name)) not in tracked:
+                by_run.setdefault(match.group("ts"), []).append(os.path.join(folder, name))
+        runs = sorted(by_run)
+        evicted_runs = runs[:max(len(runs) - keep_snapshots, 0)] if evictable else []
+        for ts in runs:
+            for path in by_run[ts]:
+                if ts in evicted_runs:
+                    removed.append(path)
+                    if not dry_run:
+                        shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+                elif not dry_run and os.path.isfile(path) and os.stat(path).st_nlink == 1:
+                    store_object(path)
+    return removed
+
+# Function to apply the retention policy: evict stage entries older than max_age_days, then the least
+# recently used ones until the cache fits max_size_mb, then every object nothing refers to any more
+def prune_cache(policy=None, dry_run=False):
+    try:
+        policy = policy or load_policy()
+        removed_snapshots = prune_snapshots(policy["keep_snapshots"], dry_run)
+
+        manifests = sorted(_manifests(), key=lambda item: item[1].get("last_used", 0))
+        cutoff = time.time() - policy["max_age_days"] * 86400
+        evicted = [item for item in manifests if item[1].get("last_used", 0) < cutoff]
+        kept = [item for item in manifests if item not in evicted]
+        sizes = {}
+        for _, manifest in kept:
+            for output in manifest["outputs"].values():
+                sizes[output["digest"]] = output["size"]
+        max_bytes = policy["max_size_mb"] * 1024 * 1024
+        while kept and sum(sizes.values()) > max_bytes:
+            evicted.append(kept.pop(0))
+            sizes = {output["digest"]: output["size"]
+                     for _, manifest in kept for output in manifest["outputs"].values()}
+        if not dry_run:
+            for path, _ in evicted:
+                os.remove(path)
+
+        # Objects still linked from a snapshot folder (more than one link) stay
+        referenced = set(sizes)
+        removed_objects = 0
+        for digest, path in list(_objects()):
+            if digest not in referenced and os.stat(path).st_nlink == 1:
+                removed_objects += 1
+                if not dry_run:
+                    os.remove(path)
+        summary = {"removed_snapshots": len(removed_snapshots), "evicted_entries": len(evicted),
+                   "removed_objects": removed_objects, "cache_entries": len(kept), **cache_usage()}
+        logging.info(f"Artifact cache pruned{' (dry run)' if dry_run else ''}: {summary}")
+        return summary
+    except Exception as e:
+        logging.error(f"Failed to prune the artifact cache: {e}")
+        raise CustomException(e, sys)
+
+# Function to report the size of the object store (each object counted once)
+def cache_usage():
+    objects = [os.path.getsize(path) for _, path in _objects()]
+    return {"objects": len(objects), "object_mb": round(sum(objects) / (1024 * 1024), 2),
+            "stage_entries": len(_manifests())}
@@ -0,0 +1,208 @@
+import os
+import sys
+import json
+import sqlite3
+import numpy as np
+import pandas as pd
+from logger import logging
+from exception import CustomException
+from instrumentation import instrument
+from schema import ID_COL, TARGET_COL
+from sqlite_writer import RUN_TS_COL, connect, ensure_table, iter_rows, quote, sqlite_type
+
+DB_PATH = ".././data/database/customer_churn.db"
+# Latest segment columns of every customer, so a changed customer can be taken out of its old segments
+MEMBERS_TABLE = "churn_segment_members"
+# Current churn counts per (segment, value), over the latest version of every customer
+CURRENT_TABLE = "churn_by_segment"
+# The same counts after every run, with the counts of the run's own delta
+RUNS_TABLE = "churn_by_segment_run"
+META_TABLE = "churn_aggregates_meta"
+MISSING = "(missing)"
+
+# Segments churn is aggregated by: raw column and, for numeric columns, right-closed bucket edges
+# (integer columns: "0-12", "13-24", ..., ">48"); "all" is the whole customer base
+SEGMENTS = {
+    "all": {"column": None},
+    "Contract": {"column": "Contract"},
+    "PaymentMethod": {"column": "PaymentMethod"},
+    "InternetService": {"column": "InternetService"},
+    "tenure_bucket": {"column": "tenure", "edges": [12, 24, 48]},
+}
+# Raw columns the aggregates read from a run's delta
+AGGREGATE_COLUMNS = [ID_COL, TARGET_COL] + sorted({spec["column"] for spec in SEGMENTS.values() if spec["column"]})
+
+def _bucket_labels(edges):
+    lows = [0] + [edge + 1 for edge in edges[:-1]]
+    return [f"{low}-{high}" for low, high in zip(lows, edges)] + [f">{edges[-1]}"]
+
+# Function to label every customer of a raw batch with its value of each segment
+def segment_frame(df):
+    frame = pd.DataFrame({"churned": (df[TARGET_COL].astype(str) == "Yes").to_numpy(dtype="int64")})
+    for name, spec in SEGMENTS.items():
+        if spec["column"] is None:
+            frame[name] = name
+            continue
+        values = df[spec["column"]]
+        if "edges" in spec:
+            buckets = np.searchsorted(spec["edges"], values.to_numpy(dtype="float64", na_value=np.nan), side="left")
+            labels = np.asarray(_bucket_labels(spec["edges"]), dtype=object)[np.minimum(buckets, len(spec["edges"]))]
+        else:
+            labels = values.astype(str).to_numpy(dtype=object)
+        frame[name] = np.where(values.isna().to_numpy(), MISSING, labels)
+    return frame
+
+# Function to count customers and churned customers per (segment, value) of a labelled batch
+def segment_counts(frame):
+    counts = [frame.groupby(name, sort=False)["churned"].agg(customers="size", churned="sum")
+              .rename_axis("value").reset_index().assign(segment=name)
+              for name in SEGMENTS]
+    return pd.concat(counts, ignore_index=True)[["segment", "value", "customers", "churned"]]
+
+def _create_tables(conn):
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {quote(CURRENT_TABLE)} (segment TEXT NOT NULL, value TEXT NOT NULL, "
+                 f"customers INTEGER NOT NULL, churned INTEGER NOT NULL, PRIMARY KEY (segment, value))")
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {quote(RUNS_TABLE)} (segment TEXT NOT NULL, value TEXT NOT NULL, "
+                 f"{quote(RUN_TS_COL)} TEXT NOT NULL, customers INTEGER NOT NULL, churned INTEGER NOT NULL, "
+                 f"delta_customers INTEGER NOT NULL, delta_churned INTEGER NOT NULL, "
+                 f"PRIMARY KEY (segment, value, {quote(RUN_TS_COL)}))")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {quote(f'ix_{RUNS_TABLE}_{RUN_TS_COL}')} "
+                 f"ON {quote(RUNS_TABLE)} ({quote(RUN_TS_COL)})")
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {quote(META_TABLE)} (key TEXT PRIMARY KEY, value TEXT)")
+
+def _add_counts(conn, counts, sign):
+    conn.executemany(
+        f"INSERT INTO {quote(CURRENT_TABLE)} (segment, value, customers, churned) VALUES (?, ?, ?, ?) "
+        f"ON CONFLICT(segment, value) DO UPDATE SET customers = customers + excluded.customers, "
+        f"churned = churned + excluded.churned",
+        ((segment, value, sign * int(customers), sign * int(churned))
+         for segment, value, customers, churned in counts.itertuples(index=False)))
+
+def _members_exist(conn):
+    return bool(conn.execute(f"SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (MEMBERS_TABLE,)).fetchone())
+
+# Function to recount the current table from the members table after the segment definitions changed
+def _rebuild_current(conn):
+    conn.execute(f"DELETE FROM {quote(CURRENT_TABLE)}")
+    if _members_exist(conn):
+        members = pd.read_sql_query(f"SELECT * FROM {quote(MEMBERS_TABLE)}", conn).reindex(columns=AGGREGATE_COLUMNS)
+        if len(members):
+            _add_counts(conn, segment_counts(segment_frame(members)), 1)
+    logging.info("Churn aggregates rebuilt for the new segment definitions")
+
+# Function to look up the stored version of the batch customers that are already members
+def _previous_members(conn, ids):
+    if not _members_exist(conn):
+        return None
+    conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS batch_ids ({quote(ID_COL)} TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM temp.batch_ids")
+    conn.executemany("INSERT OR IGNORE INTO temp.batch_ids VALUES (?)", ((customer,) for customer in ids))
+    # Columns of segments added since a customer was stored read as missing
+    return pd.read_sql_query(f"SELECT m.* FROM {quote(MEMBERS_TABLE)} m JOIN temp.batch_ids b USING ({quote(ID_COL)})",
+                             conn).reindex(columns=AGGREGATE_COLUMNS)
+
+def _upsert_members(conn, batch, run_ts):
+    schema = {RUN_TS_COL: "TEXT", **{col: sqlite_type(dtype) for col, dtype in batch.dtypes.items()}}
+    ensure_table(conn, MEMBERS_TABLE, schema)
+    conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {quote(f'ux_{MEMBERS_TABLE}_{ID_COL}')} "
+                 f"ON {quote(MEMBERS_TABLE)} ({quote(ID_COL)})")
+    columns = ", ".join(quote(col) for col in schema)
+    updates = ", ".join(f"{quote(col)} = excluded.{quote(col)}" for col in schema if col != ID_COL)
+    conn.executemany(f"INSERT INTO {quote(MEMBERS_TABLE)} ({columns}) VALUES ({', '.join('?' * len(schema))}) "
+                     f"ON CONFLICT({quote(ID_COL)}) DO UPDATE SET {updates}", iter_rows(batch, run_ts))
+
+# Function to fold the delta of a run (new and changed customers, as raw batches) into the aggregates
+# Changed customers are subtracted from the segments of their stored version first, so the cost is
+# proportional to the delta and history is never re-read; re-applying a run leaves the counts unchanged
+@instrument()
+def update_churn_aggregates(batches, run_ts, db_path=DB_PATH):
+    try:
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        conn = connect(db_path)
+        try:
+            with conn:
+                _create_tables(conn)
+                definition = json.dumps(SEGMENTS, sort_keys=True)
+                stored = conn.execute(f"SELECT value FROM {quote(META_TABLE)} WHERE key = 'segments'").fetchone()
+                if stored is not None and stored[0] != definition:
+                    _rebuild_current(conn)
+                conn.execute(f"INSERT OR REPLACE INTO {quote(META_TABLE)} VALUES ('segments', ?)", (definition,))
+
+                batch_counts = []
+                for batch in batches:
+                    batch = batch[AGGREGATE_COLUMNS].drop_duplicates(subset=ID_COL, keep="last")
+                    if not len(batch):
+                        continue
+                    counts = segment_counts(segment_frame(batch))
+                    previous = _previous_members(conn, batch[ID_COL].astype(str))
+                    if previous is not None and len(previous):
+                        _add_counts(conn, segment_counts(segment_frame(previous)), -1)
+                    _add_counts(conn, counts, 1)
+                    _upsert_members(conn, batch, run_ts)
+                    batch_counts.append(counts)
+                conn.execute(f"DELETE FROM {quote(CURRENT_TABLE)} WHERE customers = 0")
+
+                # Snapshot of the totals after this run, with the counts of the run's own delta
+                current = pd.read_sql_query(f"SELECT * FROM {quote(CURRENT_TABLE)}", conn)
+                if batch_counts:
+                    delta = pd.concat(batch_counts).groupby(["segment", "value"], as_index=False)[["customers", "churned"]].sum()
+                    current = current.merge(delta, on=["segment", "value"], how="left", suffixes=("", "_delta"))
+                else:
+                    current = current.assign(customers_delta=0, churned_delta=0)
+                current = current.fillna({"customers_delta": 0, "churned_delta": 0})
+                conn.execute(f"DELETE FROM {quote(RUNS_TABLE)} WHERE {quote(RUN_TS_COL)} = ?", (run_ts,))
+                conn.executemany(
+                    f"INSERT INTO {quote(RUNS_TABLE)} VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    ((segment, value, run_ts, int(customers), int(churned), int(delta_customers), int(delta_churned))
+                     for segment, value, customers, churned, delta_customers, delta_churned in
+                     current[["segment", "value", "customers", "churned", "customers_delta", "churned_delta"]]
+                     .itertuples(index=False)))
+        finally:
+            conn.close()
+        logging.info(f"Churn aggregates updated for run {run_ts} in {db_path}")
+        print(f"Churn aggregates updated in SQLite table: {CURRENT_TABLE}")
+    except Exception as e:
+        logging.error(f"Failed to update churn aggregates: {e}")
+        raise CustomException(e, sys)
+
+def _query(sql, params, db_path):
+    df = None
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (CURRENT_TABLE,)).fetchone():
+                df = pd.read_sql_query(sql, conn, params=params)
+        finally:
+            conn.close()
+    if df is None:
+        raise CustomException(f"No churn aggregates in {db_path}; run the transformation with the "
+                              f"churn_aggregates target first", sys)
+    df["churn_rate"] = df["churned"] / df["customers"].where(df["customers"] > 0)
+    return df
+
+def _check_segment(segment):
+    if segment not in SEGMENTS:
+        raise CustomException(f"Unknown segment '{segment}', expected one of {list(SEGMENTS)}", sys)
+
+# Function to read the current churn rate of every value of a segment, highest rate first
+def segment_churn(segment="all", db_path=DB_PATH):
+    _check_segment(segment)
+    df = _query(f"SELECT value, customers, churned FROM {quote(CURRENT_TABLE)} WHERE segment = ?", (segment,), db_path)
+    return df.sort_values("churn_rate", ascending=False, ignore_index=True)
+
+# Function to read the churn rate of a segment (or one value of it) after every run, oldest run first
+# delta_* columns count the new and changed customers of each run
+def churn_trend(segment="all", value=None, since=None, db_path=DB_PATH):
+    _check_segment(segment)
+    sql = (f"SELECT {quote(RUN_TS_COL)}, value, customers, churned, delta_customers, delta_churned "
+           f"FROM {quote(RUNS_TABLE)} WHERE segment = ?")
+    params = [segment]
+    if value is not None:
+        sql += " AND value = ?"
+        params.append(value)
+    if since is not None:
+        sql += f" AND {quote(RUN_TS_COL)} >= ?"
+        params.append(since)
+    df = _query(sql + f" ORDER BY {quote(RUN_TS_COL)}, value", params, db_path)
+    df["delta_churn_rate"] = df["delta_churned"] / df["delta_customers"].where(df["delta_customers"] > 0)
+    return df
@@ -1,113 +1,225 @@
 import os
+import re
 import sys
+import json
 import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
-from kaggle.api.kaggle_api_extended import KaggleApi
 from exception import CustomException
+from instrumentation import instrument
 from logger import logging
-
-# Function to ingest data from a local CSV file
-def ingest_local_csv(file_path, output_folder, timestamp):
+from fingerprint import row_hashes
+from merge import merge_sources
+from schema import COLUMNS, ID_COL, apply_column_types
+from sources import load_ingestion_params, load_sources, with_retries
+from storage import dataset_path, find_dataset, iter_dataset_chunks, read_dataset, write_dataset
+
+INGESTION_STATE_FILE = "ingestion_state.json"
+ROW_INDEX_NAME = "row_index"
+DELTA_NAME = re.compile(r"customer_churn_(?P<ts>\d{4}(_\d{2}){5})$")
+
+def load_ingestion_state(raw_data_folder):
+    state_file = os.path.join(raw_data_folder, INGESTION_STATE_FILE)
+    if not os.path.exists(state_file):
+        return {"sources": {}}
+    with open(state_file) as f:
+        return json.load(f)
+
+def save_ingestion_state(state, raw_data_folder):
+    state_file = os.path.join(raw_data_folder, INGESTION_STATE_FILE)
+    with open(state_file + ".tmp", "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(state_file + ".tmp", state_file)
+
+# Function to load the row-hash index of earlier runs (empty before the first ingestion)
+def load_row_index(raw_data_folder):
+    index_file = find_dataset(raw_data_folder, ROW_INDEX_NAME)
+    if index_file is not None:
+        return read_dataset(index_file)
+    return pd.DataFrame({ID_COL: pd.Series(dtype="object"), "row_hash": pd.Series(dtype="uint64")})
+
+# Function to keep only new or changed customers, using the row-hash index of earlier runs
+# row_index: the index (or the part of it covering the batch customers) instead of the stored one
+def extract_delta(batch, raw_data_folder, row_index=None):
     try:
-        # Read the CSV file
-        df = pd.read_csv(file_path)
-        
-        # Save the raw data to the output folder
-        output_file = os.path.join(output_folder, f"local_csv_{timestamp}.csv")
-        df.to_csv(output_file, index=False)
-        
-        logging.info(f"Successfully ingested local CSV file: {output_file}")
-        print(f"Local CSV data saved to: {output_file}")
-        return output_file
+        batch = batch.drop_duplicates(subset=ID_COL, keep="last").reset_index(drop=True)
+        hashes = row_hashes(batch, [col for col in COLUMNS if col in batch.columns])
+        if row_index is None:
+            row_index = load_row_index(raw_data_folder)
+
+        # Position of every batch customer in the index (-1 for new customers)
+        positions = pd.Index(row_index[ID_COL]).get_indexer(batch[ID_COL])
+        is_new = positions == -1
+        is_changed = np.zeros(len(batch), dtype=bool)
+        is_changed[~is_new] = row_index["row_hash"].to_numpy()[positions[~is_new]] != hashes[~is_new]
+        delta_mask = is_new | is_changed
+
+        # Changed customers are updated in place and new ones appended, so no index-wide dedup is needed
+        index_hashes = row_index["row_hash"].to_numpy(dtype="uint64").copy()
+        index_hashes[positions[is_changed]] = hashes[is_changed]
+        row_index = pd.concat([
+            pd.DataFrame({ID_COL: row_index[ID_COL].to_numpy(), "row_hash": index_hashes}),
+            pd.DataFrame({ID_COL: batch[ID_COL].astype(str).to_numpy()[is_new], "row_hash": hashes[is_new]}),
+        ], ignore_index=True)
+
+        logging.info(f"Delta: {is_new.sum()} new and {is_changed.sum()} changed customers out of {len(batch)}")
+        return batch[delta_mask].reset_index(drop=True), row_index
     except Exception as e:
-        logging.error(f"Failed to ingest local CSV file: {e}")
+        logging.error(f"Failed to extract delta rows: {e}")
         raise CustomException(e, sys)
 
-# Function to ingest data from Kaggle using the Kaggle API
-def ingest_kaggle_dataset(dataset_name, output_folder, timestamp):
+# Function to list the delta datasets customer_churn_<timestamp> of the runs up to timestamp, newest first
+def delta_datasets(raw_data_folder, timestamp):
+    names = {os.path.splitext(name)[0] for name in os.listdir(raw_data_folder)}
+    runs = sorted((match["ts"] for match in map(DELTA_NAME.match, names) if match and match["ts"] <= timestamp),
+                  reverse=True)
+    return [find_dataset(raw_data_folder, f"customer_churn_{ts}") for ts in runs]
+
+# Function to read the current customer base chunk by chunk: the latest version (up to timestamp) of every
+# customer of the row index, taken from the deltas newest first
+# dataset_file is the delta of the run; without a row index next to it (nothing ingested there) it is the base
+def iter_customer_base(dataset_file, timestamp, chunk_size, columns=None):
+    raw_data_folder = os.path.dirname(dataset_file)
+    columns = None if columns is None else list(dict.fromkeys([ID_COL, *columns]))
+    index_file = find_dataset(raw_data_folder, ROW_INDEX_NAME)
+    if index_file is None:
+        yield from iter_dataset_chunks(dataset_file, chunk_size, columns)
+        return
+    pending = set(read_dataset(index_file, [ID_COL])[ID_COL].astype(str))
+    for path in delta_datasets(raw_data_folder, timestamp):
+        if not pending:
+            break
+        for chunk in iter_dataset_chunks(path, chunk_size, columns):
+            ids = chunk[ID_COL].astype(str)
+            current = ids.isin(pending).to_numpy()
+            pending.difference_update(ids[current])
+            if current.any():
+                yield chunk[current]
+    if pending:
+        logging.warning(f"{len(pending)} customers of the row index are missing from the deltas up to {timestamp}")
+
+def read_customer_base(dataset_file, timestamp, columns=None, chunk_size=500000):
+    chunks = list(iter_customer_base(dataset_file, timestamp, chunk_size, columns))
+    base = apply_column_types(pd.concat(chunks, ignore_index=True))
+    logging.info(f"Customer base up to {timestamp}: {len(base)} customers")
+    return base
+
+RAW_DATA_FOLDER = ".././data/raw"
+
+# Function to ingest one registered source if its fingerprint changed (param.yaml ingestion.sources)
+# source: a source name or a source object of the sources module
+# Returns {"source", "path", "fingerprint"}; path is None when the source is unchanged
+@instrument()
+def ingest_source(source, timestamp, raw_data_folder=RAW_DATA_FOLDER):
+    if isinstance(source, str):
+        sources = {registered.name: registered for registered in load_sources()[0]}
+        if source not in sources:
+            raise CustomException(f"Unknown ingestion source '{source}', expected one of {list(sources)}", sys)
+        source = sources[source]
+    _, settings = load_ingestion_params()
+    previous = load_ingestion_state(raw_data_folder).get("sources", {}).get(source.name)
+    output_folder = os.path.join(raw_data_folder, f"{source.name} dataset")
+    os.makedirs(output_folder, exist_ok=True)
+    # Scratch folder for downloads, next to the output so the final rename stays on one filesystem
+    work_dir = tempfile.mkdtemp(prefix=f".{source.name}_", dir=output_folder)
     try:
-        # Check if Kaggle API key exists
-        kaggle_config_path = os.path.expanduser("~/.kaggle/kaggle.json")
-        if not os.path.exists(kaggle_config_path):
-            raise CustomException("Kaggle API key not found! Please place kaggle.json in ~/.kaggle/ or C:\\Users\\YourUsername\\.kaggle\\", sys)
-
-        # Set environment variable explicitly (optional)
-        os.environ['KAGGLE_CONFIG_DIR'] = os.path.dirname(kaggle_config_path)
-        # Initialize Kaggle API
-        api = KaggleApi()
-        api.authenticate()
-        
-        # Ensure output folder exists
-        os.makedirs(output_folder, exist_ok=True)
-
-        # Define a temp folder for dataset extraction
-        temp_folder = os.path.join(output_folder, "temp_kaggle_download")
-        os.makedirs(temp_folder, exist_ok=True)
-
-        # Download the dataset (unzipped)
-        api.dataset_download_files(dataset_name, path=temp_folder, unzip=True)
-
-        # Find the actual file inside the temp folder
-        downloaded_files = os.listdir(temp_folder)
-        if not downloaded_files:
-            raise CustomException("No files were downloaded from Kaggle!", sys)
-
-        # Get the first file found (assuming one main dataset file)
-        downloaded_file_path = os.path.join(temp_folder, downloaded_files[0])
-
-        # Set custom filename with timestamp
-        final_file_path = os.path.join(output_folder, f"kaggle_csv_{timestamp}.csv")
-
-        # Rename the downloaded file to the custom filename
-        shutil.move(downloaded_file_path, final_file_path)
-
-        # Clean up temp folder
-        os.rmdir(temp_folder)
-
-        logging.info(f"Successfully ingested Kaggle dataset: {dataset_name}")
-        print(f"Kaggle dataset saved to: {output_folder}")
-        return final_file_path
+        fingerprint = with_retries(lambda: source.fingerprint(previous, work_dir), f"Fingerprint of source '{source.name}'",
+                                   settings["retries"], settings["backoff_s"])
+        if fingerprint["sha256"] == (previous or {}).get("sha256"):
+            logging.info(f"Source '{source.name}' unchanged, skipping ingestion.")
+            return {"source": source.name, "path": None, "fingerprint": fingerprint}
+
+        df = source.fetch(work_dir)
+        # Save the raw data to the output folder in the columnar storage format
+        path = dataset_path(output_folder, f"{source.name}_dataset_{timestamp}")
+        write_dataset(df, path)
+        logging.info(f"Successfully ingested source '{source.name}' ({len(df)} rows): {path}")
+        print(f"Source '{source.name}' saved to: {path}")
+        return {"source": source.name, "path": path, "fingerprint": fingerprint}
     except Exception as e:
-        logging.error(f"Failed to ingest Kaggle dataset: {e}")
+        logging.error(f"Failed to ingest source '{source.name}': {e}")
         raise CustomException(e, sys)
-
-# Main function to run the ingestion process and store raw data in local folder
-def run_data_ingestion(timestamp):
-
-    # Define output folder for raw data
-    raw_data_folder = ".././data/raw"
-
-    local_file_output_folder = os.path.join(raw_data_folder,"local dataset")
-    os.makedirs(local_file_output_folder, exist_ok=True)
-    kaggle_file_output_folder = os.path.join(raw_data_folder,"kaggle dataset")
-    os.makedirs(kaggle_file_output_folder, exist_ok=True)
-    
-    # Ingest local CSV file
-    local_csv_path = ".././data/Telco-customer-churn.csv"  # Replace with your local CSV file path
-    local_csv_file_path = ingest_local_csv(local_csv_path, local_file_output_folder, timestamp)
-    
-    # Ingest Kaggle dataset 
-    kaggle_dataset = "praptiag/telco-churn-dataset"  # Replace with your Kaggle dataset name
-    kaggle_csv_file_path = ingest_kaggle_dataset(kaggle_dataset, kaggle_file_output_folder, timestamp)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+# Function to find the latest snapshot <name>_dataset_<timestamp> of a source, up to timestamp
+def latest_source_dataset(source_name, timestamp, raw_data_folder=RAW_DATA_FOLDER):
+    folder = os.path.join(raw_data_folder, f"{source_name} dataset")
+    if not os.path.isdir(folder):
+        return None
+    pattern = re.compile(re.escape(source_name) + r"_dataset_(?P<ts>\d{4}(_\d{2}){5})$")
+    names = {os.path.splitext(name)[0] for name in os.listdir(folder)}
+    runs = sorted(match["ts"] for match in map(pattern.match, names) if match and match["ts"] <= timestamp)
+    return find_dataset(folder, f"{source_name}_dataset_{runs[-1]}") if runs else None
+
+# Function to list the (source name, snapshot path) pairs to merge, in registry order
+# Every source is merged, unchanged ones from their latest snapshot: merging only the changed
+# sources would let an older source override the customers it shares with a newer one
+def source_datasets(results, timestamp, raw_data_folder=RAW_DATA_FOLDER):
+    datasets = []
+    for result in results:
+        path = result["path"] or latest_source_dataset(result["source"], timestamp, raw_data_folder)
+        if path is None:
+            logging.warning(f"No snapshot of unchanged source '{result['source']}', leaving it out of the merge")
+            continue
+        datasets.append((result["source"], path))
+    return datasets
+
+# Function to record the fingerprints of the changed sources once their customers are combined
+def save_source_fingerprints(results, raw_data_folder=RAW_DATA_FOLDER):
+    state = load_ingestion_state(raw_data_folder)
+    state.setdefault("sources", {}).update(
+        {result["source"]: result["fingerprint"] for result in results if result["path"] is not None})
+    save_ingestion_state(state, raw_data_folder)
+
+# Function to combine the ingested sources into the delta dataset customer_churn_<timestamp>
+# and record the new source fingerprints; returns None when nothing changed
+@instrument()
+def combine_sources(results, timestamp, raw_data_folder=RAW_DATA_FOLDER):
+    changed = [result for result in results if result["path"] is not None]
+    if not changed:
+        logging.info("No source changed since the last ingestion.")
+        print("No source changed since the last ingestion.")
+        return None
     try:
-        # Combined both raw dataframes
-        local_df = pd.read_csv(local_csv_file_path)
-        kaggle_df = pd.read_csv(kaggle_csv_file_path)
-
-        combined_dataset = pd.concat([local_df, kaggle_df], ignore_index=True)
-        # Save combined dataset with timestamp
-        combined_file_path = os.path.join(raw_data_folder, f"customer_churn_{timestamp}.csv")
-        combined_dataset.to_csv(combined_file_path, index=False)
-        
-        logging.info(f"Customer Churn dataset saved to: {combined_file_path}")
-        print(f"Customer Churn raw dataset saved to: {combined_file_path}")
-
-        # # Remove the individual local and Kaggle dataset files
-        # os.remove(local_csv_file_path)
-        # os.remove(kaggle_csv_file_path)
-        
-        # logging.info("Removed individual local and Kaggle dataset files.")
-        # print("Removed individual local and Kaggle dataset files.")
+        # Merge the sources on customerID; overlapping customers are kept once
+        combined_dataset = merge_sources([(source, read_dataset(path))
+                                          for source, path in source_datasets(results, timestamp, raw_data_folder)])
+
+        delta, row_index = extract_delta(combined_dataset, raw_data_folder)
+        combined_file_path = None
+        if len(delta) > 0:
+            # Save the delta dataset with timestamp
+            combined_file_path = dataset_path(raw_data_folder, f"customer_churn_{timestamp}")
+            write_dataset(delta, combined_file_path)
+            write_dataset(row_index, dataset_path(raw_data_folder, ROW_INDEX_NAME))
+            logging.info(f"Customer Churn dataset saved to: {combined_file_path}")
+            print(f"Customer Churn raw dataset saved to: {combined_file_path}")
+        else:
+            logging.info("Changed sources contain no new or changed customers.")
+            print("Changed sources contain no new or changed customers.")
+
+        save_source_fingerprints(results, raw_data_folder)
+        return combined_file_path
     except Exception as e:
         logging.error(f"Failed to save raw dataset: {e}")
         raise CustomException(e, sys)
+
+# Function to ingest every registered source concurrently; returns the ingest_source results in registry order
+def ingest_sources(timestamp, sources=None):
+    sources, settings = load_sources(sources)
+    workers = max(1, min(settings["max_concurrency"], len(sources)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest") as pool:
+        return list(pool.map(lambda source: ingest_source(source, timestamp), sources))
+
+# Main function to run the ingestion process and store raw data in local folder
+# Only sources whose fingerprint changed are re-ingested, and only new or changed
+# customers are written to customer_churn_<timestamp>; returns None when nothing changed
+# Sources are ingested concurrently by at most ingestion.max_concurrency threads (ingestion is
+# network and file I/O bound) and merged in registry order; sources: source specs overriding param.yaml
+@instrument()
+def run_data_ingestion(timestamp, sources=None):
+    return combine_sources(ingest_sources(timestamp, sources), timestamp)
+
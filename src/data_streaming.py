@@ -0,0 +1,188 @@
+import os
+import sys
+import shutil
+import tempfile
+import pandas as pd
+from logger import logging
+from exception import CustomException
+from instrumentation import instrument
+from data_ingestion import (RAW_DATA_FOLDER, ROW_INDEX_NAME, extract_delta, ingest_sources, iter_customer_base,
+                            load_row_index, save_source_fingerprints, source_datasets)
+from merge import merge_sources
+from data_validation import validate_dataset
+from preprocessor import PartialStats, clean_data, reusable_preprocessor, save_preprocessor, transform, unseen_levels
+from features import requested_features
+from schema import ID_COL, NUM_COLS
+from stats import RunningMoments
+from sqlite_writer import write_table
+from churn_aggregates import AGGREGATE_COLUMNS, update_churn_aggregates
+from feature_store import FeatureStore
+from storage import dataset_path, find_dataset, iter_dataset_chunks, open_dataset_writer, read_dataset, write_dataset
+
+DEFAULT_CHUNK_SIZE = 50000
+
+# Bucket of every customer: all the records of a customer, in every source, land in the same bucket
+def customer_buckets(ids, n_buckets):
+    return pd.util.hash_pandas_object(ids.astype(str), index=False).to_numpy() % n_buckets
+
+# Streaming version of data_ingestion.combine_sources
+# The source snapshots are split chunk by chunk into customerID hash buckets of about chunk_size rows,
+# then each bucket is merged and compared with its part of the row index on its own, so only one
+# bucket (and the two-column row index) is ever in memory
+@instrument()
+def stream_combine_sources(results, timestamp, chunk_size=DEFAULT_CHUNK_SIZE, raw_data_folder=RAW_DATA_FOLDER):
+    changed = [result for result in results if result["path"] is not None]
+    if not changed:
+        logging.info("No source changed since the last ingestion.")
+        print("No source changed since the last ingestion.")
+        return None
+    work_dir = tempfile.mkdtemp(prefix=".buckets_", dir=raw_data_folder)
+    try:
+        datasets = source_datasets(results, timestamp, raw_data_folder)
+        rows = sum(len(chunk) for _, path in datasets for chunk in iter_dataset_chunks(path, chunk_size, [ID_COL]))
+        n_buckets = max(1, -(-rows // chunk_size))
+
+        # Buckets are CSV files: a CSV writer takes chunks whatever their inferred column types
+        buckets = {}
+        for source, path in datasets:
+            writers = {}
+            try:
+                for chunk in iter_dataset_chunks(path, chunk_size):
+                    bucket = customer_buckets(chunk[ID_COL], n_buckets)
+                    for b in pd.unique(bucket):
+                        if b not in writers:
+                            bucket_file = dataset_path(work_dir, f"{source}_{b}", "csv")
+                            writers[b] = open_dataset_writer(bucket_file)
+                            buckets.setdefault(b, []).append((source, bucket_file))
+                        writers[b].write(chunk[bucket == b])
+            finally:
+                for writer in writers.values():
+                    writer.close()
+
+        row_index = load_row_index(raw_data_folder)
+        index_bucket = customer_buckets(row_index[ID_COL], n_buckets)
+        index_parts = [row_index[index_bucket == b] for b in range(n_buckets) if b not in buckets]
+        combined_file_path = dataset_path(raw_data_folder, f"customer_churn_{timestamp}")
+        delta_rows = 0
+        with open_dataset_writer(combined_file_path) as writer:
+            for b in sorted(buckets):
+                # Sources stay in registry order within a bucket, so merge_sources resolves conflicts as usual
+                merged = merge_sources([(source, read_dataset(bucket_file)) for source, bucket_file in buckets[b]])
+                delta, index_part = extract_delta(merged, raw_data_folder, row_index[index_bucket == b])
+                index_parts.append(index_part)
+                if len(delta) > 0:
+                    writer.write(delta)
+                    delta_rows += len(delta)
+
+        if delta_rows > 0:
+            write_dataset(pd.concat(index_parts, ignore_index=True), dataset_path(raw_data_folder, ROW_INDEX_NAME))
+            logging.info(f"Customer Churn dataset saved to: {combined_file_path} ({delta_rows} rows, {n_buckets} buckets)")
+            print(f"Customer Churn raw dataset saved to: {combined_file_path}")
+        else:
+            combined_file_path = None
+            logging.info("Changed sources contain no new or changed customers.")
+            print("Changed sources contain no new or changed customers.")
+
+        save_source_fingerprints(results, raw_data_folder)
+        return combined_file_path
+    except Exception as e:
+        logging.error(f"Failed to stream the sources into the delta dataset: {e}")
+        raise CustomException(e, sys)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+# First pass: accumulate the statistics that need the full dataset
+# chunks: function returning a fresh iterator over the raw chunks (called once per pass)
+@instrument()
+def fit_streaming_stats(chunks, q1=0.05, q3=0.95):
+    try:
+        stats = PartialStats(NUM_COLS)
+        for chunk in chunks():
+            stats.update(clean_data(chunk))
+        thresholds = stats.thresholds(q1, q3)
+
+        # Scaler moments are only exact for unclipped columns; rescan clipped columns
+        clipped = stats.clipped_columns(thresholds)
+        moments = {col: RunningMoments() for col in clipped}
+        if clipped:
+            for chunk in chunks():
+                chunk = clean_data(chunk)
+                for col in clipped:
+                    moments[col].update(chunk[col].clip(*thresholds[col]))
+
+        state = stats.build(thresholds, moments, requested_features())
+        logging.info(f"Streaming statistics fitted on {stats.rows} rows (clipped columns: {clipped})")
+        return state
+    except Exception as e:
+        logging.error(f"Failed to fit streaming statistics: {e}")
+        raise CustomException(e, sys)
+
+# Streaming version of data_transformation_FE.run_data_transformation
+# Like prepare_data, the saved preprocessor encodes the delta; a new one is fitted on the whole
+# customer base, which is then re-encoded
+@instrument()
+def run_streaming_transformation(timestamp, chunk_size=DEFAULT_CHUNK_SIZE, refit=False):
+    try:
+        raw_data_folder = ".././data/raw"
+        clean_data_folder = ".././data/transformed"
+        os.makedirs(clean_data_folder, exist_ok=True)
+        db_folder = ".././data/database"
+        os.makedirs(db_folder, exist_ok=True)
+
+        dataset_file = find_dataset(raw_data_folder, f"customer_churn_{timestamp}")
+        if dataset_file is None:
+            return None
+
+        preprocessor = None if refit else reusable_preprocessor(requested_features())
+        if preprocessor is not None:
+            chunks = lambda: iter_dataset_chunks(dataset_file, chunk_size)
+        else:
+            chunks = lambda: iter_customer_base(dataset_file, timestamp, chunk_size)
+            preprocessor = fit_streaming_stats(chunks)
+            save_preprocessor(preprocessor, timestamp)
+
+        clean_data_file = dataset_path(clean_data_folder, f"clean_dataset_{timestamp}")
+        db_path = os.path.join(db_folder, "customer_churn.db")
+        table_name = "transformed_data"
+        # Each chunk is also published to the feature store snapshot of this run
+        store = FeatureStore()
+        try:
+            with open_dataset_writer(clean_data_file) as writer:
+                for chunk in chunks():
+                    unseen = unseen_levels(chunk, preprocessor)
+                    if unseen:
+                        logging.warning(f"Levels unseen by the preprocessor are encoded as all-zero indicators: {unseen}; "
+                                        f"run the transformation with --refit to add them")
+                    transformed = transform(clean_data(chunk), preprocessor)
+                    writer.write(transformed)
+                    write_table(transformed, db_path, table_name, timestamp, mode="upsert", key=ID_COL)
+                    store.upsert(transformed, timestamp)
+        finally:
+            store.close()
+        # The raw delta is read again for the segment columns only, chunk by chunk
+        update_churn_aggregates(iter_dataset_chunks(dataset_file, chunk_size, AGGREGATE_COLUMNS), timestamp, db_path)
+
+        logging.info(f"Streaming transformation completed. Clean dataset saved to: {clean_data_file}")
+        print(f"Clean dataset saved to: {clean_data_file}")
+        print(f"Transformed data saved to SQLite table: {table_name}")
+        return clean_data_file
+    except Exception as e:
+        logging.error(f"Failed to run streaming transformation: {e}")
+        raise CustomException(e, sys)
+
+# Main function to run the whole pipeline in streaming mode
+# Ingestion uses the same registered sources, merge and delta state as the regular one, so both modes
+# write the same customer_churn_<timestamp> delta; the merge, delta, validation and transformation
+# then process it in chunks
+@instrument()
+def run_streaming_pipeline(timestamp, chunk_size=DEFAULT_CHUNK_SIZE, refit=False):
+    dataset_file = stream_combine_sources(ingest_sources(timestamp), timestamp, chunk_size)
+    if dataset_file is None:
+        logging.info("No new or changed customers, nothing to stream.")
+        return None
+
+    report_folder = "../data/validation_reports"
+    os.makedirs(report_folder, exist_ok=True)
+    validate_dataset(dataset_file, report_folder, f"customer_churn_{timestamp}", chunk_size)
+
+    return run_streaming_transformation(timestamp, chunk_size, refit)
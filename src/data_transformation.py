@@ -1,23 +1,21 @@
 import os
 import sys
 import pandas as pd
-import sqlite3
 from datetime import datetime
 from logger import logging
 from exception import CustomException
+from schema import ID_COL
+from sqlite_writer import write_table
+from features import evaluate_features, fit_features, frame_aggregate
 
 # Function to perform feature engineering
-def transform_data(df):
+# The features are declared in features.FEATURES; frozen (from an earlier fit) skips refitting
+# fit-time constants such as the MonthlyCharges median
+def transform_data(df, frozen=None, names=("tenure_months", "avg_monthly_charges", "high_monthly_charges")):
     try:
-        # Example: Create a new feature for customer tenure in months
-        df['tenure_months'] = df['tenure']  # Assuming 'tenure' is already in months
-        
-        # Example: Create a new feature for average monthly charges
-        df['avg_monthly_charges'] = df['TotalCharges'] / df['tenure_months']
-        
-        # Example: Create a binary feature for high monthly charges
-        df['high_monthly_charges'] = (df['MonthlyCharges'] > df['MonthlyCharges'].median()).astype(int)
-        
+        frozen = frozen or fit_features(names, frame_aggregate(df))
+        df = df.assign(**evaluate_features(frozen, df))
+
         logging.info("Feature engineering completed.")
         return df
     except Exception as e:
@@ -25,19 +23,16 @@ def transform_data(df):
         raise CustomException(e, sys)
 
 # Function to store transformed data in SQLite
-def store_transformed_data(df, db_path, table_name):
+# Each run is a run_ts partition of one table; rows are upserted on customerID when it is present
+def store_transformed_data(df, db_path, table_name, run_ts):
     try:
-        # Connect to SQLite database
-        conn = sqlite3.connect(db_path)
-        
-        # Store the transformed data in a table
-        df.to_sql(table_name, conn, if_exists='replace', index=False)
+        if ID_COL in df.columns:
+            write_table(df, db_path, table_name, run_ts, mode="upsert", key=ID_COL)
+        else:
+            write_table(df, db_path, table_name, run_ts, mode="replace_partition")
         
         logging.info(f"Transformed data saved to SQLite table: {table_name}")
         print(f"Transformed data saved to SQLite table: {table_name}")
-        
-        # Close the database connection
-        conn.close()
     except Exception as e:
         logging.error(f"Failed to store transformed data: {e}")
         raise CustomException(e, sys)
@@ -55,7 +50,7 @@ def run_data_transformation(df, timestamp):
         # Store the transformed data in SQLite
         db_path = os.path.join(db_folder, "customer_churn.db")
         table_name = "transformed_data"
-        store_transformed_data(transformed_df, db_path, table_name)
+        store_transformed_data(transformed_df, db_path, table_name, timestamp)
     except Exception as e:
         logging.error(f"Failed to run data transformation: {e}")
         raise CustomException(e, sys)
\ No newline at end of file
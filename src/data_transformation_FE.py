@@ -1,67 +1,139 @@
 import os
 import sys
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
-import numpy as np
+import pyarrow as pa
 from logger import logging
 from exception import CustomException
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
-from datetime import datetime
-import sqlite3
-from data_preparation import perform_eda
+from instrumentation import instrument
+from storage import dataset_path, find_dataset, get_backend, read_dataset, write_dataset
+from schema import ID_COL, NUM_COLS, TARGET_COL
+from sqlite_writer import write_table
+from preprocessor import (PartialStats, clean_data, fit_preprocessor, input_columns, reusable_preprocessor,
+                          save_preprocessor, transform, unseen_levels)
+from stats import RunningMoments, outlier_thresholds
+from feature_store import run_feature_store_update
+from churn_aggregates import AGGREGATE_COLUMNS, update_churn_aggregates
+from features import requested_features
+from data_ingestion import read_customer_base
 
-# Function to clean and transform the dataset
-def prepare_data(raw_data_folder, clean_data_folder, eda_folder, timestamp):
+# Column holding the original row position of a partitioned row
+ROW_POSITION_COL = "__row_position"
+# Partitions are exchanged as memory-mapped Arrow IPC files
+PARTITION_BACKEND = get_backend("arrow")
+
+# Worker: read one partition through its memory map and apply the row-local cleaning
+def _read_partition(path):
+    return clean_data(PARTITION_BACKEND.read(path).set_index(ROW_POSITION_COL).rename_axis(None))
+
+# Worker: partial statistics of one partition (the only thing sent back is the small stats object)
+# Each partition seeds its sketches with its own index, so the merged thresholds are reproducible
+def _partition_stats(job):
+    path, num_cols, seed = job
+    return PartialStats(num_cols, seed).update(_read_partition(path))
+
+# Worker: scaler moments of the clipped columns of one partition
+def _partition_clipped_moments(job):
+    path, thresholds = job
+    df = _read_partition(path)
+    return {col: RunningMoments().update(df[col].clip(*limits)) for col, limits in thresholds.items()}
+
+# Worker: transform one partition with the reduced state and write it next to its input
+def _partition_transform(job):
+    path, output_path, state = job
+    transformed = transform(_read_partition(path), state)
+    PARTITION_BACKEND.write(transformed.rename_axis(ROW_POSITION_COL).reset_index(), output_path)
+    return len(transformed)
+
+# Function to clean, fit and transform in a process pool over customerID hash partitions
+# Only the global statistics (quantile sketches, scaler moments, category vocabularies) are
+# merged in this process; rows travel as memory-mapped Arrow IPC files, never pickled
+# preprocessor: a fitted state to transform with, skipping the fit
+@instrument()
+def prepare_partitioned(combined_data, num_cols, n_partitions, q1=0.05, q3=0.95, preprocessor=None):
+    work_dir = tempfile.mkdtemp(prefix="churn_prep_")
     try:
-        # Load the latest local CSV file
-        combined_data = pd.read_csv(raw_data_folder)
-        num_cols = ["tenure","MonthlyCharges","TotalCharges"]
-        categorical_cols = combined_data.select_dtypes(include=['object']).columns
-        
-        # Drop CustomerID column
-        combined_data = combined_data.drop("customerID", axis=1)
-        
-        # Handle datatype for TotalCharges
-        combined_data['TotalCharges'] = pd.to_numeric(combined_data['TotalCharges'], errors='coerce')
-        combined_data['TotalCharges'] = combined_data['TotalCharges'].replace([np.inf, -np.inf], np.nan)  
-        combined_data = combined_data.dropna(subset=['TotalCharges'])  
-        
-        # Handle missing values
-        combined_data.dropna(inplace=True)
+        # The same customer always lands in the same partition
+        partition = pd.util.hash_pandas_object(combined_data[ID_COL], index=False).to_numpy() % n_partitions
+        # Empty partitions are skipped: their all-null columns get other Arrow types than the filled ones
+        parts = sorted(pd.unique(partition)) or [0]
+        paths = [os.path.join(work_dir, f"partition_{i}.arrow") for i in parts]
+        positioned = combined_data.rename_axis(ROW_POSITION_COL).reset_index()
+        for i, path in zip(parts, paths):
+            PARTITION_BACKEND.write(positioned[partition == i], path)
+        del positioned
 
-        #Label encoding of target column
-        combined_data["Churn"] = combined_data["Churn"].replace({"Yes": 1, "No": 0})
-        
-        # Perform EDA
-        perform_eda(combined_data, eda_folder, timestamp, num_cols, categorical_cols)
+        with ProcessPoolExecutor(max_workers=len(paths)) as pool:
+            if preprocessor is None:
+                stats = PartialStats(num_cols)
+                for partial in pool.map(_partition_stats, [(path, num_cols, seed) for seed, path in enumerate(paths)]):
+                    stats.merge(partial)
+                thresholds = stats.thresholds(q1, q3)
+                clipped = {col: thresholds[col] for col in stats.clipped_columns(thresholds)}
+                moments = {col: RunningMoments() for col in clipped}
+                if clipped:
+                    for partial in pool.map(_partition_clipped_moments, [(path, clipped) for path in paths]):
+                        for col, moment in partial.items():
+                            moments[col].merge(moment)
+                preprocessor = stats.build(thresholds, moments, requested_features())
 
-        # Handle outliers
-        for cols in num_cols:
-            if check_outlier(combined_data, cols):
-                replace_with_thresholds(combined_data, cols)
+            outputs = [path.replace("partition_", "transformed_") for path in paths]
+            rows = sum(pool.map(_partition_transform, [(path, output, preprocessor) for path, output in zip(paths, outputs)]))
 
-        # Standardize numerical attributes
-        scaler = StandardScaler()
-        combined_data[num_cols] = scaler.fit_transform(combined_data[num_cols])
-        
-        # Encode categorical variables
-        encoder = OneHotEncoder(drop='first', sparse_output=False)  # Use sparse_output=False for dense array
-    
-        # Encode categorical columns
-        if len(categorical_cols) > 0:
-            encoded_cols = encoder.fit_transform(combined_data[categorical_cols])
-            encoded_df = pd.DataFrame(encoded_cols, columns=encoder.get_feature_names_out(categorical_cols))
-            
-            # Combine numerical and encoded categorical data
-            combined_data = pd.concat([combined_data.drop(categorical_cols, axis=1), encoded_df], axis=1)
+        # The partition outputs are mapped, not read, and put back in the input row order
+        table = pa.concat_tables([PARTITION_BACKEND.read_table(output) for output in outputs])
+        transformed = table.to_pandas().set_index(ROW_POSITION_COL).rename_axis(None).sort_index()
+        logging.info(f"Prepared {rows} rows in {len(paths)} partitions")
+        return transformed, preprocessor
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+# Function to clean and transform the dataset (the delta of a run)
+# The saved preprocessor encodes every delta, so all partitions of the feature table share one encoding.
+# A preprocessor is only fitted (first run, other requested features, or refit=True) on the whole current
+# customer base, which is then returned re-encoded in full; a delta alone never replaces the saved fit
+# partitions > 1 runs cleaning, fitting and encoding in that many processes (approximate quantiles)
+# columns projects the read of the delta (planner.transform_columns); clean_data_folder=None skips the clean snapshot
+@instrument()
+def prepare_data(raw_data_folder, clean_data_folder, timestamp, partitions=None, columns=None, refit=False):
+    try:
+        num_cols = NUM_COLS
+        preprocessor = None if refit else reusable_preprocessor(requested_features())
+        if preprocessor is not None:
+            # Load the delta of the run; a projection is widened to every input of the saved preprocessor
+            if columns is not None:
+                columns = list(dict.fromkeys([*columns, *input_columns(preprocessor), TARGET_COL]))
+            combined_data = read_dataset(raw_data_folder, columns)
+            unseen = unseen_levels(combined_data, preprocessor)
+            if unseen:
+                logging.warning(f"Levels unseen by the preprocessor are encoded as all-zero indicators: {unseen}; "
+                                f"run the transformation with --refit to add them")
         else:
-            logging.info("No categorical columns to encode.")
-        
-        # Save the cleaned dataset
-        clean_data_file = os.path.join(clean_data_folder, f"clean_dataset_{timestamp}.csv")
-        combined_data.to_csv(clean_data_file, index=False)
+            # A new preprocessor is fitted on every column, whatever the projection
+            combined_data = read_customer_base(raw_data_folder, timestamp)
+
+        if partitions and partitions > 1:
+            combined_data, fitted = prepare_partitioned(combined_data, num_cols, partitions, preprocessor=preprocessor)
+        else:
+            # Fix TotalCharges, drop missing values and label encode the target
+            combined_data = clean_data(combined_data)
+
+            # Fit outlier thresholds, scaler, encoder and the requested features once and keep them for scoring
+            fitted = preprocessor or fit_preprocessor(combined_data, num_cols, features=requested_features())
 
-        logging.info(f"Data preparation completed. Clean dataset saved to: {clean_data_file}")
-        print(f"Clean dataset saved to: {clean_data_file}")
+            # Clip, standardize and one-hot encode with the fitted state
+            combined_data = transform(combined_data, fitted)
+        if preprocessor is None:
+            save_preprocessor(fitted, timestamp)
+        
+        # Save the cleaned dataset in the columnar format, which keeps the compact dtypes
+        if clean_data_folder is not None:
+            clean_data_file = dataset_path(clean_data_folder, f"clean_dataset_{timestamp}")
+            write_dataset(combined_data, clean_data_file)
+            logging.info(f"Data preparation completed. Clean dataset saved to: {clean_data_file}")
+            print(f"Clean dataset saved to: {clean_data_file}")
         return combined_data
     except Exception as e:
         logging.error(f"Failed to prepare data: {e}")
@@ -69,68 +141,75 @@ def prepare_data(raw_data_folder, clean_data_folder, eda_folder, timestamp):
 
 #Define a Function about outlier threshold for data columns
 def outlier_th(dataframe, col_name, q1=0.05, q3=0.95):
-    quartile1 = dataframe[col_name].quantile(q1)
-    quartile3 = dataframe[col_name].quantile(q3)
-    interquantile_range = quartile3 - quartile1
-    up_limit = quartile3 + 1.5 * interquantile_range
-    low_limit = quartile1 - 1.5 * interquantile_range
-    return low_limit, up_limit
+    return outlier_thresholds(dataframe, [col_name], q1, q3)[col_name]
 
 #Define a Function about checking outlier for data columns
-def check_outlier(dataframe, col_name):
-    low_limit, up_limit = outlier_th(dataframe, col_name)
-    if dataframe[(dataframe[col_name] > up_limit) | (dataframe[col_name] < low_limit)].any(axis=None):
-        return True
-    else:
-        return False
+# limits can be passed in to reuse thresholds computed once with outlier_thresholds
+def check_outlier(dataframe, col_name, limits=None):
+    low_limit, up_limit = limits or outlier_th(dataframe, col_name)
+    values = dataframe[col_name]
+    return bool(values.min() < low_limit or values.max() > up_limit)
 
 #Define a Function about replace with threshold for data columns
-def replace_with_thresholds(dataframe, variable):
-    low_limit, up_limit = outlier_th(dataframe, variable)
-    dataframe.loc[(dataframe[variable] < low_limit), variable] = low_limit
-    dataframe.loc[(dataframe[variable] > up_limit), variable] = up_limit
+def replace_with_thresholds(dataframe, variable, limits=None):
+    low_limit, up_limit = limits or outlier_th(dataframe, variable)
+    dataframe[variable] = dataframe[variable].clip(low_limit, up_limit)
 
 # Function to store transformed data in SQLite
-def store_transformed_data(df, db_path, table_name):
+# Each run is a run_ts partition of one table; rows are upserted on customerID when it is present
+@instrument()
+def store_transformed_data(df, db_path, table_name, run_ts):
     try:
-        # Connect to SQLite database
-        conn = sqlite3.connect(db_path)
-        
-        # Store the transformed data in a table
-        df.to_sql(table_name, conn, if_exists='replace', index=False)
+        if ID_COL in df.columns:
+            write_table(df, db_path, table_name, run_ts, mode="upsert", key=ID_COL)
+        else:
+            write_table(df, db_path, table_name, run_ts, mode="replace_partition")
         
         logging.info(f"Transformed data saved to SQLite table: {table_name}")
         print(f"Transformed data saved to SQLite table: {table_name}")
-        
-        # Close the database connection
-        conn.close()
     except Exception as e:
         logging.error(f"Failed to store transformed data: {e}")
         raise CustomException(e, sys)
 
 # Main function to run data preparation
-def run_data_transformation(timestamp):
+# dataset_file can be passed in (e.g. by the orchestrator) to skip the lookup by timestamp
+# partitions > 1 prepares the data in a process pool over customerID hash partitions
+# outputs: which of clean_dataset, feature_table, feature_store and churn_aggregates to write (all by default);
+# columns: raw columns to read (all by default), see planner.make_plan
+# refit=True fits a new preprocessor on the whole customer base instead of reusing the saved one
+@instrument()
+def run_data_transformation(timestamp, dataset_file=None, partitions=None, outputs=None, columns=None, refit=False):
     try:
+        outputs = set(outputs or ("clean_dataset", "feature_table", "feature_store", "churn_aggregates"))
         # Define folders
         raw_data_folder = ".././data/raw"
-        clean_data_folder = ".././data/transformed"
-        os.makedirs(clean_data_folder, exist_ok=True)
-        eda_data_folder = f".././data/EDA_results/EDA_{timestamp}"
-        os.makedirs(eda_data_folder, exist_ok=True)
+        clean_data_folder = ".././data/transformed" if "clean_dataset" in outputs else None
+        if clean_data_folder is not None:
+            os.makedirs(clean_data_folder, exist_ok=True)
 
         # Folder to store in db
         db_folder = ".././data/database"
         os.makedirs(db_folder, exist_ok=True)
 
-        csv_file = os.path.join(raw_data_folder, f"customer_churn_{timestamp}.csv")
-        if os.path.exists(csv_file):
+        dataset_file = dataset_file or find_dataset(raw_data_folder, f"customer_churn_{timestamp}")
+        if dataset_file is not None:
             # Run data cleaning and transformation
-            transformed_df = prepare_data(csv_file, clean_data_folder, eda_data_folder, timestamp)
+            transformed_df = prepare_data(dataset_file, clean_data_folder, timestamp, partitions, columns, refit)
+
+            # Store the transformed data in SQLite, one partition per run
+            if "feature_table" in outputs:
+                db_path = os.path.join(db_folder, "customer_churn.db")
+                table_name = "transformed_data"
+                store_transformed_data(transformed_df, db_path, table_name, timestamp)
+
+            # Publish the features of this run as a point-in-time snapshot
+            if "feature_store" in outputs:
+                run_feature_store_update(transformed_df, timestamp)
 
-            # Store the transformed data in SQLite
-            db_path = os.path.join(db_folder, f"customer_churn_{timestamp}.db")
-            table_name = "transformed_data"
-            store_transformed_data(transformed_df, db_path, table_name)
+            # Fold the delta of this run into the churn aggregates by segment
+            if "churn_aggregates" in outputs:
+                update_churn_aggregates([read_dataset(dataset_file, columns=AGGREGATE_COLUMNS)], timestamp,
+                                        os.path.join(db_folder, "customer_churn.db"))
     except Exception as e:
         logging.error(f"Failed to run data transformation: {e}")
         raise CustomException(e, sys)
@@ -1,77 +1,231 @@
 import os
 import sys
+import json
+import time
+import numpy as np
 import pandas as pd
+from pandas.api.types import is_integer_dtype, is_numeric_dtype, is_object_dtype, is_string_dtype
 from datetime import datetime
 from exception import CustomException
+from instrumentation import instrument
 from logger import logging
+from fingerprint import row_hashes
+from schema import VALIDATION_SCHEMA
+from storage import find_dataset, iter_dataset_chunks, read_dataset
 
-# Function to validate a dataset
-def validate_dataset(dataset_path, report_folder, dataset_name):
+# Column kinds a schema can ask for
+DTYPE_CHECKS = {
+    "string": lambda dtype: is_object_dtype(dtype) or is_string_dtype(dtype),
+    "category": lambda dtype: isinstance(dtype, pd.CategoricalDtype) or is_object_dtype(dtype),
+    "int": is_integer_dtype,
+    "float": lambda dtype: is_numeric_dtype(dtype) and not isinstance(dtype, pd.CategoricalDtype),
+}
+
+def empty_partial(schema=VALIDATION_SCHEMA):
+    columns = schema["columns"]
+    return {
+        "rows": 0,
+        "missing_columns": set(),
+        "dtypes": {col: set() for col in columns},
+        "dtype_ok": {col: True for col in columns},
+        "nulls": {col: 0 for col in columns},
+        "out_of_range": {},
+        "numeric": {},
+        "level_counts": {},
+        "key_hashes": [],
+        "timings": {},
+    }
+
+def add_timing(partial, check, start):
+    partial["timings"][check] = partial["timings"].get(check, 0.0) + time.perf_counter() - start
+
+# Function to run every check of the schema over one DataFrame (or chunk) in a single pass
+def validate_chunk(df, partial=None, schema=VALIDATION_SCHEMA):
+    partial = partial or empty_partial(schema)
+    columns = {col: rules for col, rules in schema["columns"].items() if col in df.columns}
+    partial["rows"] += len(df)
+
+    # Column presence and dtypes only look at metadata
+    start = time.perf_counter()
+    partial["missing_columns"].update(col for col in schema["columns"] if col not in df.columns)
+    for col, rules in columns.items():
+        partial["dtypes"][col].add(str(df[col].dtype))
+        partial["dtype_ok"][col] &= bool(DTYPE_CHECKS[rules["dtype"]](df[col].dtype))
+    add_timing(partial, "dtypes", start)
+
+    # Null counts for all columns at once
+    start = time.perf_counter()
+    nulls = df[list(columns)].isna().sum()
+    for col, count in nulls.items():
+        partial["nulls"][col] += int(count)
+    add_timing(partial, "nulls", start)
+
+    # Ranges and profile of all numeric columns on one float matrix
+    start = time.perf_counter()
+    range_cols = [col for col, rules in columns.items()
+                  if rules["dtype"] in ("int", "float") and is_numeric_dtype(df[col].dtype)
+                  and not isinstance(df[col].dtype, pd.CategoricalDtype)]
+    if range_cols and len(df) > 0:
+        values = df[range_cols].to_numpy(dtype="float64", na_value=np.nan)
+        low = np.array([columns[col].get("min", -np.inf) for col in range_cols])
+        high = np.array([columns[col].get("max", np.inf) for col in range_cols])
+        out_of_range = ((values < low) | (values > high)).sum(axis=0)
+        present = ~np.isnan(values)
+        counts = present.sum(axis=0)
+        sums = np.where(present, values, 0.0).sum(axis=0)
+        mins = np.where(present, values, np.inf).min(axis=0)
+        maxs = np.where(present, values, -np.inf).max(axis=0)
+        for i, col in enumerate(range_cols):
+            partial["out_of_range"][col] = partial["out_of_range"].get(col, 0) + int(out_of_range[i])
+            profile = partial["numeric"].setdefault(col, {"count": 0, "sum": 0.0, "min": np.inf, "max": -np.inf})
+            profile["count"] += int(counts[i])
+            profile["sum"] += float(sums[i])
+            profile["min"] = min(profile["min"], float(mins[i]))
+            profile["max"] = max(profile["max"], float(maxs[i]))
+    add_timing(partial, "ranges", start)
+
+    # Level frequencies: a bincount over the category codes, no string comparisons
+    start = time.perf_counter()
+    for col, rules in columns.items():
+        if "levels" not in rules:
+            continue
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = series.cat.codes.to_numpy()
+            bins = np.bincount(codes[codes >= 0], minlength=len(series.cat.categories))
+            counts = dict(zip(series.cat.categories, bins.tolist()))
+        else:
+            counts = series.value_counts(dropna=True).to_dict()
+        level_counts = partial["level_counts"].setdefault(col, {})
+        for level, count in counts.items():
+            if count:
+                level_counts[str(level)] = level_counts.get(str(level), 0) + int(count)
+    add_timing(partial, "levels", start)
+
+    # Primary key: keep one 8-byte hash per row, uniqueness is checked after merging
+    start = time.perf_counter()
+    key = schema.get("primary_key")
+    if key in df.columns:
+        partial["key_hashes"].append(row_hashes(df, [key]))
+    add_timing(partial, "primary_key", start)
+    return partial
+
+# Function to turn the accumulated partial results into pass/fail checks and a profile
+def build_report(partial, dataset_name, schema=VALIDATION_SCHEMA):
+    start = time.perf_counter()
+    rows = partial["rows"]
+    checks = []
+    for col in sorted(partial["missing_columns"]):
+        checks.append({"check": "column_present", "column": col, "passed": False})
+    for col, rules in schema["columns"].items():
+        if col in partial["missing_columns"]:
+            continue
+        checks.append({"check": "dtype", "column": col, "passed": partial["dtype_ok"][col],
+                       "expected": rules["dtype"], "observed": sorted(partial["dtypes"][col])})
+        budget = rules.get("max_null_fraction", 0.0)
+        nulls = partial["nulls"][col]
+        checks.append({"check": "null_budget", "column": col, "passed": nulls <= budget * rows,
+                       "nulls": nulls, "max_null_fraction": budget})
+        if col in partial["out_of_range"]:
+            checks.append({"check": "range", "column": col, "passed": partial["out_of_range"][col] == 0,
+                           "out_of_range": partial["out_of_range"][col],
+                           "min": rules.get("min"), "max": rules.get("max")})
+        if "levels" in rules:
+            unexpected = {level: count for level, count in partial["level_counts"].get(col, {}).items()
+                          if level not in rules["levels"]}
+            checks.append({"check": "levels", "column": col, "passed": not unexpected, "unexpected": unexpected})
+
+    key = schema.get("primary_key")
+    if key not in partial["missing_columns"]:
+        hashes = np.concatenate(partial["key_hashes"]) if partial["key_hashes"] else np.empty(0, dtype="uint64")
+        duplicates = int(hashes.size - np.unique(hashes).size)
+        checks.append({"check": "primary_key", "column": key, "passed": duplicates == 0, "duplicates": duplicates})
+
+    profile = {}
+    for col, stats in partial["numeric"].items():
+        mean = stats["sum"] / stats["count"] if stats["count"] else None
+        profile[col] = {"count": stats["count"], "mean": mean,
+                        "min": stats["min"] if stats["count"] else None,
+                        "max": stats["max"] if stats["count"] else None}
+    for col, counts in partial["level_counts"].items():
+        profile[col] = {"count": sum(counts.values()), "levels": counts}
+    for col, nulls in partial["nulls"].items():
+        profile.setdefault(col, {})["nulls"] = nulls
+
+    partial["timings"]["report"] = time.perf_counter() - start
+    return {
+        "dataset": dataset_name,
+        "validated_at": datetime.now().isoformat(timespec="seconds"),
+        "rows": rows,
+        "passed": all(check["passed"] for check in checks),
+        "failed_checks": [check for check in checks if not check["passed"]],
+        "checks": checks,
+        "profile": profile,
+        "timings_ms": {check: round(seconds * 1000, 3) for check, seconds in partial["timings"].items()},
+    }
+
+# Function to add the primary key to a projection, so the key check always runs on the real column
+def project_columns(columns, schema=VALIDATION_SCHEMA):
+    key = schema.get("primary_key")
+    if columns is None or key is None or key in columns:
+        return columns
+    return [key, *columns]
+
+# Function to restrict the schema to the columns a projected read loads
+def project_schema(columns, schema=VALIDATION_SCHEMA):
+    if columns is None:
+        return schema
+    return {**schema, "columns": {col: rules for col, rules in schema["columns"].items() if col in columns}}
+
+# Function to validate a dataset, whole or chunk by chunk
+# columns projects the read and the checks to those columns plus the primary key (all by default)
+@instrument()
+def validate_dataset(dataset_path, report_folder, dataset_name, chunk_size=None, columns=None):
     try:
+        start = time.perf_counter()
+        columns = project_columns(columns)
+        schema = project_schema(columns)
         # Read the dataset
-        df = pd.read_csv(dataset_path)
-        
-        # Initialize validation results
-        validation_results = {
-            "Dataset": dataset_name,
-            "Missing Values": {},
-            "Data Types": {},
-            "Duplicates": False,
-            "Anomalies": {}
-        }
-        
-        # Check for missing values
-        if df.isnull().sum().any():
-            validation_results["Missing Values"] = df.isnull().sum().to_dict()
-            logging.warning("Missing values detected in the dataset.")
-
-        
-        # Validate data types
-        data_types = df.dtypes
-        validation_results["Data Types"] = data_types.to_dict()
-        
-        # Check for duplicates
-        duplicates = df.duplicated().any()
-        if duplicates:
-            validation_results["Duplicates"] = duplicates
-            logging.warning("Duplicate rows detected in the dataset.")
-
-        
-        # Check for anomalies (e.g., negative values in numeric columns)
-        anomalies = {}
-        for col in df.select_dtypes(include=['float64', 'int64']).columns:
-            if (df[col] < 0).any():
-                anomalies[col] = "Negative values found"
-                logging.warning("Negative values found.")
-        validation_results["Anomalies"] = anomalies
-        
+        if chunk_size:
+            partial = empty_partial(schema)
+            for chunk in iter_dataset_chunks(dataset_path, chunk_size, columns):
+                partial = validate_chunk(chunk, partial, schema)
+        else:
+            partial = validate_chunk(read_dataset(dataset_path, columns), schema=schema)
+
+        validation_results = build_report(partial, dataset_name, schema)
+        validation_results["timings_ms"]["total"] = round((time.perf_counter() - start) * 1000, 3)
+        for check in validation_results["failed_checks"]:
+            logging.warning(f"Validation check failed: {check}")
+
         # Save validation results to a report
-        report_file = os.path.join(report_folder, f"{dataset_name}_validation_report.csv")
-        report_df = pd.DataFrame.from_dict(validation_results, orient='index')
-        report_df.to_csv(report_file)
-        
+        report_file = os.path.join(report_folder, f"{dataset_name}_validation_report.json")
+        with open(report_file, "w") as f:
+            json.dump(validation_results, f, indent=2, default=str)
+
         logging.info(f"Validation completed for {dataset_name}. Report saved to {report_file}")
         print(f"Validation report saved to: {report_file}")
+        return validation_results
     except Exception as e:
         logging.error(f"Failed to validate dataset {dataset_name}: {e}")
         raise CustomException(e, sys)
 
 # Main function to run validation
-def run_data_validation(timestamp):
+@instrument()
+def run_data_validation(timestamp, chunk_size=None, dataset_file=None, columns=None):
     # Define folders
     raw_data_folder = ".././data/raw"
     report_folder = "../data/validation_reports"
     os.makedirs(report_folder, exist_ok=True)
-    
+
     # Validate the local CSV file with the given timestamp
-    csv_file = os.path.join(raw_data_folder, f"customer_churn_{timestamp}.csv")
-    if os.path.exists(csv_file):
-        dataset_name = f"customer_churn_{timestamp}"
-        report_file = os.path.join(report_folder, f"{dataset_name}_validation_report.csv")
+    dataset_name = f"customer_churn_{timestamp}"
+    dataset_file = dataset_file or find_dataset(raw_data_folder, dataset_name)
+    if dataset_file is not None:
+        report_file = os.path.join(report_folder, f"{dataset_name}_validation_report.json")
         if not os.path.exists(report_file):  # Skip if already validated
-            validate_dataset(csv_file, report_folder, dataset_name)
+            return validate_dataset(dataset_file, report_folder, dataset_name, chunk_size, columns)
         else:
             logging.info(f"Skipping validation for {dataset_name} (already validated).")
             print(f"Skipping validation for {dataset_name} (already validated).")
 
-
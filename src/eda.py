@@ -0,0 +1,357 @@
+import os
+import sys
+import glob
+import json
+import shutil
+import sqlite3
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from logger import logging
+from exception import CustomException
+from instrumentation import instrument
+from eda_aggregates import (copy_aggregates, drift_report, empty_like, histogram_quantiles, mean_std,
+                            new_aggregates, plot_histogram, summary_table, update_aggregates)
+from preprocessor import clean_data
+from schema import ID_COL, NUM_COLS, TARGET_COL
+from sqlite_writer import RUN_TS_COL, quote, write_table
+from storage import find_dataset, read_dataset
+
+EDA_ROOT = ".././data/EDA_results"
+EDA_CACHE_FILE = os.path.join(EDA_ROOT, "eda_cache.json")
+# Running aggregates of every customer seen so far, and the rows they were built from
+EDA_AGGREGATES_FILE = os.path.join(EDA_ROOT, "eda_aggregates.json")
+EDA_ROWS_DB = os.path.join(EDA_ROOT, "eda_rows.db")
+EDA_ROWS_TABLE = "eda_rows"
+HISTOGRAM_BINS = 30
+MAX_FLIERS = 500
+
+# Function to fingerprint the EDA outputs (aggregates and plot settings)
+# The timestamp of the last run folded in is bookkeeping, not content, so it is left out
+def eda_fingerprint(aggregates):
+    content = {key: value for key, value in aggregates.items() if key != "timestamp"}
+    digest = hashlib.sha256(json.dumps(content, sort_keys=True).encode())
+    digest.update(json.dumps([HISTOGRAM_BINS, MAX_FLIERS]).encode())
+    return digest.hexdigest()[:16]
+
+def _centers(column):
+    counts = np.asarray(column["counts"], dtype="float64")
+    return column["low"] + column["width"] * (np.arange(len(counts)) + 0.5), counts
+
+# Gaussian KDE evaluated from the fine histogram instead of from every row
+def binned_kde(column):
+    centers, counts = _centers(column)
+    occupied = np.flatnonzero(counts)
+    centers, counts = centers[occupied[0]:occupied[-1] + 1], counts[occupied[0]:occupied[-1] + 1]
+    std = mean_std(column)[1]
+    bandwidth = 1.06 * np.nan_to_num(std) * column["count"] ** (-1 / 5) or column["width"]
+    offsets = (centers[:, None] - centers[None, :]) / bandwidth
+    density = (np.exp(-0.5 * offsets ** 2) * counts[None, :]).sum(axis=1)
+    density /= column["count"] * bandwidth * np.sqrt(2 * np.pi)
+    return centers.tolist(), density.tolist()
+
+# Box plot statistics in the format of matplotlib's Axes.bxp, from the fine histogram
+def box_stats(column):
+    q1, median, q3 = histogram_quantiles(column, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    centers, counts = _centers(column)
+    centers = np.clip(centers[counts > 0], column["min"], column["max"])
+    inside = centers[(centers >= q1 - 1.5 * iqr) & (centers <= q3 + 1.5 * iqr)]
+    # Fliers are the occupied bins beyond the whiskers
+    fliers = centers[(centers < q1 - 1.5 * iqr) | (centers > q3 + 1.5 * iqr)][:MAX_FLIERS]
+    return {"q1": q1, "med": median, "q3": q3,
+            "whislo": float(inside.min()) if len(inside) else q1,
+            "whishi": float(inside.max()) if len(inside) else q3, "fliers": fliers.tolist()}
+
+# Function to derive every statistic the plots need from the aggregates
+@instrument()
+def compute_eda_stats(aggregates, numerical_cols, categorical_cols, target_col=TARGET_COL):
+    try:
+        stats = {"rows": aggregates["rows"], "histograms": {}, "kde": {}, "box": {}, "counts": {}}
+        for col in numerical_cols:
+            column = aggregates["numeric"].get(col)
+            if not column or not column["count"]:
+                continue
+            stats["histograms"][col] = plot_histogram(column, HISTOGRAM_BINS)
+            stats["kde"][col] = binned_kde(column)
+            stats["box"][col] = box_stats(column)
+        for col in list(categorical_cols) + [target_col]:
+            if col in aggregates["categorical"]:
+                counts = aggregates["categorical"][col]["counts"]
+                labels = sorted(counts)
+                stats["counts"][col] = {"labels": labels, "values": [counts[label] for label in labels]}
+        return stats
+    except Exception as e:
+        logging.error(f"Failed to compute EDA statistics: {e}")
+        raise CustomException(e, sys)
+
+def _grid(n_plots, figsize_per_row):
+    import matplotlib
+    matplotlib.use('Agg')  # Use a non-interactive backend
+    import matplotlib.pyplot as plt
+    num_rows = (n_plots // 3) + 1
+    fig, axes = plt.subplots(num_rows, 3, figsize=(figsize_per_row[0], figsize_per_row[1] * num_rows))
+    axes = np.atleast_1d(axes).flatten()
+    for ax in axes[n_plots:]:  # Hide unused subplots
+        fig.delaxes(ax)
+    return plt, fig, axes
+
+def _save(plt, fig, output_file):
+    fig.tight_layout()
+    fig.savefig(output_file)
+    plt.close(fig)
+    return output_file
+
+# Plot renderers: each one draws from precomputed statistics and runs in a worker process
+def render_histograms(stats, output_file):
+    plt, fig, axes = _grid(len(stats["histograms"]), (15, 5))
+    for ax, (col, hist) in zip(axes, stats["histograms"].items()):
+        edges = np.array(hist["edges"])
+        ax.stairs(hist["counts"], edges, fill=True, alpha=0.5)
+        centers, density = stats["kde"][col]
+        # Scale the density to the count axis like seaborn's kde=True
+        ax.plot(centers, np.array(density) * stats["rows"] * (edges[1] - edges[0]))
+        ax.set_title(f"Histogram of {col}")
+    return _save(plt, fig, output_file)
+
+def render_box_plots(stats, output_file):
+    plt, fig, axes = _grid(len(stats["box"]), (15, 5))
+    for ax, (col, box) in zip(axes, stats["box"].items()):
+        ax.bxp([box], vert=False, showfliers=True)
+        ax.set_title(f"Box Plot of {col}")
+    return _save(plt, fig, output_file)
+
+def render_bar_plots(stats, output_file, columns):
+    plt, fig, axes = _grid(len(columns), (20, 6))
+    for ax, col in zip(axes, columns):
+        counts = stats["counts"][col]
+        ax.bar(counts["labels"], counts["values"])
+        ax.set_title(f"Bar Plot of {col}")
+    return _save(plt, fig, output_file)
+
+def render_target_plot(stats, output_file, target_col):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(8, 6))
+    counts = stats["counts"][target_col]
+    ax.bar(counts["labels"], counts["values"])
+    ax.set_title(f"Distribution of {target_col}")
+    return _save(plt, fig, output_file)
+
+# Function to render all plots in a process pool
+@instrument()
+def render_plots(stats, eda_folder, timestamp, categorical_cols, target_col=TARGET_COL, max_workers=None):
+    jobs = []
+    if stats["histograms"]:
+        jobs.append((render_histograms, stats, os.path.join(eda_folder, f"histograms_{timestamp}.png")))
+        jobs.append((render_box_plots, stats, os.path.join(eda_folder, f"box_plots_{timestamp}.png")))
+    if len(categorical_cols) > 0:
+        jobs.append((render_bar_plots, stats, os.path.join(eda_folder, f"bar_plots_{timestamp}.png"), list(categorical_cols)))
+    if target_col in stats["counts"]:
+        jobs.append((render_target_plot, stats, os.path.join(eda_folder, f"target_bar_plot_{timestamp}.png"), target_col))
+    else:
+        logging.warning(f"Target column '{target_col}' not found in the dataset.")
+
+    # start_eda renders from a background thread, where forking can copy a lock another thread holds;
+    # spawned workers start from a fresh interpreter instead
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers or len(jobs) or 1, mp_context=context) as pool:
+        futures = [pool.submit(func, *args) for func, *args in jobs]
+        plot_files = [future.result() for future in futures]
+    for plot_file in plot_files:
+        logging.info(f"Plot saved to: {plot_file}")
+        print(f"Plot saved to: {plot_file}")
+    return plot_files
+
+def load_eda_cache():
+    if not os.path.exists(EDA_CACHE_FILE):
+        return {}
+    with open(EDA_CACHE_FILE) as f:
+        return json.load(f)
+
+def save_eda_cache(cache):
+    with open(EDA_CACHE_FILE + ".tmp", "w") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(EDA_CACHE_FILE + ".tmp", EDA_CACHE_FILE)
+
+# Function to reuse the outputs of an earlier run on identical data (hard links, copies as fallback)
+def restore_from_cache(entry, eda_folder, timestamp, stats_only):
+    outputs = {}
+    for kind, source in entry["outputs"].items():
+        if stats_only and source.endswith(".png"):
+            continue
+        if not os.path.exists(source):
+            return None
+        target = os.path.join(eda_folder, os.path.basename(source).replace(entry["timestamp"], timestamp))
+        if os.path.abspath(source) != os.path.abspath(target):
+            if os.path.exists(target):
+                os.remove(target)
+            try:
+                os.link(source, target)
+            except OSError:
+                shutil.copyfile(source, target)
+        outputs[kind] = target
+    return outputs
+
+def load_eda_aggregates():
+    if not os.path.exists(EDA_AGGREGATES_FILE):
+        return new_aggregates()
+    with open(EDA_AGGREGATES_FILE) as f:
+        return json.load(f)
+
+def save_eda_aggregates(aggregates):
+    with open(EDA_AGGREGATES_FILE + ".tmp", "w") as f:
+        json.dump(aggregates, f)
+    os.replace(EDA_AGGREGATES_FILE + ".tmp", EDA_AGGREGATES_FILE)
+
+# Function to fetch the latest stored row of the given customers, among runs already in the aggregates
+def lookup_rows(ids, applied_until, db_path=EDA_ROWS_DB, table_name=EDA_ROWS_TABLE):
+    if applied_until is None or not os.path.exists(db_path):
+        return None
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(f"CREATE TEMP TABLE batch_ids ({quote(ID_COL)} TEXT PRIMARY KEY)")
+        conn.executemany("INSERT OR IGNORE INTO batch_ids VALUES (?)", ((str(i),) for i in ids))
+        # CROSS JOIN keeps batch_ids as the outer loop, so the customerID index makes this
+        # proportional to the batch rather than to the table
+        query = (f"SELECT * FROM (SELECT r.*, ROW_NUMBER() OVER (PARTITION BY r.{quote(ID_COL)} "
+                 f"ORDER BY r.{quote(RUN_TS_COL)} DESC) AS latest FROM batch_ids b "
+                 f"CROSS JOIN {quote(table_name)} r ON r.{quote(ID_COL)} = b.{quote(ID_COL)} "
+                 f"WHERE r.{quote(RUN_TS_COL)} <= ?) "
+                 f"WHERE latest = 1")
+        return pd.read_sql_query(query, conn, params=(applied_until,)).drop(columns=[RUN_TS_COL, "latest"])
+    finally:
+        conn.close()
+
+# Function to pick the columns to aggregate: every numeric column, the categorical ones and the target counts
+def eda_columns(df, categorical_cols=None):
+    if categorical_cols is None:
+        categorical_cols = df.select_dtypes(include=['object', 'category']).columns.drop(ID_COL, errors="ignore")
+    categorical_cols = [col for col in categorical_cols if col != TARGET_COL]
+    numeric_cols = [col for col in df.select_dtypes(include='number').columns if col != ID_COL]
+    count_cols = categorical_cols + ([TARGET_COL] if TARGET_COL in df.columns else [])
+    return numeric_cols, categorical_cols, count_cols
+
+# Function to fold a cleaned batch into the running aggregates, in time proportional to the batch
+# Customers seen in earlier runs are first removed with their stored values, so each customer counts once;
+# the batch rows are stored as the timestamp partition of the row table for the runs to come
+# Returns the aggregates of the batch alone and the aggregates before the batch
+def apply_batch(aggregates, df, numeric_cols, count_cols, timestamp):
+    previous = copy_aggregates(aggregates)
+    batch = update_aggregates(empty_like(aggregates), df, numeric_cols, count_cols)
+    if ID_COL in df.columns:
+        # The target is both a numeric and a count column
+        columns = list(dict.fromkeys([ID_COL] + numeric_cols + count_cols))
+        stored = lookup_rows(df[ID_COL], aggregates.get("timestamp"))
+        if stored is not None and len(stored) and set(columns) <= set(stored.columns):
+            update_aggregates(aggregates, stored, numeric_cols, count_cols, sign=-1)
+        os.makedirs(EDA_ROOT, exist_ok=True)
+        write_table(df[columns], EDA_ROWS_DB, EDA_ROWS_TABLE, timestamp, mode="upsert", key=ID_COL,
+                    index_cols=(ID_COL,))
+    update_aggregates(aggregates, df, numeric_cols, count_cols)
+    # Runs up to this timestamp are in the aggregates; rows of a run that failed before this point are ignored
+    aggregates["timestamp"] = max(timestamp, aggregates.get("timestamp") or timestamp)
+    return batch, previous
+
+# Function to perform EDA; stats_only skips the plots for production runs
+# The summary statistics and plot data cover every customer seen so far and are updated from the
+# batch alone; drift_<timestamp>.json compares the batch with the aggregates of the previous run
+@instrument()
+def perform_eda(df, eda_folder, timestamp, numerical_cols=NUM_COLS, categorical_cols=None, stats_only=False, max_workers=None):
+    try:
+        numeric_cols, categorical_cols, count_cols = eda_columns(df, categorical_cols)
+        if ID_COL in df.columns:
+            df = df.drop_duplicates(subset=ID_COL, keep="last")
+
+        aggregates = load_eda_aggregates()
+        batch, previous = apply_batch(aggregates, df, numeric_cols, count_cols, timestamp)
+        save_eda_aggregates(aggregates)
+        logging.info(f"EDA aggregates updated with {len(df)} rows ({aggregates['rows']} customers in total)")
+
+        outputs = {}
+        if previous["rows"]:
+            drift = {"timestamp": timestamp, **drift_report(previous, batch)}
+            drift_file = os.path.join(eda_folder, f"drift_{timestamp}.json")
+            with open(drift_file, "w") as f:
+                json.dump(drift, f, indent=2)
+            outputs["drift"] = drift_file
+            if drift["drifted_columns"]:
+                logging.warning(f"Drift against the previous run in: {drift['drifted_columns']}")
+            print(f"Drift report saved to: {drift_file}")
+
+        fingerprint = eda_fingerprint(aggregates)
+        cache = load_eda_cache()
+        entry = cache.get(fingerprint)
+        if entry and (stats_only or entry["plots"]):
+            restored = restore_from_cache(entry, eda_folder, timestamp, stats_only)
+            if restored is not None:
+                logging.info(f"EDA aggregates unchanged (fingerprint {fingerprint}), reused outputs of {entry['timestamp']}")
+                print(f"EDA outputs reused from run {entry['timestamp']}")
+                return {**restored, **outputs}
+
+        # Generate summary statistics
+        summary_stats = summary_table(aggregates, [col for col in df.columns if col != ID_COL])
+        summary_stats_file = os.path.join(eda_folder, f"summary_statistics_{timestamp}.csv")
+        summary_stats.to_csv(summary_stats_file)
+        logging.info(f"Summary statistics saved to: {summary_stats_file}")
+        print(f"Summary statistics saved to: {summary_stats_file}")
+
+        # Histogram, KDE, box plot and count data are derived once and shared by all plots
+        stats = compute_eda_stats(aggregates, numerical_cols, categorical_cols)
+        stats_file = os.path.join(eda_folder, f"eda_stats_{timestamp}.json")
+        with open(stats_file, "w") as f:
+            json.dump(stats, f)
+        cached = {"summary_statistics": summary_stats_file, "stats": stats_file}
+
+        if not stats_only:
+            plot_files = render_plots(stats, eda_folder, timestamp, categorical_cols, max_workers=max_workers)
+            cached.update({os.path.basename(path).rsplit(f"_{timestamp}", 1)[0]: path for path in plot_files})
+
+        cache[fingerprint] = {"timestamp": timestamp, "plots": not stats_only, "outputs": cached}
+        save_eda_cache(cache)
+        return {**cached, **outputs}
+    except Exception as e:
+        logging.error(f"Failed to perform EDA: {e}")
+        raise CustomException(e, sys)
+
+# Function to build the aggregates from the datasets of earlier runs when none are stored yet
+def replay_history(raw_data_folder, timestamp):
+    names = sorted({os.path.splitext(os.path.basename(path))[0]
+                    for path in glob.glob(os.path.join(raw_data_folder, "customer_churn_*"))})
+    names = [name for name in names if name < f"customer_churn_{timestamp}"]
+    if not names:
+        return
+    aggregates = new_aggregates()
+    for name in names:
+        df = clean_data(read_dataset(find_dataset(raw_data_folder, name)))
+        numeric_cols, _, count_cols = eda_columns(df)
+        if ID_COL in df.columns:
+            df = df.drop_duplicates(subset=ID_COL, keep="last")
+        apply_batch(aggregates, df, numeric_cols, count_cols, name[len("customer_churn_"):])
+    save_eda_aggregates(aggregates)
+    logging.info(f"EDA aggregates rebuilt from {len(names)} earlier runs ({aggregates['rows']} customers)")
+
+# Main function to run the EDA stage on the cleaned dataset of a run (dataset_file skips the lookup,
+# columns projects the read)
+@instrument()
+def run_eda(timestamp, stats_only=False, max_workers=None, dataset_file=None, columns=None):
+    raw_data_folder = ".././data/raw"
+    dataset_file = dataset_file or find_dataset(raw_data_folder, f"customer_churn_{timestamp}")
+    if dataset_file is None:
+        return None
+    eda_folder = os.path.join(EDA_ROOT, f"EDA_{timestamp}")
+    os.makedirs(eda_folder, exist_ok=True)
+    if not os.path.exists(EDA_AGGREGATES_FILE):
+        replay_history(raw_data_folder, timestamp)
+    df = clean_data(read_dataset(dataset_file, columns))
+    return perform_eda(df, eda_folder, timestamp, stats_only=stats_only, max_workers=max_workers)
+
+# Function to run the EDA stage in the background; call .result() on the returned future to wait
+def start_eda(timestamp, stats_only=False, max_workers=None, columns=None):
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="eda")
+    future = executor.submit(run_eda, timestamp, stats_only, max_workers, None, columns)
+    executor.shutdown(wait=False)
+    return future
@@ -0,0 +1,197 @@
+import copy
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_integer_dtype
+
+# Mergeable per-column EDA aggregates, persisted between runs as JSON
+# numeric columns: count, nulls, sum, sum of squares, min, max and a fine fixed-width
+#   histogram whose bin edges are low + i * width
+# categorical columns: level frequencies and nulls
+# Batches are added (sign=1) or removed (sign=-1) exactly; only min/max keep the widest values seen
+FINE_BINS = 240
+DRIFT_BINS = 10
+# Population stability index above which a column is reported as drifted
+PSI_THRESHOLD = 0.2
+# Smaller batches get their indexes reported but never flagged, their frequencies are too noisy
+MIN_DRIFT_ROWS = 100
+
+def new_aggregates():
+    return {"rows": 0, "numeric": {}, "categorical": {}}
+
+def copy_aggregates(aggregates):
+    return copy.deepcopy(aggregates)
+
+# Function to copy the columns and histogram grids of an aggregate state with every count at zero
+def empty_like(aggregates):
+    empty = new_aggregates()
+    for col, column in aggregates["numeric"].items():
+        empty["numeric"][col] = {**_new_numeric(integer=column["integer"]), "low": column["low"],
+                                 "width": column["width"], "counts": [0] * len(column["counts"])}
+    for col in aggregates["categorical"]:
+        empty["categorical"][col] = {"nulls": 0, "counts": {}}
+    return empty
+
+# Integer columns get whole-number bin edges, so their quantiles can be read off exactly
+def _new_numeric(low=0.0, high=1.0, integer=False):
+    width = (float(high) - float(low)) / FINE_BINS or 1.0
+    if integer:
+        low, width = np.floor(low), float(max(1, np.ceil(width)))
+    return {"count": 0, "nulls": 0, "sum": 0.0, "sum_sq": 0.0, "min": None, "max": None, "integer": integer,
+            "low": float(low), "width": width, "counts": [0] * FINE_BINS}
+
+# Function to extend a histogram grid by whole bins until it covers [low, high]
+# The resolution is halved (pairs of bins merged) whenever the grid grows past 2 * FINE_BINS bins
+def _cover(column, low, high):
+    counts = np.asarray(column["counts"], dtype="int64")
+    start, width = column["low"], column["width"]
+    if low < start:
+        extra = int(np.ceil((start - low) / width))
+        counts = np.concatenate([np.zeros(extra, dtype="int64"), counts])
+        start -= extra * width
+    end = start + len(counts) * width
+    if high >= end:
+        counts = np.concatenate([counts, np.zeros(int((high - end) // width) + 1, dtype="int64")])
+    while len(counts) > 2 * FINE_BINS:
+        if len(counts) % 2:
+            counts = np.append(counts, 0)
+        counts = counts.reshape(-1, 2).sum(axis=1)
+        width *= 2
+    column.update(low=start, width=width, counts=counts.tolist())
+
+def _bin_counts(column, values):
+    n_bins = len(column["counts"])
+    bins = np.clip(((values - column["low"]) // column["width"]).astype("int64"), 0, n_bins - 1)
+    return np.bincount(bins, minlength=n_bins)
+
+# Function to add (sign=1) or remove (sign=-1) a batch of rows, in time proportional to the batch
+def update_aggregates(aggregates, df, numerical_cols, categorical_cols, sign=1):
+    aggregates["rows"] += sign * len(df)
+    for col in numerical_cols:
+        series = df[col]
+        values = series.dropna().to_numpy(dtype="float64")
+        column = aggregates["numeric"].get(col)
+        if column is None:
+            bounds = (values.min(), values.max()) if len(values) else (0.0, 1.0)
+            column = aggregates["numeric"][col] = _new_numeric(*bounds, integer=is_integer_dtype(series.dtype))
+        column["nulls"] += sign * int(series.isna().sum())
+        if not len(values):
+            continue
+        _cover(column, values.min(), values.max())
+        column["counts"] = (np.asarray(column["counts"]) + sign * _bin_counts(column, values)).tolist()
+        column["count"] += sign * len(values)
+        column["sum"] += sign * float(values.sum())
+        column["sum_sq"] += sign * float(np.dot(values, values))
+        if sign > 0:
+            column["min"] = float(values.min()) if column["min"] is None else min(column["min"], float(values.min()))
+            column["max"] = float(values.max()) if column["max"] is None else max(column["max"], float(values.max()))
+    for col in categorical_cols:
+        column = aggregates["categorical"].setdefault(col, {"nulls": 0, "counts": {}})
+        column["nulls"] += sign * int(df[col].isna().sum())
+        for level, count in df[col].value_counts(sort=False).items():
+            if count:
+                level = str(level)
+                column["counts"][level] = column["counts"].get(level, 0) + sign * int(count)
+                if not column["counts"][level]:
+                    del column["counts"][level]
+    return aggregates
+
+# Function to express a histogram on a coarser or wider grid whose edges include its own
+def _rebin(column, target):
+    counts = np.asarray(column["counts"], dtype="int64")
+    left_edges = column["low"] + column["width"] * np.arange(len(counts))
+    bins = np.floor((left_edges - target["low"]) / target["width"] + 1e-9).astype("int64")
+    rebinned = np.zeros(len(target["counts"]), dtype="int64")
+    np.add.at(rebinned, np.clip(bins, 0, len(rebinned) - 1), counts)
+    return rebinned
+
+def mean_std(column):
+    count = column["count"]
+    if not count:
+        return float("nan"), float("nan")
+    mean = column["sum"] / count
+    # Sample standard deviation, as DataFrame.describe reports it
+    variance = (column["sum_sq"] - count * mean ** 2) / (count - 1) if count > 1 else float("nan")
+    return mean, float(np.sqrt(max(variance, 0.0)))
+
+# Function to interpolate quantiles from the fine histogram
+def histogram_quantiles(column, qs):
+    counts = np.asarray(column["counts"], dtype="float64")
+    cumulative = np.concatenate([[0.0], np.cumsum(counts)])
+    edges = column["low"] + column["width"] * np.arange(len(counts) + 1)
+    if column["integer"] and column["width"] == 1:
+        # One bin per whole number: the quantile is the value of the bin it falls in
+        bins = np.searchsorted(cumulative, np.floor(np.asarray(qs) * (cumulative[-1] - 1)) + 1) - 1
+        return np.clip(edges[np.clip(bins, 0, len(counts) - 1)], column["min"], column["max"]).tolist()
+    quantiles = np.interp(np.asarray(qs) * cumulative[-1], cumulative, edges)
+    # Interpolation stays inside the observed range
+    return np.clip(quantiles, column["min"], column["max"]).tolist()
+
+# Function to regroup the occupied part of the fine histogram into at most n_bins plot bins
+def plot_histogram(column, n_bins):
+    counts = np.asarray(column["counts"], dtype="int64")
+    occupied = np.flatnonzero(counts)
+    if not len(occupied):
+        return {"counts": [], "edges": [column["low"], column["low"] + column["width"]]}
+    first, last = occupied[0], occupied[-1] + 1
+    group = -(-(last - first) // n_bins)
+    counts = counts[first:last]
+    counts = np.pad(counts, (0, -len(counts) % group)).reshape(-1, group).sum(axis=1)
+    edges = column["low"] + column["width"] * (first + group * np.arange(len(counts) + 1))
+    return {"counts": counts.tolist(), "edges": edges.tolist()}
+
+# Function to build the describe(include='all') table from the aggregates
+def summary_table(aggregates, columns):
+    rows = {}
+    for col in columns:
+        if col in aggregates["numeric"]:
+            column = aggregates["numeric"][col]
+            mean, std = mean_std(column)
+            q1, median, q3 = histogram_quantiles(column, [0.25, 0.5, 0.75]) if column["count"] else [np.nan] * 3
+            rows[col] = {"count": column["count"], "mean": mean, "std": std, "min": column["min"],
+                         "25%": q1, "50%": median, "75%": q3, "max": column["max"]}
+        elif col in aggregates["categorical"]:
+            counts = aggregates["categorical"][col]["counts"]
+            top = max(counts, key=counts.get) if counts else None
+            rows[col] = {"count": sum(counts.values()), "unique": len(counts), "top": top,
+                         "freq": counts.get(top)}
+    order = ["count", "unique", "top", "freq", "mean", "std", "min", "25%", "50%", "75%", "max"]
+    return pd.DataFrame.from_dict(rows, orient="index").reindex(columns=order)
+
+def _psi(expected, actual):
+    expected = np.maximum(expected / max(expected.sum(), 1), 1e-4)
+    actual = np.maximum(actual / max(actual.sum(), 1), 1e-4)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+# Function to compare a batch with the aggregates of the previous run
+# Numeric columns are compared on DRIFT_BINS bins of equal previous mass; categorical on their levels
+def drift_report(previous, batch):
+    report = {"previous_rows": previous["rows"], "batch_rows": batch["rows"], "columns": {}}
+    threshold = PSI_THRESHOLD if batch["rows"] >= MIN_DRIFT_ROWS else float("inf")
+    for col, column in batch["numeric"].items():
+        if col not in previous["numeric"] or not column["count"] or not previous["numeric"][col]["count"]:
+            continue
+        reference = previous["numeric"][col]
+        expected = _rebin(reference, column).astype("float64")
+        actual = np.asarray(column["counts"], dtype="float64")
+        # Bins of equal previous mass, so sparse tails do not dominate the index
+        share = (np.cumsum(expected) - expected / 2) / expected.sum()
+        groups = np.minimum((share * DRIFT_BINS).astype("int64"), DRIFT_BINS - 1)
+        psi = _psi(np.bincount(groups, expected, DRIFT_BINS), np.bincount(groups, actual, DRIFT_BINS))
+        previous_mean, previous_std = mean_std(reference)
+        mean = mean_std(column)[0]
+        report["columns"][col] = {"kind": "numeric", "psi": round(psi, 4),
+                                  "previous_mean": previous_mean, "batch_mean": mean,
+                                  "mean_shift_std": (mean - previous_mean) / previous_std if previous_std else None,
+                                  "drifted": psi > threshold}
+    for col, column in batch["categorical"].items():
+        if col not in previous["categorical"] or not column["counts"]:
+            continue
+        reference = previous["categorical"][col]["counts"]
+        levels = sorted(set(reference) | set(column["counts"]))
+        psi = _psi(np.array([reference.get(level, 0) for level in levels], dtype="float64"),
+                   np.array([column["counts"].get(level, 0) for level in levels], dtype="float64"))
+        report["columns"][col] = {"kind": "categorical", "psi": round(psi, 4),
+                                  "new_levels": [level for level in column["counts"] if level not in reference],
+                                  "drifted": psi > threshold}
+    report["drifted_columns"] = [col for col, result in report["columns"].items() if result["drifted"]]
+    return report
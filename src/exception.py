@@ -3,9 +3,14 @@ import sys
 
 def error_message_detail(error,error_detail:sys):
     _,_,exc_tb=error_detail.exc_info()
-    file_name=exc_tb.tb_frame.f_code.co_filename
+    if exc_tb is None:
+        # Raised directly rather than while handling another exception: use the caller's frame
+        frame=error_detail._getframe(2)
+        file_name,line_number=frame.f_code.co_filename,frame.f_lineno
+    else:
+        file_name,line_number=exc_tb.tb_frame.f_code.co_filename,exc_tb.tb_lineno
     error_message="Error occured in python script name [{0}] line number [{1}] error message[{2}]".format(
-     file_name,exc_tb.tb_lineno,str(error))
+     file_name,line_number,str(error))
 
     return error_message
 
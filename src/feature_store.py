@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import sqlite3
+from collections import OrderedDict
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from logger import logging
+from exception import CustomException
+from instrumentation import instrument
+from schema import ID_COL, TARGET_COL
+
+FEATURE_STORE_PATH = ".././data/feature_store/feature_store.db"
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+# Keep IN (...) lists under SQLite's bound-parameter limit
+LOOKUP_BATCH_SIZE = 900
+
+# LRU cache of feature vectors, evicting least recently used entries once max_bytes is exceeded
+class LRUCache:
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def entry_size(key, value):
+        snapshot_ts, features = value
+        return features.nbytes + len(key[0]) + len(snapshot_ts) + 64
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if key in self.entries:
+            self.size -= self.entry_size(key, self.entries.pop(key))
+        self.entries[key] = value
+        self.size += self.entry_size(key, value)
+        while self.size > self.max_bytes and self.entries:
+            old_key, old_value = self.entries.popitem(last=False)
+            self.size -= self.entry_size(old_key, old_value)
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+# Feature store keyed on customerID with one point-in-time snapshot per pipeline timestamp
+class FeatureStore:
+    def __init__(self, db_path=FEATURE_STORE_PATH, cache_bytes=DEFAULT_CACHE_BYTES):
+        try:
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            self.db_path = db_path
+            self.conn = sqlite3.connect(db_path)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            # The primary key is the clustered index used by every lookup
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS feature_snapshots (
+                    customerID TEXT NOT NULL,
+                    snapshot_ts TEXT NOT NULL,
+                    features BLOB NOT NULL,
+                    PRIMARY KEY (customerID, snapshot_ts)
+                ) WITHOUT ROWID
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS feature_sets (
+                    snapshot_ts TEXT PRIMARY KEY,
+                    feature_names TEXT NOT NULL,
+                    created_at TEXT NOT NULL
+                )
+            """)
+            self.conn.commit()
+            self.cache = LRUCache(cache_bytes)
+            self.feature_names = {}
+        except Exception as e:
+            logging.error(f"Failed to open feature store {db_path}: {e}")
+            raise CustomException(e, sys)
+
+    # Function to write (or overwrite) the features of a batch of customers for one snapshot
+    def upsert(self, df, snapshot_ts, feature_names=None):
+        try:
+            if feature_names is None:
+                feature_names = [col for col in df.columns if col not in (ID_COL, TARGET_COL)]
+            values = df[feature_names].to_numpy(dtype="float64")
+            rows = zip(df[ID_COL].astype(str), [snapshot_ts] * len(df), (row.tobytes() for row in values))
+            with self.conn:
+                self.conn.execute(
+                    "INSERT INTO feature_sets (snapshot_ts, feature_names, created_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(snapshot_ts) DO UPDATE SET feature_names = excluded.feature_names",
+                    (snapshot_ts, json.dumps(list(feature_names)), datetime.now().isoformat(timespec="seconds")),
+                )
+                self.conn.executemany(
+                    "INSERT INTO feature_snapshots (customerID, snapshot_ts, features) VALUES (?, ?, ?) "
+                    "ON CONFLICT(customerID, snapshot_ts) DO UPDATE SET features = excluded.features",
+                    rows,
+                )
+            self.feature_names[snapshot_ts] = list(feature_names)
+            self.cache.clear()
+            logging.info(f"Upserted {len(df)} customers into feature snapshot {snapshot_ts}")
+            print(f"Features stored for {len(df)} customers (snapshot {snapshot_ts})")
+        except Exception as e:
+            logging.error(f"Failed to upsert features for snapshot {snapshot_ts}: {e}")
+            raise CustomException(e, sys)
+
+    def snapshots(self):
+        return [row[0] for row in self.conn.execute("SELECT snapshot_ts FROM feature_sets ORDER BY snapshot_ts")]
+
+    # Read on every latest lookup, so snapshots published by another process are seen at once
+    def latest_snapshot(self):
+        return self.conn.execute("SELECT MAX(snapshot_ts) FROM feature_sets").fetchone()[0]
+
+    def get_feature_names(self, snapshot_ts):
+        if snapshot_ts not in self.feature_names:
+            row = self.conn.execute("SELECT feature_names FROM feature_sets WHERE snapshot_ts = ?", (snapshot_ts,)).fetchone()
+            self.feature_names[snapshot_ts] = json.loads(row[0]) if row else []
+        return self.feature_names[snapshot_ts]
+
+    # Latest snapshot at or before as_of for each id, read through the primary-key index
+    def _lookup(self, ids, as_of):
+        found = {}
+        as_of = as_of or "\uffff"
+        for start in range(0, len(ids), LOOKUP_BATCH_SIZE):
+            batch = ids[start:start + LOOKUP_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            # SQLite returns the bare columns of the row holding MAX(snapshot_ts)
+            query = (f"SELECT customerID, MAX(snapshot_ts), features FROM feature_snapshots "
+                     f"WHERE customerID IN ({placeholders}) AND snapshot_ts <= ? GROUP BY customerID")
+            for customer_id, snapshot_ts, blob in self.conn.execute(query, (*batch, as_of)):
+                found[customer_id] = (snapshot_ts, np.frombuffer(blob, dtype="float64"))
+        return found
+
+    # Function to get the features of a list of customers as of a snapshot (latest when as_of is None)
+    def get_features(self, ids, as_of=None):
+        try:
+            ids = list(dict.fromkeys(str(customer_id) for customer_id in ids))
+            # Cache keys carry the resolved snapshot: a new snapshot gives new keys instead of stale hits
+            if as_of is None:
+                as_of = self.latest_snapshot()
+            results = {}
+            missing = []
+            for customer_id in ids:
+                value = self.cache.get((customer_id, as_of))
+                if value is None:
+                    missing.append(customer_id)
+                else:
+                    results[customer_id] = value
+            if missing:
+                for customer_id, value in self._lookup(missing, as_of).items():
+                    self.cache.put((customer_id, as_of), value)
+                    results[customer_id] = value
+
+            # Group rows by snapshot so each group is decoded with its own feature names
+            frames = []
+            by_snapshot = {}
+            for customer_id in ids:
+                if customer_id in results:
+                    by_snapshot.setdefault(results[customer_id][0], []).append(customer_id)
+            for snapshot_ts, snapshot_ids in by_snapshot.items():
+                matrix = np.vstack([results[customer_id][1] for customer_id in snapshot_ids])
+                frame = pd.DataFrame(matrix, columns=self.get_feature_names(snapshot_ts), index=pd.Index(snapshot_ids, name=ID_COL))
+                frame.insert(0, "snapshot_ts", snapshot_ts)
+                frames.append(frame)
+            if not frames:
+                return pd.DataFrame(index=pd.Index([], name=ID_COL))
+            features = pd.concat(frames)
+            return features.reindex([customer_id for customer_id in ids if customer_id in results])
+        except Exception as e:
+            logging.error(f"Failed to get features: {e}")
+            raise CustomException(e, sys)
+
+    def close(self):
+        self.conn.close()
+
+# Main function to publish a transformed dataset as a feature snapshot
+@instrument()
+def run_feature_store_update(transformed_df, timestamp, db_path=FEATURE_STORE_PATH):
+    store = FeatureStore(db_path)
+    try:
+        store.upsert(transformed_df, timestamp)
+    finally:
+        store.close()
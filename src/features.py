@@ -0,0 +1,139 @@
+import os
+import ast
+import sys
+import numpy as np
+import yaml
+from exception import CustomException
+
+try:
+    import numexpr
+except ImportError:  # evaluated with NumPy instead
+    numexpr = None
+
+PARAMS_FILE = "../param.yaml"
+
+# Declarative feature registry, shared by training (DataFrames) and serving (raw records)
+# expr: expression over raw columns and other registered features
+#   +, -, *, /, comparisons and where(cond, a, b); every "/" is a safe division (0 where the divisor is 0)
+#   median(col), mean(col), min(col), max(col), quantile(col, q): fit-time constants over a raw column,
+#   frozen into the expression when the features are fitted
+#   bin(x, e1, e2, ...): index of the right-closed bin of x, i.e. the number of edges below it (like pd.cut)
+# dtype: dtype of the feature column (float64 when omitted)
+FEATURES = {
+    # tenure is already in months
+    "tenure_months": {"expr": "tenure"},
+    "avg_monthly_charges": {"expr": "TotalCharges / tenure_months"},
+    "high_monthly_charges": {"expr": "MonthlyCharges > median(MonthlyCharges)", "dtype": "uint8"},
+    # Low (0), Mid (1) and High (2) monthly charges
+    "MonthlyCharges_Category": {"expr": "bin(MonthlyCharges, 30, 70)", "dtype": "uint8"},
+}
+AGGREGATES = ("median", "mean", "min", "max", "quantile")
+
+# Function to read the features requested in param.yaml (features.requested); all of them by default
+def requested_features(params_file=PARAMS_FILE):
+    if os.path.exists(params_file):
+        with open(params_file) as f:
+            section = (yaml.safe_load(f) or {}).get("features") or {}
+        if "requested" in section:
+            return list(section["requested"] or [])
+    return list(FEATURES)
+
+# Inline every referenced feature, so each requested feature is one expression over raw columns
+class _Inline(ast.NodeTransformer):
+    def __init__(self, registry, stack):
+        self.registry = registry
+        self.stack = stack
+
+    def visit_Name(self, node):
+        if node.id not in self.registry:
+            return node
+        return _parse(node.id, self.registry, self.stack)
+
+def _parse(name, registry, stack=()):
+    if name in stack:
+        raise CustomException(f"Circular feature definition: {' -> '.join(stack + (name,))}", sys)
+    if name not in registry:
+        raise CustomException(f"Unknown feature '{name}'", sys)
+    tree = ast.parse(registry[name]["expr"], mode="eval").body
+    return _Inline(registry, stack + (name,)).visit(tree)
+
+# Replace fit-time aggregates by constants and expand bin() and "/" into where() expressions
+class _Freeze(ast.NodeTransformer):
+    def __init__(self, aggregate):
+        self.aggregate = aggregate
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        func = node.func.id if isinstance(node.func, ast.Name) else None
+        if func in AGGREGATES:
+            if not isinstance(node.args[0], ast.Name):
+                raise CustomException(f"{func}() takes a raw column name, got '{ast.unparse(node.args[0])}'", sys)
+            args = [ast.literal_eval(arg) for arg in node.args[1:]]
+            return ast.Constant(float(self.aggregate(func, node.args[0].id, *args)))
+        if func == "bin":
+            value, edges = node.args[0], node.args[1:]
+            steps = [ast.Call(ast.Name("where", ast.Load()),
+                              [ast.Compare(value, [ast.Gt()], [edge]), ast.Constant(1.0), ast.Constant(0.0)], [])
+                     for edge in edges]
+            total = steps[0]
+            for step in steps[1:]:
+                total = ast.BinOp(total, ast.Add(), step)
+            return total
+        if func != "where":
+            raise CustomException(f"Unsupported function '{ast.unparse(node.func)}' in a feature", sys)
+        return node
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if not isinstance(node.op, ast.Div):
+            return node
+        return ast.Call(ast.Name("where", ast.Load()),
+                        [ast.Compare(node.right, [ast.NotEq()], [ast.Constant(0.0)]), node, ast.Constant(0.0)], [])
+
+# Function to fit the requested features: aggregate(kind, column, *args) supplies the fit-time constants
+# Returns the frozen state {name: {"expr", "inputs", "dtype"}}, which is all evaluation needs
+def fit_features(names, aggregate, registry=FEATURES):
+    frozen = {}
+    for name in names:
+        tree = _Freeze(aggregate).visit(_parse(name, registry))
+        expr = ast.unparse(ast.fix_missing_locations(tree))
+        inputs = sorted({node.id for node in ast.walk(tree) if isinstance(node, ast.Name)} - {"where"})
+        frozen[name] = {"expr": expr, "inputs": inputs, "dtype": registry[name].get("dtype", "float64")}
+    return frozen
+
+# Function to list the raw columns the given features read (what a reader must load for them)
+def feature_inputs(names, registry=FEATURES):
+    return sorted({node.id for name in names for node in ast.walk(_parse(name, registry))
+                   if isinstance(node, ast.Name)} - {"where", "bin", *AGGREGATES})
+
+# Function to compute the fit-time constants from an in-memory DataFrame
+def frame_aggregate(df):
+    def aggregate(kind, col, *args):
+        values = df[col]
+        if kind == "quantile":
+            return values.quantile(*args)
+        return getattr(values, kind)()
+    return aggregate
+
+_compiled = {}
+
+def _evaluate(expr, local_dict):
+    if numexpr is not None:
+        return numexpr.evaluate(expr, local_dict=local_dict)
+    code = _compiled.get(expr)
+    if code is None:
+        code = _compiled[expr] = compile(expr, "<feature>", "eval")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return eval(code, {"__builtins__": {}, "where": np.where}, local_dict)
+
+# Function to evaluate frozen features on columnar data (a DataFrame or {column: array})
+# Returns {name: array}; every input column is converted to float64 once
+def evaluate_features(frozen, columns):
+    try:
+        inputs = {col: np.asarray(columns[col], dtype="float64")
+                  for col in {col for feature in frozen.values() for col in feature["inputs"]}}
+        n_rows = len(next(iter(inputs.values()))) if inputs else len(columns)
+        return {name: np.broadcast_to(_evaluate(feature["expr"], inputs), (n_rows,)).astype(feature["dtype"])
+                for name, feature in frozen.items()}
+    except Exception as e:
+        raise CustomException(e, sys)
@@ -0,0 +1,25 @@
+import os
+import hashlib
+import numpy as np
+import pandas as pd
+
+# Function to hash a file's content without reading it into memory at once
+def file_sha256(file_path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Function to fingerprint a file; the content hash is reused while size and mtime are unchanged
+def file_fingerprint(file_path, previous=None):
+    stat = os.stat(file_path)
+    if previous and previous.get("size") == stat.st_size and previous.get("mtime_ns") == stat.st_mtime_ns:
+        return dict(previous)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": file_sha256(file_path)}
+
+# Function to hash every row of a DataFrame (vectorized, independent of the column dtypes)
+def row_hashes(df, columns=None):
+    if columns is not None:
+        df = df[columns]
+    return pd.util.hash_pandas_object(df, index=False).to_numpy(dtype=np.uint64)
@@ -0,0 +1,233 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import platform
+import functools
+import threading
+import contextlib
+from datetime import datetime
+import pandas as pd
+from logger import logging
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RUNS_FOLDER = "../logs/runs"
+# Name of one stage or helper to run under cProfile (also settable per run in start_run)
+PROFILE_STAGE = os.environ.get("CHURN_PROFILE_STAGE")
+SAMPLE_INTERVAL = 0.02
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+_run = None
+_run_lock = threading.Lock()
+_local = threading.local()
+# Records of the stages running right now (any thread), updated by the memory sampler
+_active = {}
+_active_lock = threading.Lock()
+_sampler = None
+
+# Current resident set size in bytes (peak RSS where /proc is not available)
+def current_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        if resource is None:
+            return 0
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+# Background thread sampling RSS while any stage is active, so nested and concurrent stages all get a peak
+def _sample():
+    global _sampler
+    while True:
+        rss = current_rss()
+        with _active_lock:
+            if not _active:
+                _sampler = None
+                return
+            for record in _active.values():
+                record["peak_rss"] = max(record["peak_rss"], rss)
+        time.sleep(SAMPLE_INTERVAL)
+
+def _activate(record):
+    global _sampler
+    with _active_lock:
+        _active[id(record)] = record
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample, name="rss-sampler", daemon=True)
+            _sampler.start()
+
+def _deactivate(record):
+    with _active_lock:
+        del _active[id(record)]
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+def _mb(value):
+    return round(value / (1024 * 1024), 2)
+
+def _profile_stage():
+    return _run["profile_stage"] if _run else PROFILE_STAGE
+
+def _save_profile(profiler, name):
+    folder = _run["folder"] if _run else RUNS_FOLDER
+    os.makedirs(folder, exist_ok=True)
+    profile_file = os.path.join(folder, f"{name}.prof")
+    profiler.dump_stats(profile_file)
+    with open(os.path.join(folder, f"{name}_profile.txt"), "w") as f:
+        pstats.Stats(profile_file, stream=f).sort_stats("cumulative").print_stats(40)
+    logging.info(f"Profile of {name} saved to: {profile_file}")
+
+def _emit(event):
+    line = json.dumps(event, default=str)
+    logging.info(f"EVENT {line}")
+    if _run is None:
+        return
+    with _run_lock:
+        with open(os.path.join(_run["folder"], "events.jsonl"), "a") as f:
+            f.write(line + "\n")
+        if event["depth"] == 0:
+            _run["stages"].append(event)
+        else:
+            totals = _run["helpers"].setdefault(event["stage"], {"calls": 0, "duration_s": 0.0, "peak_rss_mb": 0.0})
+            totals["calls"] += 1
+            totals["duration_s"] = round(totals["duration_s"] + event["duration_s"], 4)
+            totals["peak_rss_mb"] = max(totals["peak_rss_mb"], event["peak_rss_mb"])
+            for key in ("rows_in", "rows_out", "bytes_in", "bytes_out"):
+                if key in event:
+                    totals[key] = totals.get(key, 0) + event[key]
+
+# Context manager timing one stage; the yielded event dict can be extended (e.g. rows_out)
+@contextlib.contextmanager
+def stage(name, **fields):
+    stack = _stack()
+    rss = current_rss()
+    event = {"event": "stage", "stage": name, "run": _run["timestamp"] if _run else None,
+             "parent": stack[-1]["stage"] if stack else None, "depth": len(stack),
+             "thread": threading.current_thread().name, "started_at": datetime.now().isoformat(timespec="milliseconds"),
+             **fields}
+    record = {"peak_rss": rss}
+    profiler = cProfile.Profile() if name == _profile_stage() else None
+    stack.append(event)
+    _activate(record)
+    start = time.perf_counter()
+    if profiler is not None:
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already running (e.g. the same stage in another thread)
+            profiler = None
+    status = "ok"
+    try:
+        yield event
+    except BaseException as e:
+        status = "error"
+        event["error"] = repr(e)
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        duration = time.perf_counter() - start
+        rss_end = current_rss()
+        _deactivate(record)
+        stack.pop()
+        if profiler is not None:
+            _save_profile(profiler, name)
+        event.update({"status": status, "duration_s": round(duration, 4), "rss_start_mb": _mb(rss),
+                      "rss_end_mb": _mb(rss_end), "peak_rss_mb": _mb(max(record["peak_rss"], rss_end))})
+        if "rows_out" in event and duration > 0:
+            event["rows_per_s"] = round(event["rows_out"] / duration, 1)
+        _emit(event)
+
+# Rows and bytes of the DataFrames and files among a call's arguments or result
+def _describe(values, suffix):
+    rows = nbytes = 0
+    found = False
+    for value in values:
+        if isinstance(value, pd.DataFrame):
+            rows += len(value)
+            nbytes += int(value.memory_usage(index=False).sum())
+            found = True
+        elif isinstance(value, (str, os.PathLike)) and os.path.isfile(value):
+            nbytes += os.path.getsize(value)
+            found = True
+    if not found:
+        return {}
+    description = {f"bytes_{suffix}": nbytes}
+    if rows:
+        description[f"rows_{suffix}"] = rows
+    return description
+
+# Decorator recording every call of a stage or helper as a stage event
+def instrument(name=None):
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(label, **_describe(list(args) + list(kwargs.values()), "in")) as event:
+                result = func(*args, **kwargs)
+                event.update(_describe(result if isinstance(result, tuple) else [result], "out"))
+                return result
+        return wrapper
+    return decorator
+
+# Function to start collecting the events of a pipeline run under logs/runs/<timestamp>/
+def start_run(timestamp, profile_stage=None):
+    global _run
+    folder = os.path.join(RUNS_FOLDER, timestamp)
+    os.makedirs(folder, exist_ok=True)
+    _run = {"timestamp": timestamp, "folder": folder, "started_at": datetime.now().isoformat(timespec="seconds"),
+            "start": time.perf_counter(), "profile_stage": profile_stage or PROFILE_STAGE,
+            "stages": [], "helpers": {}}
+    logging.info(f"Run {timestamp} started, events in {folder}")
+    return folder
+
+# Function to write the run manifest; runs split over several processes (e.g. DAG tasks) are merged
+def finish_run(status="ok"):
+    global _run
+    if _run is None:
+        return None
+    with _run_lock:
+        manifest_file = os.path.join(_run["folder"], "manifest.json")
+        manifest = {
+            "timestamp": _run["timestamp"],
+            "started_at": _run["started_at"],
+            "finished_at": datetime.now().isoformat(timespec="seconds"),
+            "duration_s": round(time.perf_counter() - _run["start"], 3),
+            "status": status,
+            "argv": sys.argv,
+            "pid": os.getpid(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "profile_stage": _run["profile_stage"],
+            "peak_rss_mb": max([event["peak_rss_mb"] for event in _run["stages"]], default=_mb(current_rss())),
+            "stages": _run["stages"],
+            "helpers": _run["helpers"],
+        }
+        if os.path.exists(manifest_file):
+            with open(manifest_file) as f:
+                previous = json.load(f)
+            manifest["started_at"] = previous.get("started_at", manifest["started_at"])
+            manifest["stages"] = previous.get("stages", []) + manifest["stages"]
+            manifest["peak_rss_mb"] = max(manifest["peak_rss_mb"], previous.get("peak_rss_mb", 0))
+            if previous.get("status") == "error":
+                manifest["status"] = "error"
+            for helper, totals in previous.get("helpers", {}).items():
+                merged = manifest["helpers"].setdefault(helper, {})
+                for key, value in totals.items():
+                    merged[key] = max(merged.get(key, 0), value) if key == "peak_rss_mb" else merged.get(key, 0) + value
+        with open(manifest_file + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=2, default=str)
+        os.replace(manifest_file + ".tmp", manifest_file)
+    logging.info(f"Run manifest saved to: {manifest_file}")
+    _run = None
+    return manifest_file
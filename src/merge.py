@@ -0,0 +1,64 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+from logger import logging
+from exception import CustomException
+from schema import ID_COL, apply_column_types
+
+MERGE_STRATEGIES = ("latest", "precedence")
+# latest: the whole record of the latest source wins; precedence: field by field
+MERGE_STRATEGY = os.environ.get("CHURN_MERGE_STRATEGY", "latest")
+# Field-level source precedence (highest first) for the "precedence" strategy;
+# fields not listed use the reverse source order, i.e. the latest non-null value wins
+FIELD_PRECEDENCE = {}
+
+# Function to fill each field from the first source in its precedence order that has a value
+def _merge_fields(frames, ids, precedence):
+    default_order = [source for source, _ in reversed(frames)]
+    by_source = dict(frames)
+    # Row position of every merged customer in every source (-1 when absent)
+    positions = {source: df.index.get_indexer(ids) for source, df in frames}
+    columns = list(dict.fromkeys(col for _, df in frames for col in df.columns))
+
+    merged = {}
+    for col in columns:
+        order = [source for source in precedence.get(col, []) if source in by_source]
+        order += [source for source in default_order if source not in order]
+        values = np.full(len(ids), None, dtype=object)
+        filled = np.zeros(len(ids), dtype=bool)
+        for source in order:
+            if col not in by_source[source].columns:
+                continue
+            take = np.flatnonzero(~filled & (positions[source] >= 0))
+            candidates = by_source[source][col].to_numpy(dtype=object)[positions[source][take]]
+            present = ~pd.isna(candidates)
+            values[take[present]] = candidates[present]
+            filled[take[present]] = True
+        merged[col] = values
+    return pd.DataFrame(merged, index=ids)
+
+# Function to merge source batches on customerID instead of stacking them
+# frames: list of (source name, DataFrame), oldest source first
+def merge_sources(frames, strategy=MERGE_STRATEGY, precedence=None):
+    try:
+        if strategy not in MERGE_STRATEGIES:
+            raise CustomException(f"Unknown merge strategy '{strategy}', expected one of {MERGE_STRATEGIES}", sys)
+        rows = sum(len(df) for _, df in frames)
+        # Within a source the last record of a customer wins
+        frames = [(source, df.drop_duplicates(subset=ID_COL, keep="last").set_index(ID_COL)) for source, df in frames]
+
+        if strategy == "latest":
+            merged = pd.concat([df for _, df in frames])
+            merged = merged[~merged.index.duplicated(keep="last")]
+        else:
+            ids = pd.Index(np.concatenate([df.index.to_numpy() for _, df in frames]), name=ID_COL).unique()
+            merged = _merge_fields(frames, ids, FIELD_PRECEDENCE if precedence is None else precedence)
+
+        # Concat and object columns lose the categorical levels, so re-apply the types
+        merged = apply_column_types(merged.reset_index())
+        logging.info(f"Merged {rows} rows from {len(frames)} sources into {len(merged)} customers ({strategy})")
+        return merged
+    except Exception as e:
+        logging.error(f"Failed to merge sources: {e}")
+        raise CustomException(e, sys)
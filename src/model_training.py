@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+import yaml
+from logger import logging
+from exception import CustomException
+from instrumentation import instrument
+from schema import ID_COL, TARGET_COL
+from sqlite_writer import RUN_TS_COL, read_partition
+from artifact_cache import restore_outputs, save_outputs, stage_key
+from preprocessor import PREPROCESSOR_FOLDER, load_preprocessor
+
+PROJECT_ROOT = ".."
+PARAMS_FILE = os.path.join(PROJECT_ROOT, "param.yaml")
+DB_PATH = ".././data/database/customer_churn.db"
+TABLE_NAME = "transformed_data"
+METRICS = ("accuracy", "precision", "recall", "f1", "roc_auc")
+
+def load_params(path=PARAMS_FILE):
+    with open(path) as f:
+        return yaml.safe_load(f)
+
+# Function to build an unfitted estimator; n_jobs=1 because parallelism comes from the process pool
+def build_model(name, params, random_state=42):
+    if name == "logistic_regression":
+        from sklearn.linear_model import LogisticRegression
+        return LogisticRegression(random_state=random_state, **params)
+    if name == "random_forest":
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(random_state=random_state, n_jobs=1, **params)
+    if name == "xgboost":
+        from xgboost import XGBClassifier
+        return XGBClassifier(random_state=random_state, n_jobs=1, eval_metric="logloss", **params)
+    raise CustomException(f"Unknown model '{name}'", sys)
+
+# Function to expand the candidate grids of param.yaml into (model, params) pairs
+def expand_candidates(train_params):
+    candidates = []
+    for name, grid in (train_params.get("candidates") or {}).items():
+        if name == "xgboost":
+            try:
+                import xgboost  # noqa: F401
+            except ImportError:
+                logging.warning("xgboost is not installed, skipping the xgboost candidates")
+                continue
+        base = {}
+        if name == "logistic_regression":
+            # clf_params are the base settings of the logistic regression
+            from sklearn.linear_model import LogisticRegression
+            supported = LogisticRegression().get_params()
+            base = {key: value for key, value in (train_params.get("clf_params") or {}).items() if key in supported}
+            for key in set(train_params.get("clf_params") or {}) - set(base):
+                logging.warning(f"Ignoring clf_params.{key}, not supported by this scikit-learn version")
+        grid = grid or {}
+        keys = list(grid)
+        for values in itertools.product(*(grid[key] for key in keys)):
+            candidates.append((name, {**base, **dict(zip(keys, values))}))
+    return candidates
+
+# Function to load the latest transformed row of every customer from the feature table
+# feature_names: columns to train on (the saved preprocessor's features); all non-key columns by default
+def load_training_data(db_path=DB_PATH, table_name=TABLE_NAME, feature_names=None):
+    df = read_partition(db_path, table_name)
+    # Rows without a customer, a run or a target can neither be deduplicated nor learned from
+    incomplete = df.reindex(columns=[ID_COL, RUN_TS_COL, TARGET_COL]).isna().any(axis=1)
+    if incomplete.any():
+        logging.warning(f"Dropping {int(incomplete.sum())} rows of {table_name} without {ID_COL}, {RUN_TS_COL} or {TARGET_COL}")
+        df = df[~incomplete]
+    # Each run only stores new or changed customers, so keep the latest partition per customer
+    df = df.sort_values(RUN_TS_COL, kind="mergesort").drop_duplicates(subset=ID_COL, keep="last")
+    feature_names = list(feature_names or [col for col in df.columns if col not in (RUN_TS_COL, ID_COL, TARGET_COL)])
+    missing = [col for col in feature_names if col not in df.columns]
+    if missing:
+        raise CustomException(f"Feature table {table_name} has no column for the features {missing}; "
+                              f"re-run the transformation with --refit", sys)
+    # A feature that is NULL for a whole partition was not produced by the encoding of that run
+    all_null = df[feature_names].isna().groupby(df[RUN_TS_COL]).all()
+    drifted = {run_ts: list(row.index[row]) for run_ts, row in all_null.iterrows() if row.any()}
+    if drifted:
+        raise CustomException(f"Partitions of {table_name} were encoded without some features {drifted}; "
+                              f"re-run the transformation with --refit", sys)
+    # float32 halves the matrix shared with the CV workers; the tree models work in float32 anyway
+    X = df[feature_names].to_numpy(dtype="float32")
+    if np.isnan(X).any():
+        raise CustomException(f"Feature table {table_name} has NULL values in "
+                              f"{[col for col, null in zip(feature_names, np.isnan(X).any(axis=0)) if null]}", sys)
+    y = df[TARGET_COL].to_numpy(dtype="int64")
+    if not set(np.unique(y)) <= {0, 1}:
+        raise CustomException(f"Target {TARGET_COL} of {table_name} is not 0/1: {sorted(np.unique(y))}", sys)
+    return X, y, feature_names
+
+# Worker: score one candidate on one fold, reading the shared matrix through a memory map
+def _score_fold(job):
+    from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score, roc_auc_score
+    from sklearn.model_selection import StratifiedKFold
+    matrix_file, target_file, name, params, fold, n_folds, random_state = job
+    X = np.load(matrix_file, mmap_mode="r")
+    y = np.load(target_file, mmap_mode="r")
+    # Every worker derives the same split from the seed instead of receiving index arrays
+    splits = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=random_state).split(np.zeros(len(y)), y)
+    train_idx, test_idx = next(itertools.islice(splits, fold, None))
+    start = time.perf_counter()
+    model = build_model(name, params, random_state).fit(X[train_idx], y[train_idx])
+    predicted = model.predict(X[test_idx])
+    probability = model.predict_proba(X[test_idx])[:, 1]
+    return {
+        "accuracy": accuracy_score(y[test_idx], predicted),
+        "precision": precision_score(y[test_idx], predicted, zero_division=0),
+        "recall": recall_score(y[test_idx], predicted, zero_division=0),
+        "f1": f1_score(y[test_idx], predicted, zero_division=0),
+        "roc_auc": roc_auc_score(y[test_idx], probability),
+        "fit_seconds": time.perf_counter() - start,
+    }
+
+# Function to cross-validate every candidate, all (candidate, fold) pairs in one process pool
+@instrument()
+def evaluate_candidates(X, y, candidates, n_folds=5, random_state=42, max_workers=None):
+    work_dir = tempfile.mkdtemp(prefix="churn_cv_")
+    try:
+        # One copy of the data on disk; workers map it instead of unpickling their own copy
+        matrix_file = os.path.join(work_dir, "X.npy")
+        target_file = os.path.join(work_dir, "y.npy")
+        np.save(matrix_file, np.ascontiguousarray(X))
+        np.save(target_file, y)
+        jobs = [(matrix_file, target_file, name, params, fold, n_folds, random_state)
+                for name, params in candidates for fold in range(n_folds)]
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            fold_scores = list(pool.map(_score_fold, jobs))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = []
+    for i, (name, params) in enumerate(candidates):
+        scores = fold_scores[i * n_folds:(i + 1) * n_folds]
+        results.append({
+            "model": name,
+            "params": params,
+            **{metric: float(np.mean([score[metric] for score in scores])) for metric in METRICS},
+            "std": {metric: float(np.std([score[metric] for score in scores])) for metric in METRICS},
+            "fit_seconds": float(sum(score["fit_seconds"] for score in scores)),
+        })
+    return results
+
+# Main function to train the candidate models, select the best one and save it with its metrics
+@instrument()
+def run_model_training(timestamp, params_file=PARAMS_FILE, db_path=DB_PATH, max_workers=None):
+    try:
+        params = load_params(params_file)
+        train_params = params["train"]
+        random_state = params.get("base", {}).get("random_state", 42)
+        n_folds = train_params.get("cv_folds", 5)
+        scoring = train_params.get("scoring", "f1")
+        max_workers = max_workers or train_params.get("max_workers") or os.cpu_count()
+
+        if not os.path.exists(db_path):
+            logging.info(f"No feature table at {db_path}, skipping model training.")
+            print("No transformed data to train on, skipping model training.")
+            return None
+        model_path = os.path.join(PROJECT_ROOT, train_params["model_path"])
+        metrics_file = os.path.join(PROJECT_ROOT, params["reports"]["metrics_file"])
+        outputs = {"model": model_path, "metrics": metrics_file}
+
+        # The model is trained on exactly the features of the saved preprocessor, which scoring applies
+        preprocessor_file = os.path.join(PREPROCESSOR_FOLDER, "preprocessor.json")
+        preprocessor = load_preprocessor(preprocessor_file) if os.path.exists(preprocessor_file) else {}
+        X, y, feature_names = load_training_data(db_path, feature_names=preprocessor.get("feature_names"))
+
+        # Same training rows, preprocessor, training code and base/train parameters: reuse the earlier model
+        # (keyed on the loaded rows, so writes to other tables of the database do not invalidate it)
+        data_digest = hashlib.sha256(json.dumps(feature_names).encode())
+        data_digest.update(X.tobytes())
+        data_digest.update(y.tobytes())
+        cache_key = stage_key("train", [], params, [data_digest.hexdigest(), str(preprocessor.get("fingerprint"))])
+        cached = restore_outputs("train", cache_key, outputs)
+        if cached is not None:
+            print(f"Model training inputs unchanged since {cached['timestamp']}, reusing {model_path}")
+            return model_path
+        candidates = expand_candidates(train_params)
+        if not candidates:
+            raise CustomException("No model candidates configured in param.yaml (train.candidates)", sys)
+
+        start = time.perf_counter()
+        results = evaluate_candidates(X, y, candidates, n_folds, random_state, max_workers)
+        cv_seconds = time.perf_counter() - start
+        best = max(results, key=lambda result: result[scoring])
+        logging.info(f"Cross-validated {len(candidates)} candidates x {n_folds} folds on {len(y)} rows "
+                     f"with {max_workers} workers in {cv_seconds:.1f}s; best {best['model']} {best['params']}")
+
+        # Refit the winner on all rows
+        import joblib
+        model = build_model(best["model"], best["params"], random_state).fit(X, y)
+        # Outputs are written to a temporary file and renamed: the previous ones may be hard links
+        # into the artifact cache, which must never be overwritten in place
+        os.makedirs(os.path.dirname(model_path), exist_ok=True)
+        joblib.dump({"model": model, "feature_names": feature_names, "model_name": best["model"],
+                     "params": best["params"], "trained_at": timestamp,
+                     "preprocessor_fingerprint": preprocessor.get("fingerprint")}, model_path + ".tmp")
+        os.replace(model_path + ".tmp", model_path)
+
+        os.makedirs(os.path.dirname(metrics_file), exist_ok=True)
+        with open(metrics_file + ".tmp", "w") as f:
+            json.dump({
+                "timestamp": timestamp,
+                "trained_at": datetime.now().isoformat(timespec="seconds"),
+                "rows": int(len(y)),
+                "features": len(feature_names),
+                "cv_folds": n_folds,
+                "scoring": scoring,
+                "workers": max_workers,
+                "cv_seconds": round(cv_seconds, 3),
+                "best": best,
+                "candidates": sorted(results, key=lambda result: result[scoring], reverse=True),
+            }, f, indent=2)
+        os.replace(metrics_file + ".tmp", metrics_file)
+        save_outputs("train", cache_key, outputs, timestamp, {"model": best["model"], scoring: best[scoring]})
+
+        print(f"Best model: {best['model']} ({scoring}={best[scoring]:.4f}) saved to: {model_path}")
+        print(f"Metrics saved to: {metrics_file}")
+        return model_path
+    except Exception as e:
+        logging.error(f"Failed to train models: {e}")
+        raise CustomException(e, sys)
@@ -0,0 +1,153 @@
+import os
+import sys
+import glob
+import json
+import yaml
+from exception import CustomException
+from features import feature_inputs, requested_features
+from preprocessor import input_columns, reusable_preprocessor
+from schema import COLUMNS, ID_COL, TARGET_COL
+
+PARAMS_FILE = "../param.yaml"
+RUNS_FOLDER = "../logs/runs"
+RAW_DATA_FOLDER = ".././data/raw"
+
+# Stages in execution order: the outputs each one needs and produces, and the raw columns it reads
+# ("all": every column; "selected": data.columns of param.yaml plus the inputs of the requested
+# features; "preprocessor": the same, widened to what the saved preprocessor encodes; None: no raw dataset)
+STAGES = {
+    "ingest": {"function": "run_data_ingestion", "needs": [], "produces": ["raw_dataset"], "columns": "all"},
+    "validate": {"function": "run_data_validation", "needs": ["raw_dataset"], "produces": ["validation_report"], "columns": "selected"},
+    "eda": {"function": "run_eda", "needs": ["raw_dataset"], "produces": ["eda_stats", "eda_plots"], "columns": "selected"},
+    "transform": {"function": "run_data_transformation", "needs": ["raw_dataset"],
+                  "produces": ["clean_dataset", "feature_table", "feature_store", "churn_aggregates"], "columns": "preprocessor"},
+    "train": {"function": "run_model_training", "needs": ["feature_table"], "produces": ["model"], "columns": None},
+    "score": {"function": "run_batch_scoring", "needs": ["feature_table", "model"], "produces": ["scores"], "columns": None},
+}
+OUTPUTS = [output for spec in STAGES.values() for output in spec["produces"]]
+DEFAULT_TARGETS = ["validation_report", "eda_plots", "clean_dataset", "feature_table", "feature_store",
+                   "churn_aggregates", "model"]
+
+def load_pipeline_params(params_file=PARAMS_FILE):
+    params = {}
+    if os.path.exists(params_file):
+        with open(params_file) as f:
+            params = yaml.safe_load(f) or {}
+    return {
+        "targets": (params.get("pipeline") or {}).get("targets") or DEFAULT_TARGETS,
+        "columns": (params.get("data") or {}).get("columns"),
+    }
+
+# Function to resolve the outputs of a run from param.yaml and the command line overrides
+# eda: "off" drops the EDA outputs, "stats" keeps statistics without plots, "full" adds the plots
+def resolve_targets(targets=None, eda=None, train=True, params_file=PARAMS_FILE):
+    targets = list(targets or load_pipeline_params(params_file)["targets"])
+    unknown = [target for target in targets if target not in OUTPUTS]
+    if unknown:
+        raise CustomException(f"Unknown pipeline targets {unknown}, expected some of {OUTPUTS}", sys)
+    if eda == "off":
+        targets = [target for target in targets if target not in ("eda_stats", "eda_plots")]
+    elif eda == "stats":
+        targets = [target for target in targets if target != "eda_plots"] + ["eda_stats"]
+    elif eda == "full":
+        targets = targets + ["eda_plots"]
+    if not train:
+        targets = [target for target in targets if target not in ("model", "scores")]
+    return list(dict.fromkeys(targets))
+
+# Function to list the raw columns a projected stage reads, in schema order
+def selected_columns(columns=None, features=None):
+    if columns is None:
+        return list(COLUMNS)
+    features = requested_features() if features is None else features
+    wanted = {ID_COL, TARGET_COL, *columns, *feature_inputs(features)}
+    unknown = wanted - set(COLUMNS)
+    if unknown:
+        raise CustomException(f"Unknown columns {sorted(unknown)} in data.columns", sys)
+    return [col for col in COLUMNS if col in wanted]
+
+# Function to list the raw columns the transformation reads: a projection never narrows the saved
+# preprocessor, and a run that fits a new one (none saved, or other features requested) reads every column
+def transform_columns(columns=None):
+    preprocessor = reusable_preprocessor(requested_features())
+    if columns is None or preprocessor is None:
+        return None
+    return selected_columns([*columns, *input_columns(preprocessor)])
+
+# Function to plan a run: only the stages whose outputs are needed (directly or by a later stage)
+# Returns {"targets", "stages": {stage: {"outputs", "columns"}}, "skipped": {stage: outputs}}
+def make_plan(targets, params_file=PARAMS_FILE):
+    params = load_pipeline_params(params_file)
+    needed = set(targets)
+    stages = {}
+    for name in reversed(list(STAGES)):
+        spec = STAGES[name]
+        outputs = [output for output in spec["produces"] if output in needed]
+        if outputs:
+            columns = {"all": None, "selected": params["columns"], "preprocessor": params["columns"]}.get(spec["columns"])
+            if columns is not None:
+                columns = transform_columns(columns) if spec["columns"] == "preprocessor" else selected_columns(columns)
+            stages[name] = {"outputs": outputs, "columns": columns}
+            needed.update(spec["needs"])
+    return {
+        "targets": list(targets),
+        "stages": {name: stages[name] for name in STAGES if name in stages},
+        "skipped": {name: spec["produces"] for name, spec in STAGES.items() if name not in stages},
+    }
+
+# Function to find the duration of every stage function in the most recent run manifest that has it
+def last_durations(runs_folder=RUNS_FOLDER):
+    durations = {}
+    for manifest_file in sorted(glob.glob(os.path.join(runs_folder, "*", "manifest.json")), reverse=True):
+        try:
+            with open(manifest_file) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for event in manifest.get("stages", []):
+            if event.get("status") == "ok":
+                durations.setdefault(event["stage"], event["duration_s"])
+    return durations
+
+# Function to estimate the bytes a projected read of a dataset loads (Parquet column chunks,
+# or the matching share of a CSV file) and its rows
+def estimate_read(path, columns=None):
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        metadata = pq.ParquetFile(path).metadata
+        names = [metadata.schema.column(i).name for i in range(metadata.num_columns)]
+        keep = [i for i, name in enumerate(names) if columns is None or name in columns]
+        nbytes = sum(metadata.row_group(group).column(i).total_compressed_size
+                     for group in range(metadata.num_row_groups) for i in keep)
+        return nbytes, metadata.num_rows
+    share = 1.0 if columns is None else len(columns) / len(COLUMNS)
+    return int(os.path.getsize(path) * share), None
+
+def _mb(nbytes):
+    return f"{nbytes / (1024 * 1024):.2f} MB"
+
+# Function to render the plan with its estimated cost: bytes read by projected stages (measured on
+# the latest raw delta) and the stage duration of the last run that executed it
+def format_plan(plan, raw_data_folder=RAW_DATA_FOLDER, runs_folder=RUNS_FOLDER):
+    deltas = sorted(glob.glob(os.path.join(raw_data_folder, "customer_churn_*")))
+    latest = deltas[-1] if deltas else None
+    durations = last_durations(runs_folder)
+    lines = [f"Execution plan for {', '.join(plan['targets']) or 'nothing'}",
+             f"  {'stage':<10} {'columns':>8} {'est. read':>10} {'last run':>9}  outputs"]
+    for name, stage in plan["stages"].items():
+        spec = STAGES[name]
+        columns = read = "-"
+        if spec["columns"] is not None:
+            projected = stage["columns"]
+            columns = f"{len(projected or COLUMNS)}/{len(COLUMNS)}"
+            if latest is not None:
+                nbytes, rows = estimate_read(latest, projected)
+                read = _mb(nbytes)
+        duration = durations.get(spec["function"])
+        last_run = f"{duration:.2f}s" if duration is not None else "-"
+        lines.append(f"  {name:<10} {columns:>8} {read:>10} {last_run:>9}  {', '.join(stage['outputs'])}")
+    for name, outputs in plan["skipped"].items():
+        lines.append(f"  {name:<10} skipped (nobody needs {', '.join(outputs)})")
+    if latest is not None:
+        lines.append(f"  reads estimated on {os.path.basename(latest)}")
+    return "\n".join(lines)
@@ -0,0 +1,231 @@
+import sys
+import json
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+from logger import logging
+from exception import CustomException
+from schema import ID_COL
+from feature_store import FeatureStore
+from preprocessor import load_preprocessor, transform_records
+from scoring import DEFAULT_THRESHOLD, Scorer
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+MAX_BATCH_SIZE = 256
+MAX_BATCH_DELAY_MS = 5
+MAX_BODY_BYTES = 1 << 20
+
+# Model, preprocessor and feature store used by the batch worker thread
+class PredictionModel:
+    def __init__(self, model_path=None, threshold=DEFAULT_THRESHOLD):
+        self.scorer = Scorer(model_path, threshold)
+        self.preprocessor = self.scorer.check_preprocessor(load_preprocessor())
+        self.store = None
+        # Preprocessor output column of every model feature
+        position = {name: i for i, name in enumerate(self.preprocessor["feature_names"])}
+        self.columns = np.array([position[name] for name in self.scorer.feature_names])
+
+    # Raw customer records -> model matrix, through the DataFrame-free record transform
+    def record_matrix(self, records):
+        return transform_records(records, self.preprocessor)[:, self.columns]
+
+    def predict(self, requests):
+        # SQLite connections belong to the thread that opened them, so the store is opened here
+        if self.store is None:
+            self.store = FeatureStore()
+        results = [None] * len(requests)
+        records = [(i, request["record"]) for i, request in enumerate(requests) if "record" in request]
+        lookups = [(i, request["customerID"]) for i, request in enumerate(requests) if "record" not in request]
+        # Model rows of the requests left to score: (request position, customer id, row)
+        rows = []
+
+        if records:
+            try:
+                X = self.record_matrix([record for _, record in records])
+            except Exception:
+                # Find the malformed records so they fail alone instead of failing the whole batch
+                X = np.full((len(records), len(self.columns)), np.nan)
+                for row, (i, record) in enumerate(records):
+                    try:
+                        X[row] = self.record_matrix([record])[0]
+                    except Exception as e:
+                        results[i] = ValueError(f"invalid record: {e!r}")
+            rows += [(i, record.get(ID_COL), x) for (i, record), x in zip(records, X) if results[i] is None]
+        if lookups:
+            features = self.store.get_features([customer_id for _, customer_id in lookups])
+            # Features a snapshot lacks come out as NULLs, so only the customers of that snapshot fail
+            X = features.reindex(columns=self.scorer.feature_names).to_numpy(dtype="float64")
+            position = {customer_id: row for row, customer_id in enumerate(features.index)}
+            for i, customer_id in lookups:
+                if str(customer_id) in position:
+                    rows.append((i, customer_id, X[position[str(customer_id)]]))
+                else:
+                    results[i] = (customer_id, None)
+
+        # Rows with NULL features (NaN in a record, or features missing from the store) fail alone
+        valid = []
+        X = np.array([x for _, _, x in rows]).reshape(len(rows), len(self.scorer.feature_names))
+        for (i, customer_id, x), error in zip(rows, self.scorer.row_errors(X)):
+            if error is None:
+                valid.append((i, customer_id, x))
+            else:
+                results[i] = ValueError(f"cannot score {ID_COL} {customer_id}: {error}")
+        if valid:
+            probability = self.scorer.predict_proba(np.array([x for _, _, x in valid]))
+            for (i, customer_id, _), value in zip(valid, probability):
+                results[i] = (customer_id, float(value))
+
+        return [result if isinstance(result, Exception) else
+                {ID_COL: result[0],
+                 "churn_probability": result[1],
+                 "churn_prediction": None if result[1] is None else int(result[1] >= self.scorer.threshold)}
+                for result in results]
+
+# Coalesces concurrent single-customer requests into one vectorized prediction
+class MicroBatcher:
+    def __init__(self, model, max_batch_size=MAX_BATCH_SIZE, max_delay_ms=MAX_BATCH_DELAY_MS):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.queue = asyncio.Queue()
+        # One worker thread: predictions leave the event loop free to accept requests
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="predict")
+        self.batches = 0
+        self.requests = 0
+
+    async def predict(self, request):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((request, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            # Wait at most max_delay after the first request for the batch to fill up
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                results = await loop.run_in_executor(self.executor, self.model.predict, [request for request, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+            except Exception as e:
+                logging.error(f"Prediction batch of {len(batch)} failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            self.batches += 1
+            self.requests += len(batch)
+
+# Minimal HTTP/1.1 server on asyncio streams
+#   GET  /predict?customerID=...  features from the feature store
+#   POST /predict                 raw customer record as JSON
+#   GET  /health
+class PredictionServer:
+    def __init__(self, batcher):
+        self.batcher = batcher
+
+    async def respond(self, writer, status, payload):
+        body = json.dumps(payload).encode()
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        await writer.drain()
+
+    async def handle_request(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == "/health":
+            return "200 OK", {"status": "ok", "batches": self.batcher.batches, "requests": self.batcher.requests}
+        if url.path != "/predict":
+            return "404 Not Found", {"error": f"unknown path {url.path}"}
+        if method == "GET":
+            customer_id = parse_qs(url.query).get(ID_COL, [None])[0]
+            if customer_id is None:
+                return "400 Bad Request", {"error": f"missing {ID_COL} query parameter"}
+            request = {"customerID": customer_id}
+        elif method == "POST":
+            try:
+                request = {"record": json.loads(body)}
+            except ValueError:
+                return "400 Bad Request", {"error": "body is not valid JSON"}
+        else:
+            return "405 Method Not Allowed", {"error": f"method {method} not allowed"}
+        try:
+            result = await self.batcher.predict(request)
+        except Exception as e:
+            return "422 Unprocessable Entity", {"error": str(e)}
+        if result["churn_probability"] is None:
+            return "404 Not Found", {"error": f"no features for {ID_COL} {result[ID_COL]}"}
+        return "200 OK", result
+
+    # Keep-alive connection loop: one request at a time per connection
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    await self.respond(writer, "413 Payload Too Large", {"error": "request body too large"})
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self.handle_request(method, target, body)
+                await self.respond(writer, status, payload)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, model_path=None, threshold=DEFAULT_THRESHOLD,
+                max_batch_size=MAX_BATCH_SIZE, max_delay_ms=MAX_BATCH_DELAY_MS):
+    try:
+        batcher = MicroBatcher(PredictionModel(model_path, threshold), max_batch_size, max_delay_ms)
+        batch_task = asyncio.create_task(batcher.run())
+        server = await asyncio.start_server(PredictionServer(batcher).handle_connection, host, port)
+    except Exception as e:
+        logging.error(f"Failed to start prediction server: {e}")
+        raise CustomException(e, sys)
+    logging.info(f"Prediction server listening on http://{host}:{port} "
+                 f"(micro-batches of up to {max_batch_size} requests, {max_delay_ms} ms)")
+    print(f"Prediction server listening on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batch_task.cancel()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Churn prediction server")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--model", default=None, help="Model file (defaults to train.model_path in param.yaml)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--max-delay-ms", type=float, default=MAX_BATCH_DELAY_MS)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.model, args.threshold, args.max_batch_size, args.max_delay_ms))
@@ -0,0 +1,289 @@
+import os
+import sys
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from logger import logging
+from exception import CustomException
+from instrumentation import instrument
+from schema import ID_COL, INDICATOR_DTYPE, NUM_COLS, TARGET_COL
+from stats import KLLSketch, RunningMoments, outlier_limits, outlier_thresholds
+from features import evaluate_features, fit_features, frame_aggregate
+
+PREPROCESSOR_VERSION = 1
+PREPROCESSOR_FOLDER = "../models"
+
+# Function to apply the row-local cleaning steps shared by training and scoring
+# customerID is kept as the row key but never becomes a feature
+def clean_data(df):
+    # Handle datatype for TotalCharges
+    total_charges = pd.to_numeric(df['TotalCharges'], errors='coerce').replace([np.inf, -np.inf], np.nan)
+    df = df.assign(TotalCharges=total_charges)
+    # Handle missing values
+    df = df.dropna()
+    # Label encoding of target column
+    if TARGET_COL in df.columns:
+        df = df.assign(**{TARGET_COL: df[TARGET_COL].map({"Yes": 1, "No": 0}).astype(INDICATOR_DTYPE)})
+    return df
+
+# Function to assemble a preprocessor state from fitted statistics
+# features: frozen engineered features (features.fit_features), computed from the cleaned columns
+def build_state(columns, thresholds, mean, scale, categories, rows, features=None):
+    categories = {col: [str(level) for level in levels] for col, levels in categories.items()}
+    num_cols = [col for col in columns if col in thresholds]
+    passthrough = [col for col in columns
+                   if col not in thresholds and col not in categories and col not in (ID_COL, TARGET_COL)]
+    # drop='first' like the OneHotEncoder used before
+    encoded = [f"{col}_{level}" for col, levels in categories.items() for level in levels[1:]]
+    features = features or {}
+    return {
+        "version": PREPROCESSOR_VERSION,
+        "fitted_at": datetime.now().isoformat(timespec="seconds"),
+        "rows": int(rows),
+        "target": TARGET_COL,
+        "num_cols": num_cols,
+        "passthrough": passthrough,
+        "thresholds": {col: [float(low), float(up)] for col, (low, up) in thresholds.items()},
+        "mean": {col: float(value) for col, value in mean.items()},
+        "scale": {col: float(value) for col, value in scale.items()},
+        "categories": categories,
+        "features": features,
+        "feature_names": passthrough + list(features) + num_cols + encoded,
+    }
+
+# Function to fit clip thresholds, scaler moments and category levels on cleaned data
+# features: names of the registered features to add (features.FEATURES)
+@instrument()
+def fit_preprocessor(df, num_cols=NUM_COLS, q1=0.05, q3=0.95, features=()):
+    try:
+        # All thresholds come from one quantile call
+        thresholds = outlier_thresholds(df, list(num_cols), q1, q3)
+        mean, scale = {}, {}
+        for col in num_cols:
+            clipped = df[col].clip(*thresholds[col])
+            mean[col] = clipped.mean()
+            # Population std and unit scale for constant columns, as StandardScaler does
+            scale[col] = clipped.std(ddof=0) or 1.0
+        categorical_cols = [col for col in df.select_dtypes(include=['object', 'category']).columns
+                            if col not in (ID_COL, TARGET_COL)]
+        # unique() of a categorical works on its codes, so only the levels become strings
+        categories = {col: sorted(str(level) for level in df[col].dropna().unique()) for col in categorical_cols}
+        frozen = fit_features(features, frame_aggregate(df))
+        state = build_state(list(df.columns), thresholds, mean, scale, categories, len(df), frozen)
+        logging.info(f"Preprocessor fitted on {len(df)} rows with {len(state['feature_names'])} features")
+        return state
+    except Exception as e:
+        logging.error(f"Failed to fit preprocessor: {e}")
+        raise CustomException(e, sys)
+
+# Mergeable statistics of cleaned rows, accumulated chunk by chunk (streaming) or partition by
+# partition (partitioned prepare_data) and reduced into one preprocessor state
+# Quantiles come from KLL sketches, so thresholds and fit-time feature constants are approximate
+class PartialStats:
+    def __init__(self, num_cols=NUM_COLS, seed=42):
+        self.num_cols = list(num_cols)
+        self.quantiles = {col: KLLSketch(seed=seed) for col in self.num_cols}
+        self.moments = {col: RunningMoments() for col in self.num_cols}
+        self.categories = {}
+        self.columns = None
+        self.rows = 0
+
+    def update(self, df):
+        self.columns = self.columns or list(df.columns)
+        self.rows += len(df)
+        for col in self.num_cols:
+            self.quantiles[col].update(df[col])
+            self.moments[col].update(df[col])
+        for col in df.select_dtypes(include=['object', 'category']).columns.drop(ID_COL, errors="ignore"):
+            self.categories.setdefault(col, set()).update(str(level) for level in df[col].dropna().unique())
+        return self
+
+    def merge(self, other):
+        self.columns = self.columns or other.columns
+        self.rows += other.rows
+        for col in self.num_cols:
+            self.quantiles[col].merge(other.quantiles[col])
+            self.moments[col].merge(other.moments[col])
+        for col, levels in other.categories.items():
+            self.categories.setdefault(col, set()).update(levels)
+        return self
+
+    # Outlier thresholds, same formula as outlier_th
+    def thresholds(self, q1=0.05, q3=0.95):
+        return {col: outlier_limits(*self.quantiles[col].quantiles([q1, q3])) for col in self.num_cols}
+
+    # Scaler moments are only exact for unclipped columns; the others need a pass over clipped values
+    def clipped_columns(self, thresholds):
+        return [col for col in self.num_cols
+                if self.moments[col].min < thresholds[col][0] or self.moments[col].max > thresholds[col][1]]
+
+    # Fit-time constants of the engineered features, from the unclipped sketches
+    def feature_aggregate(self, kind, col, *args):
+        if col not in self.num_cols:
+            raise CustomException(f"Features fitted from partial statistics can only aggregate {self.num_cols}, not '{col}'", sys)
+        if kind in ("median", "quantile"):
+            return self.quantiles[col].quantile(args[0] if args else 0.5)
+        return getattr(self.moments[col], kind)
+
+    # Function to build the preprocessor state; clipped_moments replaces the moments of clipped columns
+    def build(self, thresholds, clipped_moments=None, features=()):
+        moments = {**self.moments, **(clipped_moments or {})}
+        return build_state(
+            self.columns,
+            thresholds,
+            {col: moments[col].mean for col in self.num_cols},
+            {col: moments[col].std() or 1.0 for col in self.num_cols},
+            {col: sorted(values) for col, values in self.categories.items()},
+            self.rows,
+            fit_features(features, self.feature_aggregate),
+        )
+
+# Function to apply a fitted preprocessor to a cleaned DataFrame without refitting
+# Scaled and encoded features are written into one preallocated block per dtype, which the
+# returned frame shares; every part carries the input index, so nothing can misalign
+@instrument()
+def transform(df, state):
+    try:
+        n_rows = len(df)
+        leading = {}
+        if ID_COL in df.columns:
+            # An explicit object dtype skips pandas' type inference over every id
+            leading[ID_COL] = pd.Series(df[ID_COL].astype(str).to_numpy(), index=df.index, dtype=object, copy=False)
+        for col in state["passthrough"]:
+            leading[col] = df[col]
+        # Engineered features come from the cleaned, unscaled columns
+        leading.update(evaluate_features(state.get("features") or {}, df))
+
+        # Blocks are allocated feature-major so each column is contiguous in the frame
+        num_cols = state["num_cols"]
+        numeric = np.empty((len(num_cols), n_rows), dtype="float64")
+        for j, col in enumerate(num_cols):
+            np.clip(df[col].to_numpy(dtype="float64"), *state["thresholds"][col], out=numeric[j])
+            numeric[j] -= state["mean"][col]
+            numeric[j] /= state["scale"][col]
+
+        # The 0/1 target shares the indicator block; a separate uint8 column would make pandas
+        # consolidate (copy) the whole block
+        encoded = [f"{col}_{level}" for col, levels in state["categories"].items() for level in levels[1:]]
+        compact = encoded + ([state["target"]] if state["target"] in df.columns else [])
+        indicators = np.empty((len(compact), n_rows), dtype=INDICATOR_DTYPE)
+        flags = indicators.view(bool)
+        k = 0
+        for col, levels in state["categories"].items():
+            # Unseen categories get code -1 and therefore all-zero indicator columns
+            codes = pd.Categorical(df[col], categories=levels).codes
+            for i in range(1, len(levels)):
+                np.equal(codes, i, out=flags[k])
+                k += 1
+        if len(compact) > len(encoded):
+            indicators[-1] = df[state["target"]].to_numpy()
+
+        transformed = pd.concat([pd.DataFrame(leading, index=df.index, copy=False),
+                                 pd.DataFrame(numeric.T, index=df.index, columns=num_cols, copy=False),
+                                 pd.DataFrame(indicators.T, index=df.index, columns=compact, copy=False)],
+                                axis=1, copy=False)
+        if len(transformed) != n_rows:
+            raise CustomException(f"Transformed {len(transformed)} rows from {n_rows} cleaned rows", sys)
+        return transformed
+    except Exception as e:
+        logging.error(f"Failed to transform data: {e}")
+        raise CustomException(e, sys)
+
+# Lookup tables for the record path, built once per loaded state
+def _record_plan(state):
+    if "_plan" not in state:
+        names = state["feature_names"]
+        position = {name: i for i, name in enumerate(names)}
+        numeric = [(position[col], col, *state["thresholds"][col], state["mean"][col], state["scale"][col])
+                   for col in state["num_cols"]]
+        passthrough = [(position[col], col) for col in state["passthrough"]]
+        onehot = [(col, {level: position[f"{col}_{level}"] for level in levels[1:]})
+                  for col, levels in state["categories"].items()]
+        features = state.get("features") or {}
+        engineered = [position[name] for name in features]
+        inputs = sorted({col for feature in features.values() for col in feature["inputs"]})
+        state["_plan"] = (len(names), numeric, passthrough, onehot, features, engineered, inputs)
+    return state["_plan"]
+
+# Function to transform raw customer records (dicts) into feature rows without building a DataFrame
+def transform_records(records, state):
+    n_features, numeric, passthrough, onehot, frozen, engineered, inputs = _record_plan(state)
+    features = np.zeros((len(records), n_features))
+    for row, record in enumerate(records):
+        for i, col in passthrough:
+            features[row, i] = float(record[col])
+        for i, col, low_limit, up_limit, mean, scale in numeric:
+            value = min(max(float(record[col]), low_limit), up_limit)
+            features[row, i] = (value - mean) / scale
+        for col, lookup in onehot:
+            i = lookup.get(str(record[col]))
+            if i is not None:
+                features[row, i] = 1.0
+    if engineered:
+        # The same frozen expressions as in training, evaluated once over the whole batch
+        columns = {col: [record[col] for record in records] for col in inputs}
+        features[:, engineered] = np.column_stack(list(evaluate_features(frozen, columns).values()))
+    return features
+
+def transform_record(record, state):
+    return transform_records([record], state)[0]
+
+# Function to list the raw columns a fitted state consumes (what scoring needs to read)
+def input_columns(state):
+    features = (state.get("features") or {}).values()
+    return list(dict.fromkeys([ID_COL, *state["passthrough"], *state["num_cols"], *state["categories"],
+                               *(col for feature in features for col in feature["inputs"])]))
+
+# Function to list, per categorical column, the levels of a batch the fitted state has never seen
+# (they are encoded as all-zero indicators until the preprocessor is refitted)
+def unseen_levels(df, state):
+    unseen = {}
+    for col, levels in state["categories"].items():
+        if col in df.columns:
+            new = sorted(set(str(level) for level in df[col].dropna().unique()) - set(levels))
+            if new:
+                unseen[col] = new
+    return unseen
+
+# Function to save the fitted state as a versioned JSON artifact (plus a "latest" copy)
+def save_preprocessor(state, timestamp, folder=PREPROCESSOR_FOLDER):
+    try:
+        os.makedirs(folder, exist_ok=True)
+        payload = {key: value for key, value in state.items() if not key.startswith("_")}
+        content = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+        payload["fingerprint"] = hashlib.sha256(content.encode()).hexdigest()[:16]
+        artifact_file = os.path.join(folder, f"preprocessor_{timestamp}.json")
+        for path in (artifact_file, os.path.join(folder, "preprocessor.json")):
+            with open(path, "w") as f:
+                json.dump(payload, f, separators=(",", ":"))
+        logging.info(f"Preprocessor saved to: {artifact_file}")
+        print(f"Preprocessor saved to: {artifact_file}")
+        return artifact_file
+    except Exception as e:
+        logging.error(f"Failed to save preprocessor: {e}")
+        raise CustomException(e, sys)
+
+def load_preprocessor(path=os.path.join(PREPROCESSOR_FOLDER, "preprocessor.json")):
+    try:
+        with open(path) as f:
+            state = json.load(f)
+        if state.get("version") != PREPROCESSOR_VERSION:
+            raise CustomException(f"Unsupported preprocessor version {state.get('version')} in {path}", sys)
+        return state
+    except Exception as e:
+        logging.error(f"Failed to load preprocessor {path}: {e}")
+        raise CustomException(e, sys)
+
+# Function to load the saved preprocessor if it can encode new data as it is: same version and the
+# same requested features; returns None when a new one has to be fitted
+def reusable_preprocessor(features, path=os.path.join(PREPROCESSOR_FOLDER, "preprocessor.json")):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        state = json.load(f)
+    if state.get("version") != PREPROCESSOR_VERSION or list(state.get("features") or {}) != list(features):
+        logging.info(f"Preprocessor {path} was fitted for another version or other features, refitting")
+        return None
+    return state
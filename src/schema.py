@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+# Column groups of the Telco customer churn dataset
+ID_COL = "customerID"
+TARGET_COL = "Churn"
+NUM_COLS = ["tenure", "MonthlyCharges", "TotalCharges"]
+INT_COLS = ["SeniorCitizen", "tenure"]
+FLOAT_COLS = ["MonthlyCharges", "TotalCharges"]
+CATEGORICAL_COLS = [
+    "gender", "Partner", "Dependents", "PhoneService", "MultipleLines",
+    "InternetService", "OnlineSecurity", "OnlineBackup", "DeviceProtection",
+    "TechSupport", "StreamingTV", "StreamingMovies", "Contract",
+    "PaperlessBilling", "PaymentMethod",
+]
+COLUMNS = [ID_COL, "gender", "SeniorCitizen", "Partner", "Dependents", "tenure",
+           "PhoneService", "MultipleLines", "InternetService", "OnlineSecurity",
+           "OnlineBackup", "DeviceProtection", "TechSupport", "StreamingTV",
+           "StreamingMovies", "Contract", "PaperlessBilling", "PaymentMethod",
+           "MonthlyCharges", "TotalCharges", TARGET_COL]
+
+YES_NO = ["No", "Yes"]
+INTERNET_ADDON = ["No", "No internet service", "Yes"]
+CATEGORY_LEVELS = {
+    "gender": ["Female", "Male"],
+    "Partner": YES_NO,
+    "Dependents": YES_NO,
+    "PhoneService": YES_NO,
+    "MultipleLines": ["No", "No phone service", "Yes"],
+    "InternetService": ["DSL", "Fiber optic", "No"],
+    "OnlineSecurity": INTERNET_ADDON,
+    "OnlineBackup": INTERNET_ADDON,
+    "DeviceProtection": INTERNET_ADDON,
+    "TechSupport": INTERNET_ADDON,
+    "StreamingTV": INTERNET_ADDON,
+    "StreamingMovies": INTERNET_ADDON,
+    "Contract": ["Month-to-month", "One year", "Two year"],
+    "PaperlessBilling": YES_NO,
+    "PaymentMethod": ["Bank transfer (automatic)", "Credit card (automatic)", "Electronic check", "Mailed check"],
+    TARGET_COL: YES_NO,
+}
+
+# Declarative validation rules, evaluated by data_validation.validate_dataset
+# dtype: expected column kind; levels: allowed categories; min/max: numeric range;
+# max_null_fraction: null budget (0 when omitted)
+VALIDATION_SCHEMA = {
+    "primary_key": ID_COL,
+    "columns": {
+        ID_COL: {"dtype": "string"},
+        "SeniorCitizen": {"dtype": "int", "min": 0, "max": 1},
+        "tenure": {"dtype": "int", "min": 0, "max": 120},
+        "MonthlyCharges": {"dtype": "float", "min": 0, "max": 1000},
+        # New customers have no TotalCharges yet
+        "TotalCharges": {"dtype": "float", "min": 0, "max_null_fraction": 0.01},
+        **{col: {"dtype": "category", "levels": levels} for col, levels in CATEGORY_LEVELS.items()},
+    },
+}
+
+# dtypes for pd.read_csv: low-cardinality strings are parsed straight into categoricals
+# instead of one Python string object per cell
+CSV_DTYPES = {col: "category" for col in CATEGORICAL_COLS + [TARGET_COL]}
+# dtype of the one-hot indicator columns written by the preprocessor
+INDICATOR_DTYPE = "uint8"
+
+# Function to read a raw customer CSV with its typed columns
+def read_typed_csv(path, **kwargs):
+    return apply_column_types(pd.read_csv(path, dtype=CSV_DTYPES, **kwargs))
+
+# Function to give raw customer data its typed columns
+def apply_column_types(df):
+    for col in df.columns:
+        if col in FLOAT_COLS:
+            # TotalCharges arrives as text with blanks for new customers
+            df[col] = pd.to_numeric(df[col], errors='coerce').replace([np.inf, -np.inf], np.nan).astype("float64")
+        elif col in INT_COLS:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        elif col in CATEGORICAL_COLS or col == TARGET_COL:
+            df[col] = df[col].astype("category")
+    return df
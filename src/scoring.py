@@ -0,0 +1,168 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from logger import logging
+from exception import CustomException
+from instrumentation import instrument
+from schema import ID_COL, TARGET_COL
+from model_training import DB_PATH, PROJECT_ROOT, TABLE_NAME, load_params
+from preprocessor import PREPROCESSOR_FOLDER, clean_data, input_columns, load_preprocessor, transform
+from sqlite_writer import RUN_TS_COL, quote, write_table
+from storage import dataset_path, iter_dataset_chunks, open_dataset_writer
+
+DEFAULT_CHUNK_SIZE = 50000
+DEFAULT_THRESHOLD = 0.5
+SCORES_FOLDER = ".././data/scores"
+SCORES_TABLE = "churn_scores"
+
+def default_model_path():
+    return os.path.join(PROJECT_ROOT, load_params()["train"]["model_path"])
+
+# Trained model plus the feature order it was fitted on
+class Scorer:
+    def __init__(self, model_path=None, threshold=DEFAULT_THRESHOLD):
+        import joblib
+        bundle = joblib.load(model_path or default_model_path())
+        self.model = bundle["model"]
+        self.feature_names = bundle["feature_names"]
+        self.model_name = bundle.get("model_name", type(self.model).__name__)
+        # Fingerprint of the preprocessor whose output the model was trained on (older models have none)
+        self.preprocessor_fingerprint = bundle.get("preprocessor_fingerprint")
+        self.threshold = threshold
+
+    # Function to check that a preprocessor produces exactly what the model was trained on
+    def check_preprocessor(self, state):
+        missing = [name for name in self.feature_names if name not in state["feature_names"]]
+        if missing:
+            raise CustomException(f"Model {self.model_name} needs features the preprocessor does not produce: "
+                                  f"{missing}; retrain the model", sys)
+        if self.preprocessor_fingerprint and self.preprocessor_fingerprint != state.get("fingerprint"):
+            raise CustomException(f"Model {self.model_name} was trained on preprocessor {self.preprocessor_fingerprint}, "
+                                  f"not {state.get('fingerprint')}; retrain the model", sys)
+        return state
+
+    # The input must carry every model feature, without NULLs; extra columns are dropped
+    def align(self, features):
+        missing = [name for name in self.feature_names if name not in features.columns]
+        if missing:
+            raise CustomException(f"Input lacks the model features {missing}", sys)
+        X = features[self.feature_names].to_numpy(dtype="float64")
+        if np.isnan(X).any():
+            raise CustomException(f"Input has NULL values in the model features "
+                                  f"{[name for name, null in zip(self.feature_names, np.isnan(X).any(axis=0)) if null]}", sys)
+        return X
+
+    # Per-row version of the NULL check for online scoring, where one bad row must not fail the others:
+    # the reason each row of a model matrix cannot be scored, None when it can
+    def row_errors(self, X):
+        return [f"NULL or missing model features {[name for name, null in zip(self.feature_names, nulls) if null]}"
+                if nulls.any() else None for nulls in np.isnan(X)]
+
+    def predict_proba(self, X):
+        return self.model.predict_proba(X)[:, 1]
+
+    def score_frame(self, features, ids):
+        probability = self.predict_proba(self.align(features))
+        return pd.DataFrame({
+            ID_COL: np.asarray(ids, dtype=object),
+            "churn_probability": probability,
+            "churn_prediction": (probability >= self.threshold).astype("int64"),
+        })
+
+# Per-process state of the scoring workers, loaded once by the pool initializer
+_worker = {}
+
+def _init_worker(model_path, threshold, preprocessor_path):
+    _worker["scorer"] = Scorer(model_path, threshold)
+    _worker["preprocessor"] = _worker["scorer"].check_preprocessor(load_preprocessor(preprocessor_path)) if preprocessor_path else None
+
+def _score_chunk(chunk):
+    if _worker["preprocessor"] is not None:
+        # Raw records go through the fitted preprocessing first
+        chunk = transform(clean_data(chunk), _worker["preprocessor"])
+    features = chunk.drop(columns=[col for col in (ID_COL, TARGET_COL, RUN_TS_COL) if col in chunk.columns])
+    return _worker["scorer"].score_frame(features, chunk[ID_COL].astype(str))
+
+# Latest transformed row of every customer, read from SQLite chunk by chunk
+def iter_feature_table(db_path=DB_PATH, table_name=TABLE_NAME, chunk_size=DEFAULT_CHUNK_SIZE):
+    table = quote(table_name)
+    query = (f"SELECT t.* FROM {table} t JOIN (SELECT {quote(ID_COL)} AS id, MAX({quote(RUN_TS_COL)}) AS ts "
+             f"FROM {table} GROUP BY {quote(ID_COL)}) latest "
+             f"ON t.{quote(ID_COL)} = latest.id AND t.{quote(RUN_TS_COL)} = latest.ts")
+    conn = sqlite3.connect(db_path)
+    try:
+        yield from pd.read_sql_query(query, conn, chunksize=chunk_size)
+    finally:
+        conn.close()
+
+# Function to score chunks in a process pool, keeping a bounded number of chunks in flight
+def score_chunks(chunks, model_path=None, threshold=DEFAULT_THRESHOLD, preprocessor_path=None, max_workers=None):
+    max_workers = max_workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(model_path, threshold, preprocessor_path)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_score_chunk, chunk))
+            if len(pending) >= 2 * max_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+# Main function to score the whole customer base from the feature table ("db") or raw datasets ("raw")
+@instrument()
+def run_batch_scoring(timestamp, source="db", input_files=(), model_path=None, threshold=DEFAULT_THRESHOLD,
+                      chunk_size=DEFAULT_CHUNK_SIZE, max_workers=None, db_path=DB_PATH):
+    try:
+        model_path = model_path or default_model_path()
+        # The feature table is encoded by the saved preprocessor, so both sources need the model to match it
+        preprocessor = Scorer(model_path, threshold).check_preprocessor(
+            load_preprocessor(os.path.join(PREPROCESSOR_FOLDER, "preprocessor.json")))
+        if source == "db":
+            chunks = iter_feature_table(db_path, TABLE_NAME, chunk_size)
+            preprocessor_path = None
+        elif source == "raw":
+            if not input_files:
+                raise CustomException("Raw scoring needs at least one input dataset", sys)
+            preprocessor_path = os.path.join(PREPROCESSOR_FOLDER, "preprocessor.json")
+            # Only the columns the fitted preprocessor consumes are read
+            columns = input_columns(preprocessor)
+            chunks = (chunk for path in input_files for chunk in iter_dataset_chunks(path, chunk_size, columns))
+        else:
+            raise CustomException(f"Unknown scoring source '{source}', expected 'db' or 'raw'", sys)
+
+        os.makedirs(SCORES_FOLDER, exist_ok=True)
+        output_file = dataset_path(SCORES_FOLDER, f"churn_scores_{timestamp}")
+        start = time.perf_counter()
+        rows = 0
+        with open_dataset_writer(output_file) as writer:
+            for scores in score_chunks(chunks, model_path, threshold, preprocessor_path, max_workers):
+                writer.write(scores)
+                write_table(scores, db_path, SCORES_TABLE, timestamp, mode="upsert", key=ID_COL)
+                rows += len(scores)
+        elapsed = time.perf_counter() - start
+        logging.info(f"Scored {rows} customers from {source} in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):.0f} rows/s)")
+        print(f"Scored {rows} customers, scores saved to: {output_file}")
+        return output_file
+    except Exception as e:
+        logging.error(f"Failed to run batch scoring: {e}")
+        raise CustomException(e, sys)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch churn scoring")
+    parser.add_argument("--source", choices=["db", "raw"], default="db", help="Score the feature table or raw datasets")
+    parser.add_argument("--input", nargs="*", default=[], help="Raw dataset files (with --source raw)")
+    parser.add_argument("--model", default=None, help="Model file (defaults to train.model_path in param.yaml)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Probability threshold for churn_prediction")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per scoring chunk")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (defaults to every CPU core)")
+    args = parser.parse_args()
+
+    timestamp = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
+    run_batch_scoring(timestamp, args.source, args.input, args.model, args.threshold, args.chunk_size, args.workers)
@@ -0,0 +1,219 @@
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import yaml
+from logger import logging
+from exception import CustomException
+from fingerprint import file_fingerprint
+from schema import apply_column_types, read_typed_csv
+from storage import read_dataset
+
+PARAMS_FILE = "../param.yaml"
+# Local stand-in for the Kaggle source (offline runs and tests)
+KAGGLE_LOCAL_PATH = os.environ.get("KAGGLE_LOCAL_PATH")
+# Sources used when param.yaml has no ingestion.sources, oldest first
+DEFAULT_SOURCES = [
+    {"name": "local", "type": "file", "path": ".././data/Telco-customer-churn.csv"},
+    {"name": "kaggle", "type": "kaggle", "dataset": "praptiag/telco-churn-dataset"},
+]
+DEFAULT_SETTINGS = {"max_concurrency": 4, "retries": 3, "backoff_s": 1.0, "timeout_s": 60, "parse_workers": 4}
+DOWNLOAD_BLOCK_SIZE = 1 << 20
+
+# Function to run a flaky action (network calls, downloads) with exponential backoff between attempts
+def with_retries(action, description, retries=DEFAULT_SETTINGS["retries"], backoff_s=DEFAULT_SETTINGS["backoff_s"]):
+    for attempt in range(1, retries + 1):
+        try:
+            return action()
+        except Exception as e:
+            # Client errors (missing file, no access) will not go away by retrying
+            permanent = isinstance(e, urllib.error.HTTPError) and 400 <= e.code < 500 and e.code not in (408, 429)
+            if attempt == retries or permanent:
+                raise
+            delay = backoff_s * 2 ** (attempt - 1)
+            logging.warning(f"{description} failed (attempt {attempt}/{retries}): {e}; retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+# Function to parse the files of a multi-file source in parallel threads, stacked in path order
+def read_source_files(paths, workers=DEFAULT_SETTINGS["parse_workers"]):
+    def read(path):
+        return read_typed_csv(path) if path.endswith(".csv") else read_dataset(path)
+    if len(paths) == 1:
+        return read(paths[0])
+    with ThreadPoolExecutor(max_workers=min(workers, len(paths)), thread_name_prefix="parse") as pool:
+        frames = list(pool.map(read, paths))
+    # Files with different category levels stack as object columns, so the types are re-applied
+    return apply_column_types(pd.concat(frames, ignore_index=True))
+
+# Function to stream a URL to disk block by block; the file only appears once complete
+def download(url, target, timeout_s=DEFAULT_SETTINGS["timeout_s"]):
+    with urllib.request.urlopen(url, timeout=timeout_s) as response, open(target + ".part", "wb") as f:
+        shutil.copyfileobj(response, f, DOWNLOAD_BLOCK_SIZE)
+    os.replace(target + ".part", target)
+    return target
+
+def _sha256_json(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+# Sources: fingerprint(previous, work_dir) identifies the current version of the data cheaply (previous
+# is the fingerprint recorded by the last ingestion) and fetch(work_dir) returns it as a typed DataFrame;
+# work_dir is a scratch folder shared by both calls of one ingestion and removed afterwards
+
+# Local files matching a glob (one CSV/Parquet file or many)
+class FileSource:
+    def __init__(self, name, path, settings):
+        self.name = name
+        self.pattern = path
+        self.settings = settings
+
+    def files(self):
+        files = sorted(glob.glob(self.pattern))
+        if not files:
+            raise CustomException(f"Source '{self.name}': no file matches {self.pattern}", sys)
+        return files
+
+    def fingerprint(self, previous, work_dir):
+        files = self.files()
+        if len(files) == 1:
+            return file_fingerprint(files[0], previous)
+        previous_files = (previous or {}).get("files", {})
+        parts = {path: file_fingerprint(path, previous_files.get(path)) for path in files}
+        return {"files": parts, "sha256": _sha256_json({path: part["sha256"] for path, part in parts.items()})}
+
+    def fetch(self, work_dir):
+        return read_source_files(self.files(), self.settings["parse_workers"])
+
+# A CSV/Parquet file behind an HTTP(S) URL, streamed to disk
+class HTTPSource:
+    def __init__(self, name, url, settings):
+        self.name = name
+        self.url = url
+        self.settings = settings
+
+    # ETag, Last-Modified and Content-Length of a HEAD request; servers without them are downloaded
+    # once and fingerprinted by content
+    def fingerprint(self, previous, work_dir):
+        request = urllib.request.Request(self.url, method="HEAD")
+        with urllib.request.urlopen(request, timeout=self.settings["timeout_s"]) as response:
+            validators = {key: response.headers.get(key) for key in ("ETag", "Last-Modified", "Content-Length")}
+        if validators["ETag"] or validators["Last-Modified"]:
+            return {**validators, "sha256": _sha256_json([self.url, validators])}
+        return {"sha256": file_fingerprint(self._download(work_dir))["sha256"]}
+
+    def _download(self, work_dir):
+        target = os.path.join(work_dir, os.path.basename(urllib.parse.urlparse(self.url).path) or f"{self.name}.csv")
+        if not os.path.exists(target):
+            with_retries(lambda: download(self.url, target, self.settings["timeout_s"]),
+                         f"Download of {self.url}", self.settings["retries"], self.settings["backoff_s"])
+        return target
+
+    def fetch(self, work_dir):
+        return read_source_files([self._download(work_dir)])
+
+# Function to get an authenticated Kaggle API client
+def get_kaggle_api():
+    # Check if Kaggle API key exists
+    kaggle_config_path = os.path.expanduser("~/.kaggle/kaggle.json")
+    if not os.path.exists(kaggle_config_path):
+        raise CustomException("Kaggle API key not found! Please place kaggle.json in ~/.kaggle/ or C:\\Users\\YourUsername\\.kaggle\\", sys)
+
+    # Set environment variable explicitly (optional)
+    os.environ['KAGGLE_CONFIG_DIR'] = os.path.dirname(kaggle_config_path)
+    # Initialize Kaggle API (imported here: the package is only needed for Kaggle downloads)
+    from kaggle.api.kaggle_api_extended import KaggleApi
+    api = KaggleApi()
+    api.authenticate()
+    return api
+
+# A Kaggle dataset; file names the CSV to use when the dataset has several
+class KaggleSource:
+    def __init__(self, name, dataset, settings, file=None):
+        self.name = name
+        self.dataset = dataset
+        self.file = file
+        self.settings = settings
+
+    def fingerprint(self, previous, work_dir):
+        if KAGGLE_LOCAL_PATH:
+            return file_fingerprint(KAGGLE_LOCAL_PATH, previous)
+
+        # The file listing (names, sizes, creation dates) changes with every new dataset version
+        def listing():
+            return sorted(
+                [str(f.name), str(getattr(f, "totalBytes", "")), str(getattr(f, "creationDate", ""))]
+                for f in get_kaggle_api().dataset_list_files(self.dataset).files
+            )
+        return {"sha256": _sha256_json(with_retries(listing, f"Listing of Kaggle dataset {self.dataset}",
+                                                    self.settings["retries"], self.settings["backoff_s"]))}
+
+    def fetch(self, work_dir):
+        if KAGGLE_LOCAL_PATH:
+            return read_source_files([KAGGLE_LOCAL_PATH])
+        download_folder = os.path.join(work_dir, "kaggle_download")
+        os.makedirs(download_folder, exist_ok=True)
+        with_retries(lambda: get_kaggle_api().dataset_download_files(self.dataset, path=download_folder, unzip=True),
+                     f"Download of Kaggle dataset {self.dataset}", self.settings["retries"], self.settings["backoff_s"])
+        # The data file is chosen by name, never by directory listing order
+        files = sorted(glob.glob(os.path.join(download_folder, "**", "*.csv"), recursive=True))
+        if self.file is not None:
+            files = [path for path in files if os.path.basename(path) == self.file]
+        if len(files) != 1:
+            raise CustomException(f"Kaggle dataset {self.dataset} has {len(files)} matching CSV files "
+                                  f"({[os.path.basename(path) for path in files]}); set 'file' on source '{self.name}'", sys)
+        return read_source_files(files)
+
+# A table (or query) of a SQLite database
+class SQLiteSource:
+    def __init__(self, name, path, settings, table=None, query=None):
+        if (table is None) == (query is None):
+            raise CustomException(f"Source '{name}' needs exactly one of 'table' and 'query'", sys)
+        self.name = name
+        self.path = path
+        self.query = query or f'SELECT * FROM "{table}"'
+        self.settings = settings
+
+    def fingerprint(self, previous, work_dir):
+        database = file_fingerprint(self.path, (previous or {}).get("database"))
+        return {"database": database, "sha256": _sha256_json([database["sha256"], self.query])}
+
+    def fetch(self, work_dir):
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            return apply_column_types(pd.read_sql_query(self.query, conn))
+        finally:
+            conn.close()
+
+SOURCE_TYPES = {"file": FileSource, "http": HTTPSource, "kaggle": KaggleSource, "sqlite": SQLiteSource}
+
+def load_ingestion_params(params_file=PARAMS_FILE):
+    section = {}
+    if os.path.exists(params_file):
+        with open(params_file) as f:
+            section = (yaml.safe_load(f) or {}).get("ingestion") or {}
+    settings = {key: section.get(key, value) for key, value in DEFAULT_SETTINGS.items()}
+    return section.get("sources") or DEFAULT_SOURCES, settings
+
+# Function to build the registered sources (param.yaml ingestion.sources, oldest first)
+# specs: list of {"name", "type", ...type options}, instead of the configured sources
+def load_sources(specs=None, params_file=PARAMS_FILE):
+    configured, settings = load_ingestion_params(params_file)
+    sources = []
+    for spec in specs or configured:
+        options = {key: value for key, value in spec.items() if key not in ("name", "type")}
+        if spec.get("type") not in SOURCE_TYPES:
+            raise CustomException(f"Unknown type of source '{spec.get('name')}': {spec.get('type')}, "
+                                  f"expected one of {list(SOURCE_TYPES)}", sys)
+        sources.append(SOURCE_TYPES[spec["type"]](spec["name"], settings=settings, **options))
+    names = [source.name for source in sources]
+    if len(set(names)) != len(names):
+        raise CustomException(f"Duplicate source names in {names}", sys)
+    return sources, settings
@@ -0,0 +1,125 @@
+import sys
+import time
+import sqlite3
+import pandas as pd
+from pandas.api.types import is_bool_dtype, is_float_dtype, is_integer_dtype
+from logger import logging
+from exception import CustomException
+from instrumentation import instrument
+
+RUN_TS_COL = "run_ts"
+WRITE_MODES = ("append", "upsert", "replace_partition")
+
+# Pragmas for bulk loads: WAL keeps readers unblocked, NORMAL sync is safe with WAL
+BULK_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-262144",
+    "PRAGMA mmap_size=268435456",
+]
+
+def quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+# Function to map a pandas dtype to the SQLite column type
+def sqlite_type(dtype):
+    if is_bool_dtype(dtype) or is_integer_dtype(dtype):
+        return "INTEGER"
+    if is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path)
+    for pragma in BULK_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+# Function to create the table with an explicit typed schema, or add columns it is missing
+# A table written before run_ts partitions (whole-dataset replaces) cannot take partitions: it is
+# renamed to <table>_legacy[_n], kept for reference, and a new table is created in its place
+def ensure_table(conn, table_name, schema):
+    existing = [row[1] for row in conn.execute(f"PRAGMA table_info({quote(table_name)})")]
+    if existing and RUN_TS_COL in schema and RUN_TS_COL not in existing:
+        legacy_name, n = f"{table_name}_legacy", 1
+        while conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (legacy_name,)).fetchone():
+            n += 1
+            legacy_name = f"{table_name}_legacy_{n}"
+        conn.execute(f"ALTER TABLE {quote(table_name)} RENAME TO {quote(legacy_name)}")
+        logging.warning(f"Table {table_name} has no {RUN_TS_COL} partitions; kept as {legacy_name} and recreated")
+        existing = []
+    if not existing:
+        columns = ", ".join(f"{quote(col)} {col_type}" for col, col_type in schema.items())
+        conn.execute(f"CREATE TABLE {quote(table_name)} ({columns})")
+        return
+    for col, col_type in schema.items():
+        if col not in existing:
+            conn.execute(f"ALTER TABLE {quote(table_name)} ADD COLUMN {quote(col)} {col_type}")
+
+# Function to turn DataFrame columns into plain Python rows for executemany
+def iter_rows(df, run_ts):
+    # tolist() converts numpy scalars to Python types in one vectorized step per column
+    columns = [df[col].astype(object).where(df[col].notna(), None).tolist()
+               if not (is_integer_dtype(df[col].dtype) or is_float_dtype(df[col].dtype))
+               else df[col].tolist()
+               for col in df.columns]
+    return zip([run_ts] * len(df), *columns)
+
+# Function to bulk write a DataFrame as the run_ts partition of a table
+# mode: append (insert only), upsert (insert or update on (run_ts, key)) or
+# replace_partition (delete the run_ts partition first)
+@instrument()
+def write_table(df, db_path, table_name, run_ts, mode="upsert", key=None, index_cols=()):
+    try:
+        if mode not in WRITE_MODES:
+            raise CustomException(f"Unknown write mode '{mode}', expected one of {WRITE_MODES}", sys)
+        if mode == "upsert" and key is None:
+            raise CustomException("Upsert mode needs a key column", sys)
+        start = time.perf_counter()
+        schema = {RUN_TS_COL: "TEXT"}
+        schema.update({col: sqlite_type(dtype) for col, dtype in df.dtypes.items()})
+        column_list = ", ".join(quote(col) for col in schema)
+        placeholders = ", ".join("?" * len(schema))
+        insert = f"INSERT INTO {quote(table_name)} ({column_list}) VALUES ({placeholders})"
+
+        conn = connect(db_path)
+        try:
+            with conn:
+                ensure_table(conn, table_name, schema)
+                if mode == "upsert":
+                    # ON CONFLICT needs the unique index to exist before the load
+                    conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {quote(f'ux_{table_name}_{RUN_TS_COL}_{key}')} "
+                                 f"ON {quote(table_name)} ({quote(RUN_TS_COL)}, {quote(key)})")
+                    updates = ", ".join(f"{quote(col)} = excluded.{quote(col)}" for col in df.columns if col != key)
+                    insert += f" ON CONFLICT({quote(RUN_TS_COL)}, {quote(key)}) DO UPDATE SET {updates}"
+                elif mode == "replace_partition":
+                    conn.execute(f"DELETE FROM {quote(table_name)} WHERE {quote(RUN_TS_COL)} = ?", (run_ts,))
+                conn.executemany(insert, iter_rows(df, run_ts))
+
+            # Secondary indexes are built once the rows are in
+            with conn:
+                for col in (RUN_TS_COL, *index_cols):
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS {quote(f'ix_{table_name}_{col}')} "
+                                 f"ON {quote(table_name)} ({quote(col)})")
+        finally:
+            conn.close()
+
+        elapsed = time.perf_counter() - start
+        logging.info(f"Wrote {len(df)} rows to {db_path}:{table_name} (run_ts={run_ts}, mode={mode}) "
+                     f"in {elapsed:.3f}s ({len(df) / max(elapsed, 1e-9):.0f} rows/s)")
+    except Exception as e:
+        logging.error(f"Failed to write table {table_name} to {db_path}: {e}")
+        raise CustomException(e, sys)
+
+# Function to read one run_ts partition (or every run) back into a DataFrame
+def read_partition(db_path, table_name, run_ts=None, columns=None):
+    conn = sqlite3.connect(db_path)
+    try:
+        column_list = ", ".join(quote(col) for col in columns) if columns else "*"
+        query = f"SELECT {column_list} FROM {quote(table_name)}"
+        if run_ts is None:
+            return pd.read_sql_query(query, conn)
+        return pd.read_sql_query(query + f" WHERE {quote(RUN_TS_COL)} = ?", conn, params=(run_ts,))
+    finally:
+        conn.close()
@@ -0,0 +1,187 @@
+import numpy as np
+import pandas as pd
+
+# Mergeable streaming statistics. Every accumulator has update(values) for a new
+# chunk and merge(other) to combine partial results from other chunks or workers.
+
+# Outlier limits around the q1/q3 quantiles (1.5 times the inter-quantile range)
+def outlier_limits(quartile1, quartile3):
+    interquantile_range = quartile3 - quartile1
+    return quartile1 - 1.5 * interquantile_range, quartile3 + 1.5 * interquantile_range
+
+# Function to compute the outlier limits of several columns from one quantile call
+def outlier_thresholds(dataframe, columns, q1=0.05, q3=0.95):
+    quantiles = dataframe[columns].quantile([q1, q3])
+    return {col: outlier_limits(quantiles.at[q1, col], quantiles.at[q3, col]) for col in columns}
+
+# Running count/mean/variance/min/max (Welford, merged with Chan's formula)
+class RunningMoments:
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _combine(self, n_b, mean_b, m2_b):
+        n = self.count + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta ** 2 * self.count * n_b / n
+        self.count = n
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return self
+        mean_b = values.mean()
+        self._combine(values.size, mean_b, ((values - mean_b) ** 2).sum())
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        return self
+
+    def merge(self, other):
+        if other.count:
+            self._combine(other.count, other.mean, other.m2)
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+        return self
+
+    def variance(self, ddof=0):
+        if self.count - ddof <= 0:
+            return 0.0
+        return float(self.m2 / (self.count - ddof))
+
+    # Population standard deviation, same convention as StandardScaler
+    def std(self, ddof=0):
+        return float(np.sqrt(self.variance(ddof)))
+
+# KLL quantile sketch: level h holds items of weight 2**h; a full level is sorted and
+# every other item (random offset) is promoted, so memory stays O(k log(n/k))
+# The offsets come from a seeded generator, so the same input always gives the same quantiles
+class KLLSketch:
+    def __init__(self, k=1024, seed=42):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if items.size > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item out stays on this level
+                keep = items[:1] if items.size % 2 else items[:0]
+                items = items[keep.size:]
+                promoted = items[self.rng.integers(2)::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return self
+        self.count += values.size
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def quantiles(self, qs):
+        if self.count == 0:
+            return [np.nan for _ in qs]
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(items.size, 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind="mergesort")
+        values, weights = values[order], weights[order]
+        positions = np.cumsum(weights) - weights / 2
+        ranks = np.asarray(qs, dtype=float) * weights.sum()
+        result = np.interp(ranks, positions, values)
+        # The exact extremes are tracked separately
+        return np.clip(result, self.min, self.max).tolist()
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+# Streaming covariance of several columns against one target (for target correlations)
+class RunningCovariance:
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.count = 0
+        self.mean_x = np.zeros(len(self.columns))
+        self.mean_y = 0.0
+        self.m2_x = np.zeros(len(self.columns))
+        self.m2_y = 0.0
+        self.c_xy = np.zeros(len(self.columns))
+
+    def _combine(self, n_b, mean_x, mean_y, m2_x, m2_y, c_xy):
+        n = self.count + n_b
+        delta_x = mean_x - self.mean_x
+        delta_y = mean_y - self.mean_y
+        factor = self.count * n_b / n
+        self.m2_x += m2_x + delta_x ** 2 * factor
+        self.m2_y += m2_y + delta_y ** 2 * factor
+        self.c_xy += c_xy + delta_x * delta_y * factor
+        self.mean_x += delta_x * n_b / n
+        self.mean_y += delta_y * n_b / n
+        self.count = n
+
+    # Rows with a missing value in any column or the target are skipped
+    def update(self, x, y):
+        x = np.asarray(x, dtype=float).reshape(-1, len(self.columns))
+        y = np.asarray(y, dtype=float)
+        valid = ~np.isnan(x).any(axis=1) & ~np.isnan(y)
+        x, y = x[valid], y[valid]
+        if y.size == 0:
+            return self
+        mean_x = x.mean(axis=0)
+        mean_y = y.mean()
+        dx = x - mean_x
+        dy = y - mean_y
+        self._combine(y.size, mean_x, mean_y, (dx ** 2).sum(axis=0), (dy ** 2).sum(), dx.T @ dy)
+        return self
+
+    def merge(self, other):
+        if other.count:
+            self._combine(other.count, other.mean_x, other.mean_y, other.m2_x, other.m2_y, other.c_xy)
+        return self
+
+    def correlations(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = self.c_xy / np.sqrt(self.m2_x * self.m2_y)
+        return pd.Series(corr, index=self.columns)
+
+# Function to get the top-n absolute correlations with the target without a full correlation matrix
+def target_correlations(df, target_col, top_n=5, chunk_size=None):
+    columns = [col for col in df.select_dtypes(include=["number", "bool"]).columns if col != target_col]
+    covariance = RunningCovariance(columns)
+    step = chunk_size or max(len(df), 1)
+    for start in range(0, len(df), step):
+        chunk = df.iloc[start:start + step]
+        covariance.update(chunk[columns].to_numpy(dtype="float64"), chunk[target_col].to_numpy(dtype="float64"))
+    return covariance.correlations().abs().sort_values(ascending=False)[:top_n]
@@ -0,0 +1,178 @@
+import os
+import sys
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from logger import logging
+from exception import CustomException
+from instrumentation import instrument
+from schema import CSV_DTYPES, apply_column_types, read_typed_csv
+
+DEFAULT_FORMAT = os.environ.get("CHURN_STORAGE_FORMAT", "parquet")
+
+# Plain CSV files, kept for exports and for datasets written by older runs
+class CSVBackend:
+    name = "csv"
+    extension = ".csv"
+
+    def write(self, df, path):
+        df.to_csv(path, index=False)
+
+    def read(self, path, columns=None):
+        return read_typed_csv(path, usecols=columns)
+
+    def iter_chunks(self, path, chunk_size, columns=None):
+        for chunk in pd.read_csv(path, usecols=columns, dtype=CSV_DTYPES, chunksize=chunk_size):
+            yield apply_column_types(chunk)
+
+    def open_writer(self, path):
+        return CSVChunkWriter(path)
+
+# Parquet files: compressed, typed and readable column by column
+class ParquetBackend:
+    name = "parquet"
+    extension = ".parquet"
+
+    def write(self, df, path):
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path, compression="zstd")
+
+    def read_table(self, path, columns=None):
+        return pq.read_table(path, columns=columns, memory_map=True)
+
+    def read(self, path, columns=None):
+        return self.read_table(path, columns).to_pandas()
+
+    def iter_chunks(self, path, chunk_size, columns=None):
+        for batch in pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+
+    def open_writer(self, path):
+        return ArrowChunkWriter(path, lambda sink, schema: pq.ParquetWriter(sink, schema, compression="zstd"))
+
+# Arrow IPC files: uncompressed, memory-mapped and read without copying
+class ArrowIPCBackend:
+    name = "arrow"
+    extension = ".arrow"
+
+    def write(self, df, path):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.OSFile(path, "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    def read_table(self, path, columns=None):
+        # Buffers point into the memory map, so only the selected columns are paged in
+        table = ipc.open_file(pa.memory_map(path, "r")).read_all()
+        return table.select(columns) if columns is not None else table
+
+    def read(self, path, columns=None):
+        return self.read_table(path, columns).to_pandas()
+
+    def iter_chunks(self, path, chunk_size, columns=None):
+        for batch in self.read_table(path, columns).to_batches(max_chunksize=chunk_size):
+            yield batch.to_pandas()
+
+    def open_writer(self, path):
+        return ArrowChunkWriter(path, lambda sink, schema: ipc.new_file(sink, schema))
+
+# Appends DataFrame chunks to one CSV file
+class CSVChunkWriter:
+    def __init__(self, path):
+        self.path = path
+        self.header = True
+
+    def write(self, df):
+        df.to_csv(self.path, mode="w" if self.header else "a", header=self.header, index=False)
+        self.header = False
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Appends DataFrame chunks to one Parquet/Arrow file with the schema of the first chunk
+class ArrowChunkWriter:
+    def __init__(self, path, make_writer):
+        self.path = path
+        self.make_writer = make_writer
+        self.sink = None
+        self.writer = None
+        self.schema = None
+
+    def write(self, df):
+        if self.writer is None:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            self.schema = table.schema
+            self.sink = pa.OSFile(self.path, "wb")
+            self.writer = self.make_writer(self.sink, self.schema)
+        else:
+            table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+BACKENDS = {backend.name: backend for backend in (ParquetBackend(), ArrowIPCBackend(), CSVBackend())}
+
+# Function to get a storage backend by name (defaults to CHURN_STORAGE_FORMAT or parquet)
+def get_backend(name=None):
+    name = name or DEFAULT_FORMAT
+    if name not in BACKENDS:
+        raise CustomException(f"Unknown storage format '{name}', expected one of {list(BACKENDS)}", sys)
+    return BACKENDS[name]
+
+def backend_for_path(path):
+    extension = os.path.splitext(path)[1]
+    for backend in BACKENDS.values():
+        if backend.extension == extension:
+            return backend
+    raise CustomException(f"No storage backend for file: {path}", sys)
+
+# Function to build the path of a dataset stored with the given backend
+def dataset_path(folder, name, storage_format=None):
+    return os.path.join(folder, name + get_backend(storage_format).extension)
+
+# Function to find a stored dataset whatever format it was written in
+def find_dataset(folder, name):
+    for backend in [get_backend()] + list(BACKENDS.values()):
+        path = os.path.join(folder, name + backend.extension)
+        if os.path.exists(path):
+            return path
+    return None
+
+@instrument()
+def write_dataset(df, path):
+    try:
+        backend_for_path(path).write(df, path)
+        logging.info(f"Dataset written to: {path}")
+        return path
+    except Exception as e:
+        logging.error(f"Failed to write dataset {path}: {e}")
+        raise CustomException(e, sys)
+
+# Function to load a stored dataset, optionally only some of its columns
+@instrument()
+def read_dataset(path, columns=None):
+    try:
+        return backend_for_path(path).read(path, columns)
+    except Exception as e:
+        logging.error(f"Failed to read dataset {path}: {e}")
+        raise CustomException(e, sys)
+
+def iter_dataset_chunks(path, chunk_size, columns=None):
+    return backend_for_path(path).iter_chunks(path, chunk_size, columns)
+
+def open_dataset_writer(path):
+    return backend_for_path(path).open_writer(path)
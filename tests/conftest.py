@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "src"))
+
+# The pipeline modules resolve ../logs, ../models and ../param.yaml against the working directory
+# (src/ in the repo); the tests run them from a scratch src/ so nothing is written into the repo
+WORK_DIR = tempfile.mkdtemp(prefix="churn_tests_")
+os.makedirs(os.path.join(WORK_DIR, "src"))
+os.chdir(os.path.join(WORK_DIR, "src"))
+
+@pytest.fixture
+def raw_customers():
+    from schema import read_typed_csv
+    return read_typed_csv(os.path.join(REPO_DIR, "data", "Telco-customer-churn.csv")).head(300)
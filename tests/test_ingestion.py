@@ -0,0 +1,62 @@
+import os
+from functools import partial
+import pandas as pd
+from data_ingestion import ROW_INDEX_NAME, combine_sources, ingest_source
+from data_streaming import stream_combine_sources
+from schema import ID_COL
+from sources import load_sources
+from storage import find_dataset, read_dataset
+
+def ingest(sources, timestamp, raw_data_folder, combine=combine_sources):
+    results = [ingest_source(source, timestamp, raw_data_folder) for source in sources]
+    return combine(results, timestamp, raw_data_folder=raw_data_folder)
+
+def sorted_by_id(df):
+    return df.sort_values(ID_COL).reset_index(drop=True)
+
+# Regression: a change of the older source alone must not override the customers it shares
+# with the newer, unchanged source
+def test_only_older_source_changed_keeps_newer_values(raw_customers, tmp_path):
+    old_file, new_file = str(tmp_path / "old.csv"), str(tmp_path / "new.csv")
+    raw_data_folder = str(tmp_path / "raw")
+    os.makedirs(raw_data_folder)
+    older = raw_customers.head(200).copy()
+    newer = raw_customers.iloc[100:300].copy()
+    newer["MonthlyCharges"] = newer["MonthlyCharges"] + 10.0
+    older.to_csv(old_file, index=False)
+    newer.to_csv(new_file, index=False)
+    sources, _ = load_sources([{"name": "old", "type": "file", "path": old_file},
+                               {"name": "new", "type": "file", "path": new_file}])
+
+    first = ingest(sources, "2026_01_01_00_00_00", raw_data_folder)
+    assert len(read_dataset(first)) == 300
+
+    # Only the older source changes: one customer it alone holds, and the customers shared with the newer one
+    shared_ids = set(newer[ID_COL].head(100))
+    older.loc[older[ID_COL].isin(shared_ids), "tenure"] = older["tenure"] + 1
+    older.loc[0, "tenure"] = older.loc[0, "tenure"] + 1
+    older.to_csv(old_file, index=False)
+    delta = read_dataset(ingest(sources, "2026_01_02_00_00_00", raw_data_folder))
+
+    # With the "latest" strategy the newer source still wins for the shared customers, so they are unchanged
+    assert list(delta[ID_COL]) == [older.loc[0, ID_COL]]
+
+# The streaming merge goes through customerID hash buckets, but must write the same delta and row index
+def test_streamed_combine_matches_in_memory(raw_customers, tmp_path):
+    old_file, new_file = str(tmp_path / "old.csv"), str(tmp_path / "new.csv")
+    raw_customers.head(200).to_csv(old_file, index=False)
+    newer = raw_customers.iloc[150:300].copy()
+    newer["tenure"] = newer["tenure"] + 1
+    newer.to_csv(new_file, index=False)
+    sources, _ = load_sources([{"name": "old", "type": "file", "path": old_file},
+                               {"name": "new", "type": "file", "path": new_file}])
+
+    folders = {"memory": str(tmp_path / "memory"), "stream": str(tmp_path / "stream")}
+    for folder in folders.values():
+        os.makedirs(folder)
+    in_memory = ingest(sources, "2026_01_01_00_00_00", folders["memory"])
+    streamed = ingest(sources, "2026_01_01_00_00_00", folders["stream"], partial(stream_combine_sources, chunk_size=40))
+    pd.testing.assert_frame_equal(sorted_by_id(read_dataset(streamed)).astype(str),
+                                  sorted_by_id(read_dataset(in_memory)).astype(str))
+    indexes = [sorted_by_id(read_dataset(find_dataset(folder, ROW_INDEX_NAME))) for folder in folders.values()]
+    pd.testing.assert_frame_equal(*indexes)
@@ -0,0 +1,19 @@
+from features import requested_features
+from preprocessor import clean_data, fit_preprocessor, transform
+from schema import ID_COL, TARGET_COL
+
+# Blank TotalCharges (customers in their first month) are dropped by clean_data; transform must
+# keep exactly the rows that remain, aligned on their index
+def test_transform_keeps_every_cleaned_row(raw_customers):
+    raw = raw_customers.copy()
+    raw["TotalCharges"] = raw["TotalCharges"].astype(object)
+    raw.loc[[3, 10, 11, 120], "TotalCharges"] = " "
+    clean = clean_data(raw)
+    assert len(clean) == len(raw) - 4
+
+    transformed = transform(clean, fit_preprocessor(clean, features=requested_features()))
+    assert len(transformed) == len(clean)
+    assert transformed.index.equals(clean.index)
+    assert transformed[ID_COL].tolist() == clean[ID_COL].astype(str).tolist()
+    assert transformed[TARGET_COL].tolist() == clean[TARGET_COL].tolist()
+    assert not transformed.drop(columns=ID_COL).isna().any().any()
@@ -0,0 +1,77 @@
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+import scoring
+from exception import CustomException
+from features import requested_features
+from preprocessor import clean_data, fit_preprocessor, load_preprocessor, save_preprocessor, transform
+from schema import ID_COL, TARGET_COL
+from sqlite_writer import write_table
+
+RUN_TS = "2026_01_01_00_00_00"
+
+# Preprocessor, feature table and model of one training run, as the pipeline writes them
+@pytest.fixture
+def trained(tmp_path, raw_customers):
+    clean = clean_data(raw_customers)
+    preprocessor_path = save_preprocessor(fit_preprocessor(clean, features=requested_features()), RUN_TS, str(tmp_path))
+    state = load_preprocessor(preprocessor_path)
+    features = transform(clean, state)
+    db_path = str(tmp_path / "customer_churn.db")
+    write_table(features, db_path, scoring.TABLE_NAME, RUN_TS, mode="upsert", key=ID_COL)
+    model = LogisticRegression(max_iter=1000).fit(features[state["feature_names"]].to_numpy(), features[TARGET_COL])
+    model_path = str(tmp_path / "model.joblib")
+    joblib.dump({"model": model, "feature_names": state["feature_names"], "model_name": "logistic_regression",
+                 "preprocessor_fingerprint": state["fingerprint"]}, model_path)
+    return {"db_path": db_path, "model_path": model_path, "preprocessor_path": preprocessor_path, "state": state}
+
+# Scores chunks in this process, the way every worker of score_chunks does
+def score(chunks, model_path, preprocessor_path=None):
+    scoring._init_worker(model_path, scoring.DEFAULT_THRESHOLD, preprocessor_path)
+    return pd.concat([scoring._score_chunk(chunk) for chunk in chunks]).set_index(ID_COL).sort_index()
+
+def test_db_and_raw_scores_agree(trained, raw_customers):
+    db_scores = score(scoring.iter_feature_table(trained["db_path"]), trained["model_path"])
+    raw_scores = score([raw_customers], trained["model_path"], trained["preprocessor_path"])
+    assert len(db_scores) == len(clean_data(raw_customers))
+    pd.testing.assert_frame_equal(db_scores, raw_scores)
+
+def test_align_rejects_missing_features(trained):
+    scorer = scoring.Scorer(trained["model_path"])
+    features = pd.DataFrame(np.zeros((2, len(scorer.feature_names))), columns=scorer.feature_names)
+    assert scorer.align(features).shape == (2, len(scorer.feature_names))
+    with pytest.raises(CustomException, match="lacks the model features"):
+        scorer.align(features.drop(columns=scorer.feature_names[-1]))
+
+def test_scorer_rejects_another_preprocessor(trained):
+    scorer = scoring.Scorer(trained["model_path"])
+    assert scorer.check_preprocessor(trained["state"]) is trained["state"]
+    with pytest.raises(CustomException, match="trained on preprocessor"):
+        scorer.check_preprocessor({**trained["state"], "fingerprint": "0" * 16})
+    narrowed = {**trained["state"], "feature_names": trained["state"]["feature_names"][:-1]}
+    with pytest.raises(CustomException, match="does not produce"):
+        scorer.check_preprocessor(narrowed)
+
+# One bad request of a micro-batch (NaN in a record, features missing from the store) fails alone
+def test_prediction_model_fails_bad_rows_alone(trained, raw_customers, monkeypatch, tmp_path):
+    import prediction_server
+    from feature_store import FeatureStore
+    monkeypatch.setattr(prediction_server, "load_preprocessor", lambda: trained["state"])
+    model = prediction_server.PredictionModel(trained["model_path"])
+    model.store = FeatureStore(str(tmp_path / "feature_store.db"))
+    features = transform(clean_data(raw_customers), trained["state"])
+    model.store.upsert(features.head(2), RUN_TS)
+    model.store.upsert(features.iloc[2:3].drop(columns=model.scorer.feature_names[-1]), "2026_01_02_00_00_00")
+
+    records = clean_data(raw_customers).head(2).astype(object).to_dict("records")
+    records[1]["MonthlyCharges"] = float("nan")
+    ids = features[ID_COL].tolist()
+    results = model.predict([{"record": records[0]}, {"record": records[1]},
+                             {"customerID": ids[0]}, {"customerID": ids[2]}, {"customerID": "unknown"}])
+    assert 0.0 <= results[0]["churn_probability"] <= 1.0
+    assert isinstance(results[1], ValueError) and "MonthlyCharges" in str(results[1])
+    assert 0.0 <= results[2]["churn_probability"] <= 1.0
+    assert isinstance(results[3], ValueError) and model.scorer.feature_names[-1] in str(results[3])
+    assert results[4]["churn_probability"] is None
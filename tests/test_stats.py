@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+from stats import KLLSketch, RunningCovariance, RunningMoments, outlier_thresholds, target_correlations
+
+def chunks(values, n):
+    return np.array_split(values, n)
+
+def test_running_moments_merge_matches_one_pass():
+    values = np.random.default_rng(0).gamma(2.0, 30.0, 10000)
+    merged = RunningMoments()
+    for chunk in chunks(values, 7):
+        merged.merge(RunningMoments().update(chunk))
+    assert merged.count == values.size
+    assert np.isclose(merged.mean, values.mean())
+    assert np.isclose(merged.std(), values.std())
+    assert (merged.min, merged.max) == (values.min(), values.max())
+
+def test_running_moments_skip_missing_values():
+    moments = RunningMoments().update([1.0, np.nan, 3.0])
+    assert moments.count == 2
+    assert moments.mean == 2.0
+
+# Rank error of a sketched quantile: distance between the requested and the achieved rank
+def rank_error(values, q, estimate):
+    return abs(np.searchsorted(np.sort(values), estimate) / values.size - q)
+
+def test_kll_quantiles_within_rank_error():
+    values = np.random.default_rng(1).normal(70.0, 30.0, 200000)
+    sketch = KLLSketch(k=1024, seed=0)
+    for chunk in chunks(values, 20):
+        sketch.update(chunk)
+    qs = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+    for q, estimate in zip(qs, sketch.quantiles(qs)):
+        assert rank_error(values, q, estimate) < 0.01
+    assert sum(level.size for level in sketch.levels) < values.size / 10
+
+def test_kll_merge_matches_single_sketch():
+    values = np.random.default_rng(2).uniform(0.0, 120.0, 100000)
+    merged = KLLSketch(seed=0)
+    for i, chunk in enumerate(chunks(values, 8)):
+        merged.merge(KLLSketch(seed=i + 1).update(chunk))
+    assert merged.count == values.size
+    for q in (0.05, 0.5, 0.95):
+        assert rank_error(values, q, merged.quantile(q)) < 0.01
+    # The exact extremes are tracked, and bound every estimate
+    assert (merged.min, merged.max) == (values.min(), values.max())
+    assert values.min() <= merged.quantile(0.0) <= merged.quantile(1.0) <= values.max()
+
+def test_kll_default_seed_is_reproducible():
+    values = np.random.default_rng(4).exponential(50.0, 50000)
+    first, second = KLLSketch(k=64), KLLSketch(k=64)
+    for chunk in chunks(values, 5):
+        first.update(chunk)
+        second.update(chunk)
+    qs = [0.05, 0.5, 0.95]
+    assert first.quantiles(qs) == second.quantiles(qs)
+
+def test_kll_small_input_is_exact():
+    sketch = KLLSketch(seed=0).update([5.0, 1.0, 3.0])
+    assert sketch.quantile(0.5) == 3.0
+
+def test_outlier_thresholds_match_per_column_limits():
+    df = pd.DataFrame({"a": np.arange(100.0), "b": np.arange(100.0) * 2})
+    limits = outlier_thresholds(df, ["a", "b"], 0.05, 0.95)
+    q1, q3 = df["a"].quantile(0.05), df["a"].quantile(0.95)
+    assert np.allclose(limits["a"], (q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)))
+    assert np.allclose(limits["b"], [2 * limit for limit in limits["a"]])
+
+def test_running_covariance_merge_matches_pandas():
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame({"x1": rng.normal(size=5000), "x2": rng.normal(size=5000)})
+    df["target"] = (df["x1"] + 0.2 * rng.normal(size=5000) > 0).astype(int)
+    merged = RunningCovariance(["x1", "x2"])
+    for start in range(0, len(df), 900):
+        chunk = df.iloc[start:start + 900]
+        merged.merge(RunningCovariance(["x1", "x2"]).update(chunk[["x1", "x2"]], chunk["target"]))
+    expected = df[["x1", "x2"]].corrwith(df["target"])
+    assert np.allclose(merged.correlations(), expected)
+    top = target_correlations(df, "target", top_n=1, chunk_size=700)
+    assert list(top.index) == ["x1"] and np.isclose(top["x1"], abs(expected["x1"]))
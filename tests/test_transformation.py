@@ -0,0 +1,18 @@
+import pandas as pd
+from data_transformation_FE import prepare_partitioned
+from features import requested_features
+from preprocessor import clean_data, fit_preprocessor, transform
+from schema import NUM_COLS
+
+# Regression: with more partitions than rows some partitions are empty, and their outputs must
+# still concatenate with the others
+def test_prepare_partitioned_with_more_partitions_than_rows(raw_customers):
+    raw = raw_customers.head(5)
+    state = fit_preprocessor(clean_data(raw_customers), features=requested_features())
+    transformed, reused = prepare_partitioned(raw, NUM_COLS, 16, preprocessor=state)
+    assert reused is state
+    pd.testing.assert_frame_equal(transformed, transform(clean_data(raw), state), check_dtype=False)
+
+    fitted, fitted_state = prepare_partitioned(raw, NUM_COLS, 16)
+    assert len(fitted) == len(clean_data(raw))
+    assert fitted_state["feature_names"]